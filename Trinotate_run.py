@@ -4,6 +4,9 @@
 
 import optparse
 import os
+import sys
+from stage_scheduler import Stage, StageError, run_stages
+import instrument
 
 usage_line = """
 Trinotate_run.py
@@ -29,10 +32,26 @@ databases desired (SwissProt, Uniref90, and/or Pfam-A). The default (recommendat
 databases, but the user may also elect to use the Uniref90 (which is large and will likely greatly expand the run time). \
 
 This script will automatically download and prepare the correct annotation databases, but there is also the option to provide \
-the directory containing these prepared databases if they have already been prepared in a previous annotation. User can also set \
-the number of threads to be used. See trinotate.sourceforge.net for more information and for full instructions. \
-
-python Trinotate_run.py --trinity <trinity.fasta> --swissprot --pfam [--uniref]						
+the directory containing these prepared databases if they have already been prepared in a previous annotation (files \
+already downloaded, unpacked or pressed in './databases' by an earlier run are reused). User can also set \
+the number of threads to be used. Blast databases are kept in a shared registry (see 'blastdb_registry.py') and are only \
+built when no database exists yet for the same fasta contents, by a 'blastdb_<database>' stage that the blast stages \
+wait for. \
+
+The pipeline steps are run as stages by 'stage_scheduler.py': the steps that do not depend on each other (blastx, \
+rnammer and the gene to transcript map alongside TransDecoder, then blastp, hmmscan, signalP and tmhmm on the \
+TransDecoder peptides) run at the same time, sharing the number of threads given, and the annotation database is \
+loaded once they have all finished. The wall time of each stage is reported, and the run stops as soon as any \
+command fails. Finished stages are recorded in a run manifest ('<trinity.fasta>.stages.json'), and when the script \
+is run again the stages whose inputs, settings and outputs are unchanged (with outputs newer than inputs) are \
+skipped, so a run that failed late resumes at the failed stage. Use '--force' to run every stage again or \
+'--from-stage' to run one stage and all stages depending on it again. The time and memory of the database \
+preparation and of the whole pipeline (including the peak memory of the programs it runs) are written to STDERR \
+with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a cProfile dump). \
+See trinotate.sourceforge.net for more information and for full instructions. \
+
+python Trinotate_run.py --trinity <trinity.fasta> --swissprot --pfam [--uniref --force --from-stage <stage> \
+--verbose --metrics <metrics.json> --profile <profile>]						
 """
 
 #################################################
@@ -47,10 +66,14 @@ parser.add_option("--swissprot", action = "store_true", dest = "swissprot", help
 parser.add_option("--pfam", action = "store_true", dest = "pfam", help = "annotate using the Pfam-A database", default = True)
 parser.add_option("--uniref", action = "store_true", dest = "uniref", help = "annotate using the UniRef90 database", default = False)
 parser.add_option("--databases", action = "store", type = "string", dest = "databases", help = "directory where annotation databases can be found")
-parser.add_option("--threads", action = "store", type = "string", dest = "threads", help = "number of threads to use", default = "2")
+parser.add_option("--threads", action = "store", type = "string", dest = "threads", help = "number of threads to use (shared by the stages running at the same time)", default = "2")
 parser.add_option("--output", action = "store", type = "string", dest = "output", help = "root name of the output annotation database and report")
+parser.add_option("--force", action = "store_true", dest = "force", help = "run every stage, even those that are up to date", default = False)
+parser.add_option("--from-stage", action = "store", type = "string", dest = "from_stage", help = "run this stage and every stage depending on it, even if up to date")
+instrument.add_options(parser)
 
 options, args = parser.parse_args()
+metrics = instrument.Instrument("Trinotate_run.py")
 
 
 
@@ -58,29 +81,54 @@ options, args = parser.parse_args()
 ###            	   Full Program               ###
 #################################################
 
-def prepare_databases():
+RESOURCES = "http://sourceforge.net/projects/trinotate/files/TRINOTATE_RESOURCES/20140708/"
+
+## run one preparation command, stopping the run when it fails
+def prepare_command(command):
+	if os.system(command) != 0:
+		sys.stderr.write("\n***Error: database preparation failed: "+command+"***\n\n")
+		sys.exit(1)
+
+## download and unpack a database file, unless it is already unpacked (a '.gz' left next to it means the download or
+## unpacking was interrupted, so the download is resumed with 'wget -c' and unpacked again)
+def prepare_download(directory, filename):
+	path = os.path.join(directory, filename)
+	if os.path.exists(path) and not os.path.exists(path+".gz"):
+		print("Using prepared "+path)
+		return path
+	prepare_command("wget -c "+RESOURCES+filename+".gz -P "+directory+"/")
+	prepare_command("gunzip -f "+path+".gz")
+	return path
+
+## each database is only downloaded, unpacked and pressed when its prepared files are missing, so a resumed run
+## does not fetch them again (blast databases are built by the 'blastdb_*' stages, see 'blast_stages')
+def prepare_databases(directory):
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
 	if options.swissprot == True:
-		os.system("wget http://sourceforge.net/projects/trinotate/files/TRINOTATE_RESOURCES/20140708/uniprot_sprot.fasta.gz -P ./databases/")
-		os.system("gunzip ./databases/uniprot_sprot.fasta.gz")
-		os.system("makeblastdb -in ./databases/uniprot_sprot.fasta -dbtype prot")
+		prepare_download(directory, "uniprot_sprot.fasta")
 	if options.pfam == True:
-		os.system("wget http://sourceforge.net/projects/trinotate/files/TRINOTATE_RESOURCES/20140708/Pfam-A.hmm.gz -P ./databases/")
-		os.system("gunzip ./databases/Pfam-A.hmm.gz")
-		os.system("hmmpress ./databases/Pfam-A.hmm")
+		hmm = prepare_download(directory, "Pfam-A.hmm")
+		if not all(os.path.exists(hmm+suffix) for suffix in (".h3f", ".h3i", ".h3m", ".h3p")):
+			prepare_command("hmmpress -f "+hmm)
 	if options.uniref == True:
-		os.system("wget http://sourceforge.net/projects/trinotate/files/TRINOTATE_RESOURCES/20140708/uniref90.fasta.gz -P ./databases/")
-		os.system("gunzip ./databases/uniref90.fasta.gz")
-		os.system("makeblastdb -in ./databases/uniref90.fasta -dbtype prot")
+		prepare_download(directory, "uniref90.fasta")
 
 
 
 #################################################
 ###     	   Prepare Trinity Output         ###
 #################################################
-		
+
+## each step below returns its pipeline stages: a name, the commands for a given number of threads, the stages
+## it has to wait for, the most threads it can use and the files it reads and writes (see 'stage_scheduler.py')
+
 def trinity_prepare():
-	os.system("TransDecoder -t "+options.trinity+" --CPU "+options.threads)
-	os.system("get_Trinity_gene_to_trans_map.pl "+options.trinity+" > "+options.trinity+".gene_trans_map")
+	threads = int(options.threads)
+	return [Stage("transdecoder", lambda cpu: ["TransDecoder -t "+options.trinity+" --CPU "+str(cpu)], threads=threads, \
+	inputs=[options.trinity], outputs=[options.trinity+".transdecoder.pep"]), \
+	Stage("gene_trans_map", lambda cpu: ["get_Trinity_gene_to_trans_map.pl "+options.trinity+" > "+options.trinity+".gene_trans_map"], \
+	inputs=[options.trinity], outputs=[options.trinity+".gene_trans_map"])]
 
 
 
@@ -88,13 +136,29 @@ def trinity_prepare():
 ###         	  Blast to Databases          ###
 #################################################
 
+## the blast database is looked up (or built with makeblastdb) by 'blastdb_registry.py' in its own stage, which
+## writes the database path to '<trinity.fasta>.<name>.blastdb' for the blast stages to read
+def blast_stages(name, fasta):
+	if not os.path.isfile(fasta):
+		sys.stderr.write("\n***Error: database fasta "+fasta+" not found!***\n\n")
+		sys.exit(1)
+	threads = int(options.threads)
+	registry = sys.executable+" "+os.path.join(os.path.dirname(os.path.abspath(__file__)), "blastdb_registry.py")
+	db = options.trinity+"."+name+".blastdb"
+	return [Stage("blastdb_"+name, lambda cpu: [registry+" -i "+fasta+" --dbtype prot --existing > "+db], \
+	inputs=[fasta], outputs=[db]), \
+	Stage("blastx_"+name, lambda cpu: ["blastx -query "+options.trinity+" -db $(cat "+db+") -num_threads "+str(cpu)+" -max_target_seqs 1 -outfmt 6 > "+options.trinity+"."+name+".blastx.outfmt6"], \
+	requires=["blastdb_"+name], threads=threads, inputs=[options.trinity, db], outputs=[options.trinity+"."+name+".blastx.outfmt6"]), \
+	Stage("blastp_"+name, lambda cpu: ["blastp -query "+options.trinity+".transdecoder.pep -db $(cat "+db+") -num_threads "+str(cpu)+" -max_target_seqs 1 -outfmt 6 > "+options.trinity+"."+name+".blastp.outfmt6"], \
+	requires=["transdecoder", "blastdb_"+name], threads=threads, inputs=[options.trinity+".transdecoder.pep", db], outputs=[options.trinity+"."+name+".blastp.outfmt6"])]
+
 def run_blast(directory):
+	stages = []
 	if options.swissprot == True:
-		os.system("blastx -query "+options.trinity+" -db "+directory+"/uniprot_sprot.fasta -num_threads "+options.threads+" -max_target_seqs 1 -outfmt 6 > "+options.trinity+".uniprot.blastx.outfmt6")
-		os.system("blastp -query "+options.trinity+".transdecoder.pep -db "+directory+"/uniprot_sprot.fasta -num_threads "+options.threads+" -max_target_seqs 1 -outfmt 6 > "+options.trinity+".uniprot.blastp.outfmt6")
+		stages += blast_stages("uniprot", directory+"/uniprot_sprot.fasta")
 	if options.uniref == True:
-		os.system("blastx -query "+options.trinity+" -db "+directory+"/uniref90.fasta -num_threads "+options.threads+" -max_target_seqs 1 -outfmt 6 > "+options.trinity+".uniref90.blastx.outfmt6")
-		os.system("blastp -query "+options.trinity+".transdecoder.pep -db "+directory+"/uniref90.fasta -num_threads "+options.threads+" -max_target_seqs 1 -outfmt 6 > "+options.trinity+".uniref90.blastp.outfmt6")
+		stages += blast_stages("uniref90", directory+"/uniref90.fasta")
+	return stages
 
 
 
@@ -104,7 +168,10 @@ def run_blast(directory):
 		
 def run_hmmer(directory):
 	if options.pfam == True:
-		os.system("hmmscan --cpu "+options.threads+"--domtblout "+options.trinity+".TrinotatePFAM.out "+directory+"/Pfam-A.hmm "+options.trinity+".transdecoder.pep > pfam.log")
+		return [Stage("hmmscan", lambda cpu: ["hmmscan --cpu "+str(cpu)+" --domtblout "+options.trinity+".TrinotatePFAM.out "+directory+"/Pfam-A.hmm "+options.trinity+".transdecoder.pep > pfam.log"], \
+		requires=["transdecoder"], threads=int(options.threads), inputs=[options.trinity+".transdecoder.pep", directory+"/Pfam-A.hmm"], \
+		outputs=[options.trinity+".TrinotatePFAM.out"])]
+	return []
 
 
 
@@ -113,7 +180,8 @@ def run_hmmer(directory):
 #################################################
 		
 def run_signalp():
-	os.system("signalp -f short -n "+options.trinity+".signalp.out "+options.trinity+".transdecoder.pep")
+	return [Stage("signalp", lambda cpu: ["signalp -f short -n "+options.trinity+".signalp.out "+options.trinity+".transdecoder.pep"], requires=["transdecoder"], \
+	inputs=[options.trinity+".transdecoder.pep"], outputs=[options.trinity+".signalp.out"])]
 
 
 
@@ -122,7 +190,8 @@ def run_signalp():
 #################################################
 	
 def run_tmhmm():
-	os.system("tmhmm --short < "+options.trinity+".transdecoder.pep > "+options.trinity+".tmhmm.out")
+	return [Stage("tmhmm", lambda cpu: ["tmhmm --short < "+options.trinity+".transdecoder.pep > "+options.trinity+".tmhmm.out"], requires=["transdecoder"], \
+	inputs=[options.trinity+".transdecoder.pep"], outputs=[options.trinity+".tmhmm.out"])]
 
 
 
@@ -131,7 +200,8 @@ def run_tmhmm():
 #################################################
 	
 def run_rnammer():
-	os.system("RnammerTranscriptome.pl --transcriptome "+options.trinity+" --path_to_rnammer rnammer")
+	return [Stage("rnammer", lambda cpu: ["RnammerTranscriptome.pl --transcriptome "+options.trinity+" --path_to_rnammer rnammer"], \
+	inputs=[options.trinity], outputs=[options.trinity+".rnammer.gff"])]
 
 
 
@@ -139,21 +209,27 @@ def run_rnammer():
 ###   Create Annotation Database and Report   ###
 #################################################
 	
-def load_sqlite():
-	os.system("""wget "http://sourceforge.net/projects/trinotate/files/TRINOTATE_RESOURCES/20140708/Trinotate.20140708.swissTrEMBL.sqlite.gz/download" -O """+options.output+""".sqlite.gz""")
-	os.system("gunzip "+options.output+".sqlite.gz")
-	os.system("Trinotate "+options.output+".sqlite init --gene_trans_map "+options.trinity+".gene_trans_map --transcript_fasta "+options.trinity+" --transdecoder_pep "+options.trinity+".transdecoder.pep")
+def load_commands(cpu):
+	commands = ["""wget "http://sourceforge.net/projects/trinotate/files/TRINOTATE_RESOURCES/20140708/Trinotate.20140708.swissTrEMBL.sqlite.gz/download" -O """+options.output+""".sqlite.gz""", \
+	"gunzip -f "+options.output+".sqlite.gz", \
+	"Trinotate "+options.output+".sqlite init --gene_trans_map "+options.trinity+".gene_trans_map --transcript_fasta "+options.trinity+" --transdecoder_pep "+options.trinity+".transdecoder.pep"]
 	if options.swissprot == True:
-		os.system("Trinotate "+options.output+".sqlite LOAD_swissprot_blastp "+options.trinity+".uniprot.blastp.outfmt6")
-		os.system("Trinotate "+options.output+".sqlite LOAD_swissprot_blastx "+options.trinity+".uniprot.blastx.outfmt6")
+		commands.append("Trinotate "+options.output+".sqlite LOAD_swissprot_blastp "+options.trinity+".uniprot.blastp.outfmt6")
+		commands.append("Trinotate "+options.output+".sqlite LOAD_swissprot_blastx "+options.trinity+".uniprot.blastx.outfmt6")
 	if options.uniref == True:
-		os.system("Trinotate "+options.output+".sqlite LOAD_trembl_blastp "+options.trinity+".uniref90.blastp.outfmt6")
-		os.system("Trinotate "+options.output+".sqlite LOAD_trembl_blastx "+options.trinity+".uniref90.blastx.outfmt6")
-	os.system("Trinotate "+options.output+".sqlite LOAD_pfam "+options.trinity+".TrinotatePFAM.out")
-	os.system("Trinotate "+options.output+".sqlite LOAD_tmhmm "+options.trinity+".tmhmm.out")
-	os.system("Trinotate "+options.output+".sqlite LOAD_signalp "+options.trinity+".signalp.out")
-	os.system("Trinotate "+options.output+".sqlite LOAD_rnammer "+options.trinity+".rnammer.gff")
-	os.system("Trinotate "+options.output+".sqlite report > "+options.trinity+".report.xls")
+		commands.append("Trinotate "+options.output+".sqlite LOAD_trembl_blastp "+options.trinity+".uniref90.blastp.outfmt6")
+		commands.append("Trinotate "+options.output+".sqlite LOAD_trembl_blastx "+options.trinity+".uniref90.blastx.outfmt6")
+	if options.pfam == True:
+		commands.append("Trinotate "+options.output+".sqlite LOAD_pfam "+options.trinity+".TrinotatePFAM.out")
+	commands.append("Trinotate "+options.output+".sqlite LOAD_tmhmm "+options.trinity+".tmhmm.out")
+	commands.append("Trinotate "+options.output+".sqlite LOAD_signalp "+options.trinity+".signalp.out")
+	commands.append("Trinotate "+options.output+".sqlite LOAD_rnammer "+options.trinity+".rnammer.gff")
+	commands.append("Trinotate "+options.output+".sqlite report > "+options.trinity+".report.xls")
+	return commands
+
+def load_sqlite(stages):
+	return [Stage("load_sqlite", load_commands, requires=[stage.name for stage in stages], \
+	inputs=[path for stage in stages for path in stage.outputs], outputs=[options.output+".sqlite", options.trinity+".report.xls"])]
 
 
 
@@ -163,18 +239,20 @@ def load_sqlite():
 
 def main():
 	if options.databases is None:											# If reference is already indexed, can skip lengthy indexing
-		os.system("mkdir databases")										# make 'mapping' directory (may error if already present)
-		prepare_databases()
 		directory = "databases"
+		with metrics.stage("prepare databases"):
+			prepare_databases(directory)
 	else:
 		directory = options.databases
-	trinity_prepare()
-	run_blast(directory)
-	run_hmmer(directory)
-	run_signalp()
-	run_tmhmm()
-	run_rnammer()
-	load_sqlite()
+	stages = trinity_prepare() + run_blast(directory) + run_hmmer(directory) + run_signalp() + run_tmhmm() + run_rnammer()
+	stages += load_sqlite(stages)
+	with metrics.stage("pipeline", inputs=[options.trinity], outputs=stages[-1].outputs) as stage:	# Rows: stages run
+		try:
+			stage.rows += len(run_stages(stages, int(options.threads), manifest=options.trinity+".stages.json", force=options.force, \
+			from_stage=options.from_stage))
+		except (StageError, ValueError) as error:
+			sys.stderr.write("\n***Error: "+str(error)+"***\n\n")
+			sys.exit(1)
 	
 
 
@@ -182,5 +260,5 @@ def main():
 ###              Run Full Program             ###
 #################################################
 		
-main()
+instrument.run(main, metrics, options)
 		
\ No newline at end of file
@@ -2,8 +2,15 @@
 
 #print __name__
 
+from __future__ import print_function
 import optparse
-import json
+import sys
+from annotation_db import load_dictionary
+from count_annotator import annotate_count_table
+from annotation_service import AnnotationClient
+from compressed_io import CODECS
+import count_matrix
+import instrument
 
 usage_line = """
 annotate_counts.py
@@ -17,12 +24,23 @@ Script that annotates expression (counts) using a pre-made dictionary that is ba
 upon reciprocal best blast and one-way blast results using an well-annotated genome (e.g., Ensembl), which \
 indicates homology. The 'make_annotation_dictionary.py' script must be run first to build the annotation \
 dictionary. Input is a tab-delimited count table (with transcript ID as first column) and the output dictionary \
-from the 'make_annotation_dictionary.py' script (in json format). Output is an annotated count table with  \
+from the 'make_annotation_dictionary.py' script (binary or json format). Output is an annotated count table with  \
 transcript annotation IDs (e.g., Ensembl IDs) as the first column followed by all other input columns. \
 It is best to use the 'annotate_fasta.py' script to annotate the reference before reads are mapped and \
-counts are inferred.
+counts are inferred. With '--service', the table is annotated by a running 'annotation_service.py' (which keeps \
+the dictionary loaded between calls) instead of opening the dictionary. Compressed count tables (gzip, bgzip, bzip2, \
+xz or zstd) are read directly, and the output is compressed as its extension says ('.gz', '.bgz', '.bz2', '.xz', \
+'.zst') or with '--compress' ('--threads' compresses bgzip in background threads). With '--matrix', the count columns \
+are read into NumPy arrays a chunk of rows at a time (see 'count_matrix.py'; NumPy is needed for this mode only) and \
+'--aggregate' sums the rows of the same annotation ID ('annotation'), Trinity gene ('gene', i.e., cN_gM of the \
+cN_gM_iK isoforms, written with the annotations of its isoforms) or both ('both', one row per annotation and gene) \
+in the same pass, so isoform counts do not need summing with a separate tool (the counts are only parsed when \
+rows are summed). A header line starting with a tab (as in Trinity matrices), or any first line with '--header', \
+is kept. The time, rows and memory of each step are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' \
+and '--profile' write them as json and a cProfile dump).
 
-python annotate_counts.py -d <dictionary> -i <input_counts> -o <output_counts>"""
+python annotate_counts.py [-d <dictionary> | --service <socket>] -i <input_counts> -o <output_counts> \
+[--compress <codec> --threads <N> --matrix --aggregate <annotation|gene|both> --header --verbose --metrics <metrics.json> --profile <profile>]"""
 
 
 #################################################
@@ -35,36 +53,32 @@ parser = optparse.OptionParser(usage=usage)
 parser.add_option("-d", action="store", type = "string", dest = "dictionary", help = "premade annotation dictionary")
 parser.add_option("-i", action="store", type = "string", dest = "input", help = "input count table (transcript ID as first column)")
 parser.add_option("-o", action="store", type = "string", dest = "output", help = "output count table")
+parser.add_option("--service", action="store", type = "string", dest = "service", help = "socket of a running annotation service (instead of -d)")
+parser.add_option("--compress", action="store", type = "choice", choices = CODECS, dest = "compress", help = "output compression ("+", ".join(CODECS)+") [from the output extension]")
+parser.add_option("--threads", action="store", type = "int", dest = "threads", help = "background threads for bgzip input and output", default = 1)
+parser.add_option("--matrix", action="store_true", dest = "matrix", help = "count-matrix mode (NumPy arrays)", default = False)
+parser.add_option("--aggregate", action="store", type = "choice", choices = count_matrix.GROUPS, dest = "aggregate", help = "sum rows per annotation ID, Trinity gene or both ("+", ".join(count_matrix.GROUPS)+"; implies --matrix)")
+parser.add_option("--header", action="store_true", dest = "header", help = "the first line of the matrix is a header (found automatically when it starts with a tab, as Trinity writes it)", default = False)
+instrument.add_options(parser)
 
 options, args = parser.parse_args()
+if options.aggregate is not None:
+	options.matrix = True
+metrics = instrument.Instrument("annotate_counts.py")
 
 #################################################
 ###        Parse Annotation Dictionary	      ###
 #################################################
 
-## Establish decoding scheme to make all elements strings (read in as unicode)
-def _decode_dict(data):
-    rv = {}
-    for key, value in data.iteritems():
-        if isinstance(key, unicode):
-            key = key.encode('utf-8')
-        if isinstance(value, unicode):
-            value = value.encode('utf-8')
-        elif isinstance(value, list):
-            value = _decode_list(value)
-        elif isinstance(value, dict):
-            value = _decode_dict(value)
-        rv[key] = value
-    return rv
-
-## Open the json annotation dictionary and load it into dictionary element with decoding	
-if options.dictionary is None:		## If there is no annotation dictionary specified
-	print "\n***Error: specify input annotation dictionary!***\n"
+## Open the annotation dictionary (binary or json format) - the binary format is memory-mapped and queried lazily
+if options.service is not None:		## The dictionary is held by the annotation service
+	pass
+elif options.dictionary is None:		## If there is no annotation dictionary specified
+	print("\n***Error: specify input annotation dictionary!***\n")
 else:								## Annotation dictionary is specified!
-	print "\n***Parsing in pre-created annotation dictionary from file***\n"
-	with open(options.dictionary, "rb") as infile:
-		annotation_dict = json.load(infile, object_hook=_decode_dict)
-	#print annotation_dict
+	print("\n***Opening pre-created annotation dictionary from file***\n")
+	with metrics.stage("load dictionary", inputs=[options.dictionary]):
+		annotation_dict = load_dictionary(options.dictionary)
 		
 		
 #################################################
@@ -73,23 +87,28 @@ else:								## Annotation dictionary is specified!
 
 def annotate():
 	if options.input is None:									## If there is no input specified
-		print "\n***Error: specify input count table!***\n"
+		print("\n***Error: specify input count table!***\n")
 	if options.output is None:									## If there is no output specified
-		print "\n***Error: specify output count table!***\n"
+		print("\n***Error: specify output count table!***\n")
+	elif options.matrix and options.service is not None:		## The service annotates line by line
+		print("\n***Error: the count-matrix mode needs the dictionary (-d) rather than --service!***\n")
+	elif options.matrix and count_matrix.numpy is None:
+		print("\n***Error: the count-matrix mode needs NumPy!***\n")
 	else:														## If both input and output are specified
-		print "\n***Annotating count table***\n"
-		output = open(options.output, "w")		# Create writeable output file using user-supplied name
-		for foo in open(options.input).read().splitlines():		## Open input and split by lines
-			bar = foo.split()									## Tab-split elements
-			denovo = bar[0]
-			if denovo in annotation_dict.keys():				## If de novo assembly transcript name is in dictionary keys
-				line = annotation_dict[denovo]+"\t"+foo+"\n"	## Write EnsemblID<tab>original line
-				output.write(line)
-			elif denovo == "*":									## Retain special last line
-				line = "*\t"+foo+"\n"							## Write *<tab>original line
-				output.write(line)
-			else:												## If no matching EnsemblID (i.e., no annotation)
-				line = "unannotated_"+bar[0]+"\t"+foo+"\n"		## Write unannotated_denovoID<tab>original line
-				output.write(line)
+		print("\n***Annotating count table***\n")
+		with metrics.stage("annotate", inputs=[options.input], outputs=[options.output]) as stage:
+			if options.service is not None:						## Annotated by a running 'annotation_service.py'
+				with AnnotationClient(options.service) as client:
+					stage.rows += client.annotate_counts(options.input, options.output, options.compress)[0]
+			elif options.matrix:								## NumPy arrays, optionally summed per group
+				try:
+					total, annotated, rows = count_matrix.annotate_count_matrix(options.input, options.output, annotation_dict, \
+					options.aggregate, stage.counted, options.compress, options.threads, options.header)
+				except ValueError as error:
+					print("\n***Error: "+str(error)+"!***\n")
+					sys.exit(1)
+				print("Total rows:\t"+str(total)+"\nTotal annotated:\t"+str(annotated)+"\nRows written:\t"+str(rows))
+			else:
+				annotate_count_table(options.input, options.output, annotation_dict, stage.counted, options.compress, options.threads)
 				
-annotate()
\ No newline at end of file
+instrument.run(annotate, metrics, options)
\ No newline at end of file
@@ -4,8 +4,11 @@
 
 from __future__ import print_function
 import optparse
-import json
-from Bio import SeqIO
+from annotation_db import load_dictionary
+from fasta_annotator import annotate_fasta
+from annotation_service import AnnotationClient
+from compressed_io import CODECS
+import instrument
 
 usage_line = """
 annotate_fasta.py
@@ -19,11 +22,20 @@ Script that annotates assembly contigs (fasta format) using a pre-made dictionar
 upon reciprocal best blast and one-way blast results using an well-annotated genome (e.g., Ensembl), which \
 indicates homology. The 'make_annotation_dictionary.py' script must be run first to build the annotation \
 dictionary. Input is an assembly in fasta format and the output dictionary from the 'make_annotation_dictionary.py' \
-script (in json format). Output is an annotated fasta assembly with transcript annotation IDs \
+script (binary or json format). Output is an annotated fasta assembly with transcript annotation IDs \
 (e.g., Ensembl IDs) indicated in the contig headers. Also outputs the percentage of contigs that were annotated to \
-STOUT.
+STOUT. Only header lines are rewritten (sequence lines are copied through unchanged) and large assemblies are split \
+at record boundaries and annotated by several worker processes with the '--threads' option. The older Biopython \
+parser, which also writes each sequence on a single line, is still available with the '--seqio' option. With \
+'--service', the headers are rewritten by a running 'annotation_service.py' (which keeps the dictionary loaded \
+between calls and annotates with '--threads' worker threads) instead of opening the dictionary. Compressed \
+assemblies (gzip, bgzip, bzip2, xz or zstd) are read directly, and the output is compressed as its extension says ('.gz', '.bgz', '.bz2', '.xz', '.zst') or with \
+'--compress' (bgzip is inflated and deflated by '--threads' background threads). The time, \
+records and memory of each step are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them \
+as json and a cProfile dump).
 
-python annotate_fasta.py -d <dictionary> -i <input_fasta> -o <output_fasta>"""
+python annotate_fasta.py [-d <dictionary> | --service <socket>] -i <input_fasta> -o <output_fasta> [--threads <N> --compress <codec> --seqio \
+--verbose --metrics <metrics.json> --profile <profile>]"""
 
 #################################################
 ###           Parse command options           ###
@@ -35,42 +47,54 @@ parser = optparse.OptionParser(usage=usage)
 parser.add_option("-d", action="store", type = "string", dest = "dictionary", help = "premade annotation dictionary")
 parser.add_option("-i", action="store", type = "string", dest = "input", help = "input fasta sequence file")
 parser.add_option("-o", action="store", type = "string", dest = "output", help = "output fasta sequence file")
+parser.add_option("--threads", action="store", type = "int", dest = "threads", help = "number of worker processes", default = 1)
+parser.add_option("--seqio", action="store_true", dest = "seqio", help = "parse records with Biopython (unwraps sequence lines)", default = False)
+parser.add_option("--service", action="store", type = "string", dest = "service", help = "socket of a running annotation service (instead of -d)")
+parser.add_option("--compress", action="store", type = "choice", choices = CODECS, dest = "compress", help = "output compression ("+", ".join(CODECS)+") [from the output extension]")
+instrument.add_options(parser)
 
 options, args = parser.parse_args()
+metrics = instrument.Instrument("annotate_fasta.py")
 
 #################################################
 ###        Parse Annotation Dictionary	      ###
 #################################################
 
-## Establish decoding scheme to make all elements strings (read in as unicode)
-def _decode_dict(data):
-    rv = {}
-    for key, value in data.iteritems():
-        if isinstance(key, unicode):
-            key = key.encode('utf-8')
-        if isinstance(value, unicode):
-            value = value.encode('utf-8')
-        elif isinstance(value, list):
-            value = _decode_list(value)
-        elif isinstance(value, dict):
-            value = _decode_dict(value)
-        rv[key] = value
-    return rv
-
-## Open the json annotation dictionary and load it into dictionary element with decoding	
-if options.dictionary is None:		## If there is no annotation dictionary specified
+## Open the annotation dictionary (binary or json format) - the binary format is memory-mapped and queried lazily
+## (the default byte-level annotator opens the dictionary in each worker process instead)
+if options.dictionary is None and options.service is None:		## If there is no annotation dictionary specified
 	print("\n***Error: specify input annotation dictionary!***\n")
-else:								## Annotation dictionary is specified!
-	print("\n***Parsing in pre-created annotation dictionary from file***\n")
-	with open(options.dictionary, "rb") as infile:
-		annotation_dict = json.load(infile, object_hook=_decode_dict)
-	#print(annotation_dict)
+elif options.seqio and options.service is None:					## Annotation dictionary is specified!
+	print("\n***Opening pre-created annotation dictionary from file***\n")
+	with metrics.stage("load dictionary", inputs=[options.dictionary]):
+		annotation_dict = load_dictionary(options.dictionary)
 		
 		
 #################################################
 ###       		  Annotate Fasta        	  ###
 #################################################
 
+## Older Biopython annotator: parses every record and writes each sequence on a single line
+def annotate_seqio():
+	from Bio import SeqIO
+	output = open(options.output, "w")										## Create writeable output file using user-supplied name
+	infile = open(options.input, "rU")
+	total = 0																## Initialize total contigs counter
+	annotated = 0															## Initialize annotated contigs counter
+	assembly = SeqIO.parse(infile, "fasta")									## Open input and split by fasta
+	for sequence in assembly:												## For each sequence
+		total += 1
+		denovo = sequence.id
+		if denovo in annotation_dict:										## If de novo assembly transcript name is in dictionary keys
+			annotated += 1
+			line = str(">"+annotation_dict[denovo]+"\n"+sequence.seq+"\n")		## Write fasta line with new ensembl id as header
+			output.write(line)
+		else:																## If no matching EnsemblID (i.e., no annotation)
+			line = str(">"+"unannotated_"+sequence.id+"\n"+sequence.seq+"\n")	## Write fasta line with "unannotated_de novo id as header
+			output.write(line)
+	output.close()
+	return total, annotated
+
 def annotate():
 	if options.input is None:												## If there is no input specified
 		print("\n***Error: specify input fasta file!***\n")
@@ -78,26 +102,19 @@ def annotate():
 		print("\n***Error: specify output fasta file!***\n")
 	else:																	## If both input and output are specified
 		print("\n***Annotating assembly fasta headers***\n")
-		output = open(options.output, "w")									## Create writeable output file using user-supplied name
-		infile = open(options.input, "rU")
-		total = 0															## Initialize total contigs counter
-		annotated = 0														## Initialize annotated contigs counter
-		assembly = SeqIO.parse(infile, "fasta")								## Open input and split by fasta
-		for sequence in assembly:											## For each sequence
-			total += 1
-			print(total, end='\r')
-			denovo = sequence.id
-#			print(denovo)
-			if denovo in annotation_dict.keys():							## If de novo assembly transcript name is in dictionary keys
-				annotated += 1
-				line = str(">"+annotation_dict[denovo]+"\n"+sequence.seq+"\n")		## Write fasta line with new ensembl id as header
-				output.write(line)
-			else:															## If no matching EnsemblID (i.e., no annotation)
-				line = str(">"+"unannotated_"+sequence.id+"\n"+sequence.seq+"\n")	## Write fasta line with "unannotated_de novo id as header
-				output.write(line)
+		with metrics.stage("annotate", inputs=[options.input], outputs=[options.output]) as stage:
+			if options.service is not None:								## Annotated by a running 'annotation_service.py'
+				with AnnotationClient(options.service) as client:
+					total, annotated = client.annotate_fasta(options.input, options.output, options.threads, options.compress)
+			elif options.seqio:
+				total, annotated = annotate_seqio()
+			else:															## Rewrite headers only, in parallel byte ranges
+				total, annotated = annotate_fasta(options.input, options.output, options.dictionary, options.threads, codec=options.compress)
+			stage.rows += total
 
 		print("Total contigs:\t"+str(total))									##calculate basic statistics on annotation
 		print("Total annotated:\t"+str(annotated))
-		print("Percent annotated:\t"+str((float(annotated)/total)*100))
+		print("Percent annotated:\t"+str((float(annotated)/max(total, 1))*100))
 				
-annotate()
\ No newline at end of file
+if __name__ == '__main__':
+	instrument.run(annotate, metrics, options)
\ No newline at end of file
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+usage_line = """
+annotation_db.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Module and conversion script for the binary annotation dictionary written by 'make_annotation_dictionary.py' \
+and read by 'annotate_fasta.py' and 'annotate_counts.py'. The binary dictionary holds a sorted table of \
+contig ID/annotation ID pairs and a hashed key index, so it is memory-mapped and queried lazily instead of being \
+parsed into memory before annotation begins. Older json dictionaries can still be read by the annotation scripts, \
+and this script converts between the two formats in either direction.
+
+python annotation_db.py --to-json -i <binary_dictionary> -o <json_dictionary>
+python annotation_db.py --from-json -i <json_dictionary> -o <binary_dictionary>"""
+
+
+#################################################
+###          Binary dictionary layout         ###
+#################################################
+
+## header:  magic, number of entries, number of hash slots, offset of the key/value blob
+## entries: one per key (sorted by key) - blob offset, key length, value length
+## slots:   open-addressing hash table (crc32, linear probing) holding entry numbers
+## blob:    key bytes immediately followed by value bytes for every entry
+MAGIC = b"CADB0001"
+HEADER = struct.Struct("<8sQQQ")
+ENTRY = struct.Struct("<QII")
+SLOT = struct.Struct("<I")
+EMPTY = 0xFFFFFFFF
+
+
+def _to_bytes(text):
+	if isinstance(text, bytes):
+		return text
+	return text.encode("utf-8")
+
+def _to_str(data):
+	if bytes is str:												## Python 2 strings are already bytes
+		return data
+	return data.decode("utf-8")
+
+def _slot_count(count):
+	nslots = 8
+	while nslots < count * 2:										## Keep the hash table at most half full
+		nslots *= 2
+	return nslots
+
+
+#################################################
+###        Write binary dictionary            ###
+#################################################
+
+## Write any mapping of contig ID -> annotation ID to the binary format (written to a temporary file and renamed into place)
+def write_annotation_db(mapping, path):
+	items = sorted((_to_bytes(key), _to_bytes(value)) for key, value in mapping.items())
+	count = len(items)
+	nslots = _slot_count(count)
+	mask = nslots - 1
+	slots = array("I", [EMPTY]) * nslots
+	entries = bytearray(ENTRY.size * count)
+	offset = 0
+	for index, (key, value) in enumerate(items):
+		ENTRY.pack_into(entries, index * ENTRY.size, offset, len(key), len(value))
+		offset += len(key) + len(value)
+		slot = zlib.crc32(key) & mask
+		while slots[slot] != EMPTY:									## Linear probing on collision
+			slot = (slot + 1) & mask
+		slots[slot] = index
+	if sys.byteorder == "big":										## Slots are stored little-endian
+		slots.byteswap()
+	blob_offset = HEADER.size + len(entries) + nslots * SLOT.size
+	tmp = path + ".tmp"
+	with open(tmp, "wb") as outfile:
+		outfile.write(HEADER.pack(MAGIC, count, nslots, blob_offset))
+		outfile.write(entries)
+		outfile.write(slots.tobytes() if hasattr(slots, "tobytes") else slots.tostring())
+		for key, value in items:
+			outfile.write(key)
+			outfile.write(value)
+	os.rename(tmp, path)
+
+
+#################################################
+###         Read binary dictionary            ###
+#################################################
+
+## Read-only, memory-mapped view of a binary dictionary that behaves like the old python dictionary
+class AnnotationDB(object):
+
+	def __init__(self, path):
+		self.path = path
+		self._file = open(path, "rb")
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, self._count, self._nslots, self._blob = HEADER.unpack_from(self._map, 0)
+		if magic != MAGIC:
+			raise ValueError("%s is not a binary annotation dictionary" % path)
+		self._mask = self._nslots - 1
+		self._entries = HEADER.size
+		self._slots = HEADER.size + self._count * ENTRY.size
+
+	def _entry(self, index):
+		offset, klen, vlen = ENTRY.unpack_from(self._map, self._entries + index * ENTRY.size)
+		start = self._blob + offset
+		return start, klen, vlen
+
+	## Raw lookup on bytes, returning the annotation as bytes or None (used by the byte-level annotators)
+	def get_bytes(self, key):
+		buf = self._map
+		slot = zlib.crc32(key) & self._mask
+		while True:
+			index = SLOT.unpack_from(buf, self._slots + slot * SLOT.size)[0]
+			if index == EMPTY:
+				return None
+			start, klen, vlen = self._entry(index)
+			if klen == len(key) and buf[start:start + klen] == key:
+				return buf[start + klen:start + klen + vlen]
+			slot = (slot + 1) & self._mask
+
+	def get(self, key, default=None):
+		value = self.get_bytes(_to_bytes(key))
+		if value is None:
+			return default
+		return _to_str(value)
+
+	def __getitem__(self, key):
+		value = self.get(key)
+		if value is None:
+			raise KeyError(key)
+		return value
+
+	def __contains__(self, key):
+		return self.get_bytes(_to_bytes(key)) is not None
+
+	def __len__(self):
+		return self._count
+
+	## Keys and items are produced in sorted key order
+	def iteritems(self):
+		buf = self._map
+		for index in range(self._count):
+			start, klen, vlen = self._entry(index)
+			yield _to_str(buf[start:start + klen]), _to_str(buf[start + klen:start + klen + vlen])
+
+	items = iteritems
+
+	def __iter__(self):
+		for key, value in self.iteritems():
+			yield key
+
+	keys = __iter__
+
+	def close(self):
+		self._map.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+#################################################
+###     Open either dictionary format         ###
+#################################################
+
+## Establish decoding scheme to make all elements strings (json is read in as unicode on Python 2)
+def _decode_dict(data):
+	if bytes is not str:
+		return data
+	return dict((_to_bytes(key), _to_bytes(value)) for key, value in data.items())
+
+def is_annotation_db(path):
+	with open(path, "rb") as infile:
+		return infile.read(len(MAGIC)) == MAGIC
+
+## Open a dictionary written by 'make_annotation_dictionary.py' in either the binary or the json format
+def load_dictionary(path):
+	if is_annotation_db(path):
+		return AnnotationDB(path)
+	with open(path, "r") as infile:
+		return _decode_dict(json.load(infile))
+
+## Stream a dictionary (binary or python) out as a json object without building a second copy in memory
+def export_json(mapping, path):
+	with open(path, "w") as outfile:
+		outfile.write("{")
+		first = True
+		for key, value in sorted(mapping.items()) if isinstance(mapping, dict) else mapping.items():
+			if not first:
+				outfile.write(", ")
+			outfile.write(json.dumps(_to_str(_to_bytes(key))) + ": " + json.dumps(_to_str(_to_bytes(value))))
+			first = False
+		outfile.write("}")
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("--to-json", action = "store_true", dest = "to_json", help = "convert a binary dictionary to json", default = False)
+	parser.add_option("--from-json", action = "store_true", dest = "from_json", help = "convert a json dictionary to binary", default = False)
+	parser.add_option("-i", action = "store", type = "string", dest = "input", help = "input dictionary")
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output dictionary")
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.input is None:
+		print("\n***Error: specify the input dictionary!***\n")
+	elif options.output is None:
+		print("\n***Error: specify the output dictionary!***\n")
+	elif options.to_json == options.from_json:
+		print("\n***Error: specify exactly one of --to-json or --from-json!***\n")
+## When all input is present
+	else:
+		mapping = load_dictionary(options.input)
+		if options.to_json:
+			print("\n***Exporting dictionary in json format***\n")
+			export_json(mapping, options.output)
+		else:
+			print("\n***Writing binary dictionary***\n")
+			write_annotation_db(mapping, options.output)
+
+if __name__ == '__main__':
+	main()
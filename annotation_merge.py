@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import re
+import sys
+from compressed_io import open_input
+
+## Priority merge of homology sources used by 'make_annotation_dictionary.py'
+## Sources are reciprocal best-hit (rN) and one-way best-hit (bN) tables with target contig IDs in column 1 and
+## reference IDs in column 2 (and, for one-way tables, a third column that is kept in the annotation). They are read
+## as streams in confidence order, and each contig keeps the annotation of the first (most trusted) source and line
+## that has it: RBH hits become '<reference>_rbhN' and one-way hits '<reference>_oneN_<column 3>'. Contig IDs and
+## annotations are kept as bytes, as the binary annotation dictionary stores them. Sources can be compressed (see
+## 'compressed_io.py').
+
+SOURCE = re.compile(r"^([rb])([1-9][0-9]*)$")
+
+
+#################################################
+###               Source labels               ###
+#################################################
+
+## ('r' or 'b', number) for a source label such as 'r1' or 'b12', or None
+def parse_label(label):
+	match = SOURCE.match(label.strip())
+	if match is None:
+		return None
+	return match.group(1), int(match.group(2))
+
+## Option destination of a source label (as named in 'make_annotation_dictionary.py')
+def source_dest(label):
+	kind, number = parse_label(label)
+	return ("reciprocal" if kind == "r" else "oneway") + str(number)
+
+
+#################################################
+###              Merge the sources            ###
+#################################################
+
+## Add the contigs of one source that are not annotated yet; returns (lines read, contigs added)
+def merge_source(path, label, annotation):
+	kind, number = parse_label(label)
+	rows = 0
+	before = len(annotation)
+	with open_input(path) as infile:
+		if kind == "r":
+			suffix = ("_rbh" + str(number)).encode("ascii")
+			for line in infile:
+				rows += 1
+				fields = line.split(None, 2)
+				if len(fields) > 1 and fields[0] not in annotation:
+					annotation[fields[0]] = fields[1] + suffix
+		else:
+			suffix = ("_one" + str(number) + "_").encode("ascii")
+			for line in infile:
+				rows += 1
+				fields = line.split(None, 3)
+				if len(fields) > 2 and fields[0] not in annotation:
+					annotation[fields[0]] = fields[1] + suffix + fields[2]
+	return rows, len(annotation) - before
+
+## Merge (label, path) sources in confidence order into 'annotation'; returns [(label, path, lines, contigs added)]
+## (with an 'instrument.Instrument', each source is recorded as a stage)
+def merge_sources(sources, annotation, log=sys.stdout, instrument=None):
+	counts = []
+	for label, path in sources:
+		if instrument is None:
+			rows, added = merge_source(path, label, annotation)
+		else:
+			with instrument.stage("merge "+label, inputs=[path]) as stage:
+				rows, added = merge_source(path, label, annotation)
+				stage.rows += rows
+		counts.append((label, path, rows, added))
+		log.write(label+"\t"+path+"\t"+str(rows)+" lines\t"+str(added)+" new contigs\n")
+		log.flush()
+	return counts
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from annotation_db import load_dictionary
+from count_annotator import annotate_count_table
+from fasta_annotator import annotate_fasta_with
+try:
+	import socketserver
+except ImportError:													## Python 2
+	import SocketServer as socketserver
+
+usage_line = """
+annotation_service.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Resident annotation service (and its client) that opens an annotation dictionary from \
+'make_annotation_dictionary.py' (binary or json format) once and keeps it loaded, so pipelines that annotate many \
+count tables or assemblies do not reload it for every file. 'serve' listens on a Unix socket (readable by the user \
+only) until it is stopped; the dictionary is reopened automatically when its file changes. The other commands are \
+the client: 'lookup' prints the annotations of transcript IDs (given as arguments or one per line with '-i'; \
+'-' for IDs that are not annotated), 'counts' and 'fasta' annotate a whole count table or fasta file (as \
+'annotate_counts.py' and 'annotate_fasta.py' do, and those scripts can also use the service with '--service'), \
+'ping' reports the loaded dictionary and 'stop' shuts the service down. Requests and replies are single json \
+lines, so several clients can be connected at once; from Python, 'AnnotationClient' talks to a running service and \
+'AnnotationService' can be used in-process.
+
+python annotation_service.py serve -d <dictionary> -s <socket>
+python annotation_service.py lookup -s <socket> [-i <ID_list>] [<ID> ...]
+python annotation_service.py counts -s <socket> -i <input_counts> -o <output_counts>
+python annotation_service.py fasta -s <socket> -i <input_fasta> -o <output_fasta> [--threads <N>]
+python annotation_service.py [ping | stop] -s <socket>"""
+
+TEXT = (type(""), type(u""))											## json strings (unicode on Python 2)
+
+
+class AnnotationServiceError(Exception):
+	pass
+
+
+#################################################
+###           Resident dictionary             ###
+#################################################
+
+## Size and modification time of the dictionary file, used to notice when it is rebuilt
+def fingerprint(path):
+	info = os.stat(path)
+	return info.st_size, info.st_mtime
+
+## Annotation requests answered from a dictionary that is opened once and reopened only when its file changes
+class AnnotationService(object):
+
+	def __init__(self, dictionary_path):
+		self.path = os.path.abspath(dictionary_path)
+		self.lock = threading.Lock()
+		self.requests = 0
+		self._load()
+
+	def _load(self):
+		start = time.time()
+		self.state = fingerprint(self.path)
+		self.dictionary = load_dictionary(self.path)
+		self.load_seconds = time.time() - start
+
+	## The dictionary, reopened first when its file was rebuilt (requests already running keep the old one)
+	def current(self):
+		with self.lock:
+			self.requests += 1
+			if fingerprint(self.path) != self.state:
+				self._load()
+			return self.dictionary
+
+	## Annotations of 'ids' in order (None for IDs that are not annotated)
+	def lookup(self, ids):
+		dictionary = self.current()
+		return [dictionary.get(denovo) for denovo in ids]
+
+	def annotate_counts(self, input_path, output_path, codec=None):
+		return annotate_count_table(input_path, output_path, self.current(), codec=codec)
+
+	## Worker threads share the resident dictionary (forking inside a request thread could deadlock the children)
+	def annotate_fasta(self, input_path, output_path, threads=1, codec=None):
+		return annotate_fasta_with(input_path, output_path, self.current(), codec=codec, threads=threads)
+
+	def status(self):
+		return {"dictionary": self.path, "entries": len(self.dictionary), "load_seconds": round(self.load_seconds, 4), \
+		"requests": self.requests, "pid": os.getpid()}
+
+	## Answer one request (a dictionary with an 'op' field); errors are returned rather than raised
+	def handle(self, request):
+		if not isinstance(request, dict):
+			return {"ok": False, "error": "request is not a json object"}
+		try:
+			op = request.get("op")
+			if op == "lookup":
+				ids = request["ids"]
+				if not isinstance(ids, list) or not all(isinstance(denovo, TEXT) for denovo in ids):
+					return {"ok": False, "error": "'ids' must be a list of strings"}
+				return {"ok": True, "annotations": self.lookup(ids)}
+			if op in ("counts", "fasta"):
+				if not isinstance(request["input"], TEXT) or not isinstance(request["output"], TEXT) or \
+				not isinstance(request.get("compress", ""), TEXT + (type(None),)):
+					return {"ok": False, "error": "'input', 'output' and 'compress' must be strings"}
+			if op == "counts":
+				total, annotated = self.annotate_counts(request["input"], request["output"], request.get("compress"))
+				return {"ok": True, "total": total, "annotated": annotated}
+			if op == "fasta":
+				threads = request.get("threads", 1)
+				if not isinstance(threads, int) or isinstance(threads, bool) or threads < 1:
+					return {"ok": False, "error": "'threads' must be a whole number of at least 1"}
+				total, annotated = self.annotate_fasta(request["input"], request["output"], threads, request.get("compress"))
+				return {"ok": True, "total": total, "annotated": annotated}
+			if op == "ping":
+				return dict(self.status(), ok=True)
+			if op == "stop":
+				return {"ok": True}
+			return {"ok": False, "error": "unknown request '"+str(op)+"'"}
+		except KeyError as error:
+			return {"ok": False, "error": "request is missing "+str(error)}
+		except (IOError, OSError, ValueError) as error:
+			return {"ok": False, "error": str(error)}
+
+
+#################################################
+###                Socket server              ###
+#################################################
+
+class _Handler(socketserver.StreamRequestHandler):
+
+	def handle(self):
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			try:
+				request = json.loads(line.decode("utf-8"))
+			except ValueError:
+				request = {}
+			reply = self.server.service.handle(request)
+			self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+			self.wfile.flush()
+			if isinstance(request, dict) and request.get("op") == "stop":
+				threading.Thread(target=self.server.shutdown).start()
+				return
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+	daemon_threads = True
+
+## True when a service is answering on 'socket_path'
+def is_running(socket_path):
+	try:
+		with AnnotationClient(socket_path) as client:
+			client.ping()
+		return True
+	except (socket.error, AnnotationServiceError):
+		return False
+
+## Serve 'service' on the Unix socket 'socket_path' until a 'stop' request (a stale socket file is replaced)
+def serve(service, socket_path, log=sys.stderr):
+	if os.path.exists(socket_path):
+		if is_running(socket_path):
+			raise AnnotationServiceError("a service is already running on "+socket_path)
+		os.remove(socket_path)
+	umask = os.umask(0o077)												## Socket only usable by this user
+	try:
+		server = _Server(socket_path, _Handler)
+	finally:
+		os.umask(umask)
+	server.service = service
+	log.write("Serving "+service.path+" ("+str(len(service.dictionary))+" entries, loaded in "+ \
+	"%.2f" % service.load_seconds+" s) on "+socket_path+"\n")
+	log.flush()
+	try:
+		server.serve_forever()
+	finally:
+		server.server_close()
+		if os.path.exists(socket_path):
+			os.remove(socket_path)
+
+
+#################################################
+###                   Client                  ###
+#################################################
+
+## Connection to a running service; file paths are sent as absolute paths
+class AnnotationClient(object):
+
+	def __init__(self, socket_path, timeout=None):
+		self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.socket.settimeout(timeout)
+		try:
+			self.socket.connect(socket_path)
+		except socket.error:
+			self.socket.close()
+			raise
+		self.file = self.socket.makefile("rwb")
+
+	def request(self, op, **fields):
+		fields["op"] = op
+		self.file.write((json.dumps(fields) + "\n").encode("utf-8"))
+		self.file.flush()
+		line = self.file.readline()
+		if not line:
+			raise AnnotationServiceError("the service closed the connection")
+		reply = json.loads(line.decode("utf-8"))
+		if not reply.get("ok"):
+			raise AnnotationServiceError(reply.get("error", "request failed"))
+		return reply
+
+	def lookup(self, ids):
+		return self.request("lookup", ids=list(ids))["annotations"]
+
+	def annotate_counts(self, input_path, output_path, codec=None):
+		reply = self.request("counts", input=os.path.abspath(input_path), output=os.path.abspath(output_path), compress=codec)
+		return reply["total"], reply["annotated"]
+
+	def annotate_fasta(self, input_path, output_path, threads=1, codec=None):
+		reply = self.request("fasta", input=os.path.abspath(input_path), output=os.path.abspath(output_path), threads=threads, \
+		compress=codec)
+		return reply["total"], reply["annotated"]
+
+	def ping(self):
+		return self.request("ping")
+
+	def stop(self):
+		return self.request("stop")
+
+	def close(self):
+		self.file.close()
+		self.socket.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-d", action = "store", type = "string", dest = "dictionary", help = "annotation dictionary to serve")
+	parser.add_option("-s", action = "store", type = "string", dest = "socket", help = "Unix socket of the service")
+	parser.add_option("-i", action = "store", type = "string", dest = "input", help = "input count table, fasta file or ID list")
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output count table or fasta file")
+	parser.add_option("--threads", action = "store", type = "int", dest = "threads", help = "worker threads of the service for fasta annotation [1]", default = 1)
+	options, args = parser.parse_args()
+## Check for missing user input
+	commands = ["serve", "lookup", "counts", "fasta", "ping", "stop"]
+	if not args or args[0] not in commands:
+		sys.stderr.write("\n***Error: specify one of the commands "+", ".join(commands)+"!***\n\n")
+		sys.exit(1)
+	if options.socket is None:
+		sys.stderr.write("\n***Error: specify the socket of the service!***\n\n")
+		sys.exit(1)
+	command = args[0]
+	if command == "serve" and options.dictionary is None:
+		sys.stderr.write("\n***Error: specify the annotation dictionary to serve!***\n\n")
+		sys.exit(1)
+	if command in ("counts", "fasta") and (options.input is None or options.output is None):
+		sys.stderr.write("\n***Error: specify the input and output files!***\n\n")
+		sys.exit(1)
+## When all input is present
+	try:
+		if command == "serve":
+			serve(AnnotationService(options.dictionary), options.socket)
+			return
+		with AnnotationClient(options.socket) as client:
+			if command == "lookup":
+				ids = args[1:]
+				if options.input is not None:
+					with open(options.input) as infile:
+						ids += [line.strip() for line in infile if line.strip()]
+				for denovo, annotation in zip(ids, client.lookup(ids)):
+					print(denovo+"\t"+(annotation if annotation is not None else "-"))
+			elif command == "counts":
+				total, annotated = client.annotate_counts(options.input, options.output)
+				print("Total rows:\t"+str(total)+"\nTotal annotated:\t"+str(annotated))
+			elif command == "fasta":
+				total, annotated = client.annotate_fasta(options.input, options.output, options.threads)
+				print("Total contigs:\t"+str(total)+"\nTotal annotated:\t"+str(annotated))
+			elif command == "ping":
+				for key, value in sorted(client.ping().items()):
+					if key != "ok":
+						print(key+"\t"+str(value))
+			else:
+				client.stop()
+	except socket.error as error:
+		sys.stderr.write("\n***Error: cannot reach the service on "+options.socket+" ("+str(error)+")!***\n\n")
+		sys.exit(1)
+	except AnnotationServiceError as error:
+		sys.stderr.write("\n***Error: "+str(error)+"!***\n\n")
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
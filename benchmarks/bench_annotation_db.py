@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from annotation_db import write_annotation_db, load_dictionary
+
+usage_line = """
+bench_annotation_db.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Benchmark comparing the json annotation dictionary with the binary, memory-mapped dictionary. A synthetic \
+dictionary of Trinity-style contig IDs is written in both formats, then each format is opened in a fresh \
+process that performs a number of random lookups. Load time, lookup time and peak resident memory (RSS) are \
+reported for each format, and can optionally be written as json.
+
+python bench_annotation_db.py [-n <entries> -l <lookups> --output <results.json>]"""
+
+
+#################################################
+###          Build synthetic dictionary       ###
+#################################################
+
+def synthetic_dictionary(entries):
+	annotation_dict = {}
+	for number in range(entries):
+		denovo = "c%d_g%d_i%d" % (number // 4, number % 3 + 1, number % 4 + 1)
+		annotation_dict[denovo] = "ENSACAT%011d_rbh1" % number
+	return annotation_dict
+
+
+#################################################
+###        Time one format (child process)    ###
+#################################################
+
+## Peak RSS of this process in kB (VmHWM is reset on exec, unlike ru_maxrss which also counts the forked parent)
+def peak_rss():
+	if os.path.exists("/proc/self/status"):
+		for line in open("/proc/self/status"):
+			if line.startswith("VmHWM:"):
+				return int(line.split()[1])
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+## Run in a fresh interpreter so that peak RSS reflects only the dictionary being measured
+def child(kind, path, lookups):
+	keys = []
+	for line in open(path + ".keys"):
+		if len(keys) == lookups:
+			break
+		keys.append(line.rstrip("\n"))
+	start = time.time()
+	if kind == "json":
+		with open(path, "r") as infile:
+			annotation_dict = json.load(infile)
+	else:
+		annotation_dict = load_dictionary(path)
+	loaded = time.time()
+	found = 0
+	for key in keys:
+		if key in annotation_dict:
+			found += 1
+			annotation_dict[key]
+	finished = time.time()
+	print(json.dumps({"format": kind, "load_seconds": loaded - start, "lookup_seconds": finished - loaded,
+		"lookups": len(keys), "found": found, "peak_rss_kb": peak_rss()}))
+
+def measure(kind, path, lookups):
+	output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", kind, "--path", path, "-l", str(lookups)])
+	return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-n", action = "store", type = "int", dest = "entries", help = "number of dictionary entries", default = 1000000)
+	parser.add_option("-l", action = "store", type = "int", dest = "lookups", help = "number of random lookups", default = 100000)
+	parser.add_option("--output", action = "store", type = "string", dest = "output", help = "write results as json")
+	parser.add_option("--child", action = "store", type = "string", dest = "child", help = optparse.SUPPRESS_HELP)
+	parser.add_option("--path", action = "store", type = "string", dest = "path", help = optparse.SUPPRESS_HELP)
+	options, args = parser.parse_args()
+	if options.child is not None:
+		child(options.child, options.path, options.lookups)
+		return
+	workdir = tempfile.mkdtemp(prefix="bench_annotation_db.")
+	try:
+		print("\n***Writing synthetic dictionary with "+str(options.entries)+" entries***\n")
+		annotation_dict = synthetic_dictionary(options.entries)
+		keys = list(annotation_dict.keys()) + ["unannotated_%d" % x for x in range(options.entries // 10)]
+		random.seed(1)
+		random.shuffle(keys)
+		json_path = os.path.join(workdir, "dictionary.json")
+		db_path = os.path.join(workdir, "dictionary.adb")
+		with open(json_path, "w") as outfile:
+			json.dump(annotation_dict, outfile)
+		write_annotation_db(annotation_dict, db_path)
+		for path in (json_path, db_path):
+			with open(path + ".keys", "w") as outfile:
+				outfile.write("\n".join(keys) + "\n")
+		del annotation_dict
+		results = []
+		for kind, path in (("json", json_path), ("binary", db_path)):
+			result = measure(kind, path, options.lookups)
+			result["entries"] = options.entries
+			result["file_bytes"] = os.path.getsize(path)
+			results.append(result)
+			print(kind+"\tload "+"%.3f" % result["load_seconds"]+" s\tlookups "+"%.3f" % result["lookup_seconds"]+ \
+			" s\tpeak RSS "+str(result["peak_rss_kb"])+" kB\tfile "+str(result["file_bytes"])+" bytes")
+		if options.output is not None:
+			with open(options.output, "w") as outfile:
+				json.dump(results, outfile, indent=1)
+	finally:
+		shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import filecmp
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from orthorbb_merge import merge, output_names
+
+usage_line = """
+bench_orthorbb_merge.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Benchmark comparing the post-BLAST steps of 'orthorbb' done by the original shell pipeline ('orthorbb -x -l') \
+with the in-process merge of 'orthorbb_merge.py'. Synthetic top1hits tables (outfmt 6) and a query fasta are \
+written, both versions are run on them in separate directories, the run times are reported and the four output \
+files are compared byte for byte. The shell defaults to zsh (bash is used when zsh is not installed) and sort/awk \
+are run in the C locale. Note that mawk writes the '|RBB'/'|OBB' tags as '\\|RBB'/'\\|OBB' (gawk does not), so \
+the homology annotation file only matches when awk is gawk.
+
+python bench_orthorbb_merge.py [-n <query_proteins> --shell <shell> --output <results.json>]"""
+
+
+#################################################
+###         Synthetic top1hits tables         ###
+#################################################
+
+def hit_row(query, subject, rng):
+	evalue = rng.choice(["0.0", "%de-%02d" % (rng.randint(1, 9), rng.randint(5, 180)), "%.2e" % (rng.random() / 100), "%.3f" % rng.random()])
+	bitscore = "%.1f" % rng.uniform(30, 1500)
+	qstart = rng.randint(1, 50)
+	sstart = rng.randint(1, 50)
+	length = rng.randint(50, 800)
+	return "\t".join([query, subject, "%.3f" % rng.uniform(25, 100), str(length), str(rng.randint(0, 80)), str(rng.randint(0, 10)),
+		str(qstart), str(qstart + length), str(sstart), str(sstart + length), evalue, bitscore]) + "\n"
+
+## Best subject (with one to three HSPs) for most sequences; 'partner' gives the reciprocal best hit when there is one
+def top1_table(path, queries, subjects, partner, rng):
+	with open(path, "w") as outfile:
+		for query in queries:
+			if rng.random() < 0.1:
+				continue
+			subject = partner.get(query) if query in partner and rng.random() < 0.9 else rng.choice(subjects)
+			for hsp in range(rng.choice([1, 1, 1, 2, 3])):
+				outfile.write(hit_row(query, subject, rng))
+
+def write_inputs(directory, count, qry, ref, reval):
+	rng = random.Random(1)
+	queries = ["%s_%07d-RA" % (qry, number) for number in range(count)]
+	references = ["%s_%07d" % (ref, number) for number in range(int(count * 0.8))]
+	partner = dict(zip(queries, rng.sample(references, len(references))))
+	reverse_partner = dict((value, key) for key, value in partner.items())
+	top1_table(os.path.join(directory, "qry-"+qry+"_2_ref-"+ref+"_blastp_e"+reval+".top1hits.fmt6.txt"), queries, references, partner, rng)
+	top1_table(os.path.join(directory, "qry-"+ref+"_2_ref-"+qry+"_blastp_e"+reval+".top1hits.fmt6.txt"), references, queries, reverse_partner, rng)
+	with open(os.path.join(directory, "query.fasta"), "w") as outfile:
+		for query in queries:
+			outfile.write(">"+query+" protein\nMSTNPKPQRKTKRNTNRRPQDVKFPGG\n")
+
+
+#################################################
+###            Run both versions              ###
+#################################################
+
+def on_path(program):
+	return any(os.access(os.path.join(directory, program), os.X_OK) for directory in os.environ.get("PATH", "").split(os.pathsep))
+
+def run_shell(shell, directory, qry, ref, reval, oeval):
+	environment = dict(os.environ, LC_ALL="C")
+	command = [shell, os.path.join(os.path.abspath(ROOT), "orthorbb"), "-x", "-l", "-p", "query.fasta", "-q", qry, "-r", ref, "-e", reval, "-f", oeval]
+	start = time.time()
+	with open(os.devnull, "w") as devnull:
+		subprocess.check_call(command, cwd=directory, env=environment, stdout=devnull)
+	return time.time() - start
+
+def run_python(directory, qry, ref, reval, oeval):
+	here = os.getcwd()
+	os.chdir(directory)
+	try:
+		start = time.time()
+		merge("qry-"+qry+"_2_ref-"+ref+"_blastp_e"+reval+".top1hits.fmt6.txt", "qry-"+ref+"_2_ref-"+qry+"_blastp_e"+reval+".top1hits.fmt6.txt",
+			"query.fasta", output_names(qry, ref, reval, oeval), oeval)
+		return time.time() - start
+	finally:
+		os.chdir(here)
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-n", action = "store", type = "int", dest = "count", help = "number of query proteins", default = 200000)
+	parser.add_option("--shell", action = "store", type = "string", dest = "shell", help = "shell used to run 'orthorbb' [zsh, else bash]")
+	parser.add_option("--output", action = "store", type = "string", dest = "output", help = "write results as json")
+	options, args = parser.parse_args()
+	shell = options.shell or ("zsh" if on_path("zsh") else "bash")
+	qry, ref, reval, oeval = "QRY", "REF", "0.001", "1e-5"
+	workdir = tempfile.mkdtemp(prefix="bench_orthorbb_merge.")
+	try:
+		print("\n***Writing synthetic top1hits tables for "+str(options.count)+" query proteins***\n")
+		shell_dir = os.path.join(workdir, "shell")
+		python_dir = os.path.join(workdir, "python")
+		os.mkdir(shell_dir)
+		write_inputs(shell_dir, options.count, qry, ref, reval)
+		shutil.copytree(shell_dir, python_dir)
+		results = {"query_proteins": options.count, "shell": shell,
+			"shell_seconds": run_shell(shell, shell_dir, qry, ref, reval, oeval),
+			"python_seconds": run_python(python_dir, qry, ref, reval, oeval), "identical": {}}
+		for kind, name in sorted(output_names(qry, ref, reval, oeval).items()):
+			results["identical"][kind] = filecmp.cmp(os.path.join(shell_dir, name), os.path.join(python_dir, name), shallow=False)
+## mawk keeps the backslash of "\|RBB"; compare the annotation tables without it
+		name = output_names(qry, ref, reval, oeval)["annotation"]
+		with open(os.path.join(shell_dir, name)) as infile:
+			shell_table = infile.read()
+		if "\\|" in shell_table:
+			with open(os.path.join(python_dir, name)) as infile:
+				results["identical"]["annotation_without_mawk_backslash"] = shell_table.replace("\\|", "|") == infile.read()
+		print("shell\t"+"%.3f" % results["shell_seconds"]+" s\npython\t"+"%.3f" % results["python_seconds"]+" s")
+		for kind, same in sorted(results["identical"].items()):
+			print(kind+"\t"+("identical" if same else "DIFFERENT"))
+		if options.output is not None:
+			with open(options.output, "w") as outfile:
+				json.dump(results, outfile, indent=1)
+	finally:
+		shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, "..")
+sys.path.insert(0, BENCH)
+from synthetic_data import write_dataset
+
+usage_line = """
+bench_suite.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Scaling benchmark of the annotation tools. For each size (number of contigs, default 10^4 and 10^5; up to 10^8 \
+can be given), synthetic inputs shaped like 'sample_data' are written with 'synthetic_data.py', then each tool is \
+run on them as a separate process: 'make_annotation_dictionary.py', 'annotate_counts.py', 'annotate_fasta.py', \
+'homology_BESThit_parsing.py --tabular' (RBH parsing) and 'genestats.py' (gene structure measures). The wall time \
+and peak resident memory (RSS, from the rusage of each process; this includes the few MB of the benchmark process \
+it was started from, see the 'interpreter' baseline) are reported and written as json together with the commit and \
+Python version. Given the json results of an earlier run ('--compare'), the time and memory of every benchmark \
+at every size are compared, and the script exits with status 1 when one is slower or larger by more than the \
+threshold (default 1.25 times; runs shorter than 0.05 s are not judged on time). With '--repeat', each benchmark is \
+run several times and the shortest time is kept, which makes comparisons on a busy machine less noisy.
+
+python bench_suite.py [--sizes <N,N,...> --only <benchmark,...> --repeat <N> --output <results.json> --compare <old_results.json> \
+--threshold <ratio> --workdir <directory> --keep]"""
+
+BENCHMARKS = ["interpreter", "make_annotation_dictionary", "annotate_counts", "annotate_fasta", "rbh_parsing", "genestats"]
+
+
+#################################################
+###            Run and measure a tool         ###
+#################################################
+
+def script(name):
+	return os.path.join(ROOT, name)
+
+## Command line of each benchmark on the data set 'paths', with its outputs in 'workdir'
+def commands(paths, workdir):
+	dictionary = os.path.join(workdir, "dictionary.adb")
+	return {
+		"interpreter": [sys.executable, "-c", "pass"],
+		"make_annotation_dictionary": [sys.executable, script("make_annotation_dictionary.py"), "--r1", paths["reciprocal"], \
+		"--b1", paths["oneway"], "--confidence", "r1,b1", "--out", dictionary],
+		"annotate_counts": [sys.executable, script("annotate_counts.py"), "-d", dictionary, "-i", paths["counts"], \
+		"-o", os.path.join(workdir, "counts.annotated.tsv")],
+		"annotate_fasta": [sys.executable, script("annotate_fasta.py"), "-d", dictionary, "-i", paths["fasta"], \
+		"-o", os.path.join(workdir, "contigs.annotated.fa")],
+		"rbh_parsing": [sys.executable, script("homology_BESThit_parsing.py"), "--tabular", "-o", paths["blast_oneway"], \
+		"-r", paths["blast_reciprocal"], "--oneway", os.path.join(workdir, "oneway.tsv"), "--reciprocal", \
+		os.path.join(workdir, "rbh.tsv")],
+		"genestats": [sys.executable, script("genestats.py"), "-i", paths["gff"], "-o", os.path.join(workdir, "genestats.tsv")],
+	}
+
+## Run a command (output discarded) and return (seconds, peak RSS in kB) from the rusage of that process alone
+def measure(command):
+	with open(os.devnull, "w") as devnull:
+		start = time.time()
+		process = subprocess.Popen(command, stdout=devnull, cwd=ROOT)
+		pid, status, usage = os.wait4(process.pid, 0)
+		elapsed = time.time() - start
+	process.returncode = status
+	if status != 0:
+		raise RuntimeError("command failed (status "+str(status)+"): "+" ".join(command))
+	return elapsed, usage.ru_maxrss
+
+def commit():
+	try:
+		with open(os.devnull, "w") as devnull:
+			return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=devnull).decode("ascii").strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+## Generate the data set of every size and run the selected benchmarks on it, 'repeat' times each (keeping the
+## shortest time and the largest peak memory); the data directory of each size is removed once measured unless 'keep'
+## is set (only when this run created it); returns the result records
+def run_suite(sizes, selected, workdir, repeat=1, keep=False, log=sys.stdout):
+	results = []
+	for records in sizes:
+		directory = os.path.join(workdir, str(records))
+		created = not os.path.exists(directory)
+		try:
+			results += run_size(records, selected, directory, repeat, log)
+		finally:
+			if created and not keep:
+				shutil.rmtree(directory, ignore_errors=True)
+	return results
+
+## Write the data set of one size into 'directory' and run the selected benchmarks on it
+def run_size(records, selected, directory, repeat, log):
+	results = []
+	log.write("\n***Writing synthetic data for "+str(records)+" contigs***\n")
+	log.flush()
+	start = time.time()
+	paths = write_dataset(directory, records)
+	log.write("Written in "+"%.1f" % (time.time() - start)+" s\n\nBenchmark\tContigs\tSeconds\tPeak RSS (kB)\n")
+	runs = commands(paths, directory)
+	for name in BENCHMARKS:
+		if name not in selected and not (name == "make_annotation_dictionary" and \
+		("annotate_counts" in selected or "annotate_fasta" in selected)):		## The annotation steps need the dictionary
+			continue
+		runs_measured = [measure(runs[name]) for attempt in range(max(1, repeat))]
+		seconds = min(elapsed for elapsed, peak in runs_measured)
+		peak = max(peak for elapsed, peak in runs_measured)
+		if name in selected:
+			results.append({"benchmark": name, "records": records, "seconds": round(seconds, 4), "peak_rss_kb": peak})
+			log.write(name+"\t"+str(records)+"\t"+"%.3f" % seconds+"\t"+str(peak)+"\n")
+			log.flush()
+	return results
+
+
+#################################################
+###            Compare with earlier run       ###
+#################################################
+
+## Print time and memory ratios (new / old) for every benchmark and size present in both runs; returns the regressions
+def compare(old, new, threshold, log=sys.stdout):
+	previous = dict(((result["benchmark"], result["records"]), result) for result in old["results"])
+	regressions = []
+	log.write("\n***Comparing with "+str(old.get("commit"))+" (python "+str(old.get("python"))+")***\n\n")
+	log.write("Benchmark\tContigs\tTime ratio\tMemory ratio\n")
+	for result in new["results"]:
+		before = previous.get((result["benchmark"], result["records"]))
+		if before is None:
+			continue
+		time_ratio = result["seconds"] / before["seconds"] if before["seconds"] > 0 else 1.0
+		memory_ratio = float(result["peak_rss_kb"]) / before["peak_rss_kb"] if before["peak_rss_kb"] > 0 else 1.0
+		flags = []
+		if time_ratio > threshold and max(result["seconds"], before["seconds"]) >= 0.05:
+			flags.append("slower")
+		if memory_ratio > threshold:
+			flags.append("larger")
+		if flags:
+			regressions.append((result["benchmark"], result["records"], flags))
+		log.write(result["benchmark"]+"\t"+str(result["records"])+"\t"+"%.2f" % time_ratio+"\t"+"%.2f" % memory_ratio+ \
+		("\t*** "+", ".join(flags)+" ***" if flags else "")+"\n")
+	return regressions
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("--sizes", action = "store", type = "string", dest = "sizes", help = "comma-separated numbers of contigs [10000,100000]", default = "10000,100000")
+	parser.add_option("--only", action = "store", type = "string", dest = "only", help = "comma-separated benchmarks to run [all: "+",".join(BENCHMARKS)+"]")
+	parser.add_option("--repeat", action = "store", type = "int", dest = "repeat", help = "runs of each benchmark, keeping the shortest time [1]", default = 1)
+	parser.add_option("--output", action = "store", type = "string", dest = "output", help = "write results as json")
+	parser.add_option("--compare", action = "store", type = "string", dest = "compare", help = "json results of an earlier run to compare with")
+	parser.add_option("--threshold", action = "store", type = "float", dest = "threshold", help = "ratio above which a change is a regression [1.25]", default = 1.25)
+	parser.add_option("--workdir", action = "store", type = "string", dest = "workdir", help = "directory for the synthetic data [temporary directory]")
+	parser.add_option("--keep", action = "store_true", dest = "keep", help = "keep the synthetic data (a --workdir directory itself is never removed)", default = False)
+	options, args = parser.parse_args()
+	try:
+		sizes = [int(size) for size in options.sizes.split(",")]
+	except ValueError:
+		sys.stderr.write("\n***Error: sizes must be whole numbers!***\n\n")
+		sys.exit(1)
+	selected = BENCHMARKS if options.only is None else options.only.split(",")
+	unknown = [name for name in selected if name not in BENCHMARKS]
+	if unknown:
+		sys.stderr.write("\n***Error: unknown benchmark(s) "+", ".join(unknown)+" (choose from "+", ".join(BENCHMARKS)+")!***\n\n")
+		sys.exit(1)
+	old = None
+	if options.compare is not None:
+		with open(options.compare) as infile:
+			old = json.load(infile)
+	temporary = options.workdir is None									## A directory given with '--workdir' is never removed
+	workdir = tempfile.mkdtemp(prefix="bench_suite.") if temporary else options.workdir
+	try:
+		results = run_suite(sizes, selected, workdir, options.repeat, options.keep)
+	finally:
+		if temporary and not options.keep:
+			shutil.rmtree(workdir, ignore_errors=True)
+	run = {"commit": commit(), "python": platform.python_version(), "date": time.strftime("%Y-%m-%d %H:%M:%S"), \
+	"repeat": options.repeat, "results": results}
+	if options.output is not None:
+		with open(options.output, "w") as outfile:
+			json.dump(run, outfile, indent=1)
+	if old is not None and compare(old, run, options.threshold):
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
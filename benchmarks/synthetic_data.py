@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import os
+import random
+import sys
+
+usage_line = """
+synthetic_data.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Generators (used by 'bench_suite.py') and script that write synthetic inputs shaped like the files in 'sample_data': \
+Trinity-style contig IDs (c<component>_g<gene>_i<isoform>, mostly g1_i1 with a tail of further genes and isoforms), \
+count tables (contig ID, length and two counts, ending with the '*' line), one-way hit tables (contig ID, reference \
+ID, e-value; several hits per contig) and reciprocal best-hit tables (contig ID, reference ID), the tabular blast \
+results read by 'homology_BESThit_parsing.py --tabular' (sseqid qseqid evalue), fasta files of the contigs (60 \
+bases per line) and GFF3 annotations (gene, mRNA, exon, CDS and UTR features on 20 chromosomes). The number of \
+records is the number of contigs (GFF3: mRNAs) and may range from 10^4 to 10^8; every file is written as a stream, \
+so memory use does not grow with the size. The same seed always gives the same files.
+
+python synthetic_data.py -n <records> -o <directory> [--seed <N>]"""
+
+BASES = "ACGT"
+
+
+#################################################
+###               Contig IDs                  ###
+#################################################
+
+## Trinity-style IDs: one to several genes per component and isoforms per gene, as in 'sample_data/count_table.tsv'
+def trinity_ids(records, rng):
+	component = 0
+	written = 0
+	while written < records:
+		genes = 1 if rng.random() < 0.85 else rng.randint(2, 4)
+		for gene in range(1, genes + 1):
+			isoforms = 1 if rng.random() < 0.7 else rng.randint(2, 6)
+			for isoform in range(1, isoforms + 1):
+				if written == records:
+					return
+				yield "c%d_g%d_i%d" % (component, gene, isoform)
+				written += 1
+		component += 1
+
+def reference_id(number):
+	return "ENSACAT%011d" % number
+
+def evalue(rng):
+	if rng.random() < 0.05:
+		return "0.0"
+	if rng.random() < 0.5:
+		return "%.3f" % (rng.random() / 100)
+	return "%de-%02d" % (rng.randint(1, 9), rng.randint(5, 180))
+
+
+#################################################
+###                 Tables                    ###
+#################################################
+
+## Count table: contig ID, length and two counts, with the closing '*' line
+def count_table(path, records, rng):
+	with open(path, "w") as outfile:
+		for contig in trinity_ids(records, rng):
+			outfile.write("%s\t%d\t%d\t%d\n" % (contig, rng.randint(200, 9000), int(rng.expovariate(0.02)), rng.choice((0, 0, 0, 1))))
+		outfile.write("*\t0\t0\t0\n")
+
+## One-way hit table: about a tenth of the contigs have hits, several hits each (as 'oneway_blast.tsv')
+def oneway_table(path, records, rng, references):
+	with open(path, "w") as outfile:
+		for contig in trinity_ids(records, rng):
+			if rng.random() < 0.1:
+				reference = reference_id(rng.randrange(references))
+				for hit in range(rng.randint(1, 20)):
+					outfile.write("%s\t%s\t%s\n" % (contig, reference, evalue(rng)))
+
+## Reciprocal best-hit table: about a fiftieth of the contigs, one reference each (as 'reciprocal_blast.tsv')
+def reciprocal_table(path, records, rng, references):
+	with open(path, "w") as outfile:
+		for contig in trinity_ids(records, rng):
+			if rng.random() < 0.02:
+				outfile.write("%s\t%s\n" % (contig, reference_id(rng.randrange(references))))
+
+## Tabular blast results (sseqid qseqid evalue) of target to reference ('-o') and reference to target ('-r'); half of
+## the best pairs are reciprocal
+def blast_tables(oneway_path, reciprocal_path, records, rng, references):
+	with open(oneway_path, "w") as oneway, open(reciprocal_path, "w") as reciprocal:
+		for contig in trinity_ids(records, rng):
+			if rng.random() < 0.3:
+				reference = reference_id(rng.randrange(references))
+				for hit in range(rng.randint(1, 3)):
+					oneway.write("%s\t%s\t%s\n" % (reference, contig, evalue(rng)))
+				if rng.random() < 0.5:
+					reciprocal.write("%s\t%s\t%s\n" % (contig, reference, evalue(rng)))
+
+
+#################################################
+###             Sequences and GFF3            ###
+#################################################
+
+## Fasta file of the contigs (short random sequences wrapped at 60 bases)
+def fasta_file(path, records, rng):
+	chunk = "".join(rng.choice(BASES) for x in range(4096))
+	with open(path, "w") as outfile:
+		for contig in trinity_ids(records, rng):
+			length = rng.randint(200, 1500)
+			offset = rng.randrange(len(chunk) - length)
+			sequence = chunk[offset:offset + length]
+			outfile.write(">" + contig + " len=" + str(length) + "\n")
+			for start in range(0, length, 60):
+				outfile.write(sequence[start:start + 60] + "\n")
+
+## GFF3 with one gene and mRNA per record, two to eight exons, CDS chunks and UTRs, sorted by chromosome and position
+def gff_file(path, records, rng, chromosomes=20):
+	per_chromosome = records // chromosomes + 1
+	written = 0
+	with open(path, "w") as outfile:
+		outfile.write("##gff-version 3\n")
+		for chromosome in range(1, chromosomes + 1):
+			seqid = "chr%d" % chromosome
+			position = 1000
+			for number in range(per_chromosome):
+				if written == records:
+					return
+				gene = "gene%d" % written
+				mrna = "rna%d" % written
+				exons = []
+				start = position
+				for exon in range(rng.randint(2, 8)):
+					length = rng.randint(50, 400)
+					exons.append((position, position + length))
+					position += length + rng.randint(100, 3000)
+				end = exons[-1][1]
+				outfile.write("%s\tsynthetic\tgene\t%d\t%d\t.\t+\t.\tID=%s\n" % (seqid, start, end, gene))
+				outfile.write("%s\tsynthetic\tmRNA\t%d\t%d\t.\t+\t.\tID=%s;Parent=%s\n" % (seqid, start, end, mrna, gene))
+				for exon_start, exon_end in exons:
+					outfile.write("%s\tsynthetic\texon\t%d\t%d\t.\t+\t.\tParent=%s\n" % (seqid, exon_start, exon_end, mrna))
+				outfile.write("%s\tsynthetic\tfive_prime_UTR\t%d\t%d\t.\t+\t.\tParent=%s\n" % (seqid, exons[0][0], exons[0][0] + 20, mrna))
+				for exon_start, exon_end in exons:
+					outfile.write("%s\tsynthetic\tCDS\t%d\t%d\t.\t+\t0\tParent=%s\n" % (seqid, max(exon_start, exons[0][0] + 21), \
+					min(exon_end, exons[-1][1] - 31), mrna))
+				outfile.write("%s\tsynthetic\tthree_prime_UTR\t%d\t%d\t.\t+\t.\tParent=%s\n" % (seqid, exons[-1][1] - 30, exons[-1][1], mrna))
+				position += rng.randint(1000, 20000)
+				written += 1
+
+
+#################################################
+###             Write a full data set         ###
+#################################################
+
+## Write every input file for 'records' contigs into 'directory'; returns {name: path}
+def write_dataset(directory, records, seed=1):
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	references = max(1000, records // 5)
+	paths = {}
+	for name, filename in (("counts", "count_table.tsv"), ("oneway", "oneway_blast.tsv"), ("reciprocal", "reciprocal_blast.tsv"), \
+	("blast_oneway", "blast_target_reference.tsv"), ("blast_reciprocal", "blast_reference_target.tsv"), ("fasta", "contigs.fa"), \
+	("gff", "annotation.gff3")):
+		paths[name] = os.path.join(directory, filename)
+	## Each file has its own seeded generator, so the IDs are the same in every file and the files can be written separately
+	count_table(paths["counts"], records, random.Random(seed))
+	oneway_table(paths["oneway"], records, random.Random(seed), references)
+	reciprocal_table(paths["reciprocal"], records, random.Random(seed), references)
+	blast_tables(paths["blast_oneway"], paths["blast_reciprocal"], records, random.Random(seed), references)
+	fasta_file(paths["fasta"], records, random.Random(seed))
+	gff_file(paths["gff"], records, random.Random(seed))
+	return paths
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-n", action = "store", type = "int", dest = "records", help = "number of contigs (GFF3: mRNAs) [10000]", default = 10000)
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output directory")
+	parser.add_option("--seed", action = "store", type = "int", dest = "seed", help = "random seed [1]", default = 1)
+	options, args = parser.parse_args()
+	if options.output is None:
+		sys.stderr.write("\n***Error: specify the output directory!***\n\n")
+		sys.exit(1)
+	for name, path in sorted(write_dataset(options.output, options.records, options.seed).items()):
+		print(name+"\t"+path+"\t"+str(os.path.getsize(path))+" bytes")
+
+if __name__ == '__main__':
+	main()
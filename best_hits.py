@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import bisect
+import heapq
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+from compressed_io import open_input, open_output
+import instrument
+
+usage_line = """
+best_hits.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script that selects the best hit(s) of every query from a tabular blast hit table of any size (e.g., the \
+'homology_blasting.py' output or tables merged from several references), rather than trusting the first row of \
+each query. Hits are ranked by e-value (lowest first), then bitscore (highest first, when a bitscore column is \
+given with '-b'), then subject ID and finally line number, so ties are always broken the same way. For each query \
+the best row of each of its best '-n' distinct subjects is written (default 1; duplicate rows of a subject are \
+dropped), as the original lines. When the table is sorted by query ID, it is streamed in constant memory (the \
+order is checked as it is read); with '--grouped', rows only need to be grouped by query, as blast writes them, and \
+the output keeps the input order (the queries already seen are remembered to check the grouping). Otherwise (when \
+the check fails part way through, or with '--unsorted'), the table is sorted on disk: runs of at most '--memory' MB \
+of rows are sorted, reduced to their best hits and written to a temporary directory ('--tmpdir'), then merged (in \
+several passes for very many runs), and the output is sorted by query ID. Input and output can be compressed (see \
+'compressed_io.py'). Comment lines starting with '#' are skipped. The time, rows and memory of each step are \
+written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a cProfile dump).
+
+python best_hits.py -i <hit_table> -o <best_hits> [-q <query_column> -s <subject_column> -e <evalue_column> \
+-b <bitscore_column> -n <hits_per_query> --grouped --unsorted --memory <MB> --tmpdir <directory> --verbose --metrics <metrics.json> \
+--profile <profile>]"""
+
+MEMORY = 1024														## MB of rows held in memory per sorted run
+ROW_OVERHEAD = 240													## Approximate bytes of a held row besides its line
+MERGE_WIDTH = 64													## Runs merged at a time (open files)
+
+
+class UnsortedInput(Exception):
+	pass
+
+
+#################################################
+###               Rank hit rows               ###
+#################################################
+
+## Parser of hit lines with 1-based column numbers: returns (query, e-value, -bitscore, subject), or None for blank
+## and comment lines (the bitscore is 0 without a bitscore column)
+def hit_parser(query_col=1, subject_col=2, evalue_col=3, bitscore_col=None):
+	query = query_col - 1
+	subject = subject_col - 1
+	evalue = evalue_col - 1
+	bitscore = None if bitscore_col is None else bitscore_col - 1
+	last = max(query, subject, evalue, -1 if bitscore is None else bitscore)
+	def parse(line):
+		fields = line.split(None, last + 1)
+		if not fields or fields[0].startswith(b"#"):
+			return None
+		if len(fields) <= last:
+			raise ValueError("expected at least "+str(last + 1)+" columns in: "+line.decode("utf-8", "replace").rstrip())
+		return fields[query], float(fields[evalue]), -float(fields[bitscore]) if bitscore is not None else 0.0, fields[subject]
+	return parse
+
+## Hit rows of 'lines' as (query, e-value, -bitscore, subject, line number, line) tuples, which sort by query and
+## then rank (line numbers count from 'start')
+def hit_rows(lines, parse, start=0):
+	for number, line in enumerate(lines, start):
+		key = parse(line)
+		if key is not None:
+			if not line.endswith(b"\n"):
+				line += b"\n"
+			yield key + (number, line)
+
+## Best rows of 'n' distinct subjects per query from rows sorted by query and rank
+def select_sorted(rows, n):
+	query = None
+	subjects = []
+	for row in rows:
+		if row[0] != query:
+			query = row[0]
+			subjects = []
+		if len(subjects) < n and row[3] not in subjects:
+			subjects.append(row[3])
+			yield row
+
+## Offer a row to the best rows of one query (rank-ordered, at most 'n' distinct subjects)
+def offer(best, row, n):
+	for index, other in enumerate(best):
+		if other[3] == row[3]:											## Keep only the better row of a subject
+			if row[1:5] >= other[1:5]:
+				return
+			del best[index]
+			break
+	if len(best) == n and row[1:5] >= best[-1][1:5]:
+		return
+	bisect.insort(best, row)
+	if len(best) > n:
+		best.pop()
+
+
+#################################################
+###        Stream grouped or sorted input     ###
+#################################################
+
+## Write the best rows of each query of rows grouped by query ('grouped') or sorted by query ID; returns the number
+## of queries, or raises UnsortedInput (after writing the queries completed so far) holding the row out of order
+def stream_best(rows, n, output, grouped=False):
+	best = []
+	query = None
+	seen = set() if grouped else None
+	queries = 0
+	for row in rows:
+		if row[0] != query:
+			if best:
+				output.write(b"".join(hit[5] for hit in best))
+				queries += 1
+				best = []
+			if query is not None and (row[0] in seen if grouped else row[0] < query):
+				raise UnsortedInput(row)
+			if grouped:
+				seen.add(row[0])
+			query = row[0]
+		offer(best, row, n)
+	if best:
+		output.write(b"".join(hit[5] for hit in best))
+		queries += 1
+	return queries
+
+
+#################################################
+###          External sort and merge          ###
+#################################################
+
+## Write sorted 'rows' (reduced to their best hits) to a new run file in 'workdir'; returns its path
+def write_run(rows, n, workdir, number):
+	path = os.path.join(workdir, "run_%06d.tsv" % number)
+	with open_output(path, "none") as output:
+		for row in select_sorted(rows, n):
+			output.write(b"%d\t" % row[4] + row[5])
+	return path
+
+## Rows of a run file (line numbers are stored in front of the lines)
+def run_rows(path, parse):
+	with open_input(path) as infile:
+		for raw in infile:
+			number, line = raw.split(b"\t", 1)
+			yield parse(line) + (int(number), line)
+
+## Cut 'rows' into sorted runs of at most 'memory' bytes; returns the run paths
+def sorted_runs(rows, n, workdir, memory, first=0):
+	runs = []
+	held = []
+	size = 0
+	for row in rows:
+		held.append(row)
+		size += len(row[5]) + ROW_OVERHEAD
+		if size >= memory:
+			held.sort()
+			runs.append(write_run(held, n, workdir, first + len(runs)))
+			held = []
+			size = 0
+	if held:
+		held.sort()
+		runs.append(write_run(held, n, workdir, first + len(runs)))
+	return runs
+
+## Merge the runs (MERGE_WIDTH at a time, in as many passes as needed) into one sorted stream of best rows
+def merged_rows(runs, n, parse, workdir):
+	number = len(runs)
+	while len(runs) > MERGE_WIDTH:
+		merged = []
+		for start in range(0, len(runs), MERGE_WIDTH):
+			group = runs[start:start + MERGE_WIDTH]
+			merged.append(write_run(heapq.merge(*[run_rows(path, parse) for path in group]), n, workdir, number))
+			number += 1
+			for path in group:
+				os.remove(path)
+		runs = merged
+	return select_sorted(heapq.merge(*[run_rows(path, parse) for path in runs]), n)
+
+
+#################################################
+###             Select best hits              ###
+#################################################
+
+## Select the best hits of 'input_path' into 'output_path', streaming it first unless 'stream' is False; returns
+## (lines read, queries written, sorted runs: 0 when the input was streamed); the steps are recorded in 'metrics'
+## (an 'instrument.Instrument')
+def best_hits(input_path, output_path, parse, n=1, grouped=False, memory=MEMORY, tmpdir=None, metrics=None, stream=True):
+	if metrics is None:
+		metrics = instrument.Instrument("best_hits.py")
+	counter = [0]													## Lines read so far
+	def counted(rows, stage):
+		for row in stage.counted(rows):
+			counter[0] = row[4] + 1
+			yield row
+	with open_input(input_path) as infile:
+		rows = hit_rows(infile, parse)
+		prefix = None
+		if stream and (os.path.isfile(output_path) or not os.path.exists(output_path)):	## A failed check rereads the output
+			with metrics.stage("stream", inputs=[input_path], outputs=[output_path]) as stage:
+				try:
+					with open_output(output_path) as output:
+						queries = stream_best(counted(rows, stage), n, output, grouped)
+					return counter[0], queries, 0
+				except UnsortedInput as error:
+					prefix = error.args[0]
+		workdir = tempfile.mkdtemp(prefix="best_hits.", dir=tmpdir)
+		try:
+			with metrics.stage("sort runs", inputs=[input_path]) as stage:
+				runs = []
+				if prefix is not None:								## Best hits streamed so far, numbered before all later rows
+					with open_input(output_path) as written:
+						runs = sorted_runs(hit_rows(written, parse), n, workdir, memory * 1048576)
+					rows = _chain(prefix, rows)
+				runs += sorted_runs(counted(rows, stage), n, workdir, memory * 1048576, len(runs))
+			with metrics.stage("merge runs", outputs=[output_path]) as stage:
+				queries = 0
+				query = None
+				with open_output(output_path) as output:
+					for row in stage.counted(merged_rows(runs, n, parse, workdir)):
+						if row[0] != query:
+							query = row[0]
+							queries += 1
+						output.write(row[5])
+			return counter[0], queries, len(runs)
+		finally:
+			shutil.rmtree(workdir, ignore_errors=True)
+
+def _chain(first, rows):
+	yield first
+	for row in rows:
+		yield row
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-i", action = "store", type = "string", dest = "input", help = "tabular hit table")
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output best hits")
+	parser.add_option("-q", action = "store", type = "int", dest = "q", help = "column number of the query IDs [1]", default = 1)
+	parser.add_option("-s", action = "store", type = "int", dest = "s", help = "column number of the subject IDs [2]", default = 2)
+	parser.add_option("-e", action = "store", type = "int", dest = "e", help = "column number of the e-values [3]", default = 3)
+	parser.add_option("-b", action = "store", type = "int", dest = "b", help = "column number of the bitscores [none]")
+	parser.add_option("-n", action = "store", type = "int", dest = "n", help = "best distinct subjects per query [1]", default = 1)
+	parser.add_option("--grouped", action = "store_true", dest = "grouped", help = "rows are grouped by query (blast order) rather than sorted", default = False)
+	parser.add_option("--unsorted", action = "store_true", dest = "unsorted", help = "sort on disk without trying to stream first", default = False)
+	parser.add_option("--memory", action = "store", type = "int", dest = "memory", help = "MB of rows per sorted run ["+str(MEMORY)+"]", default = MEMORY)
+	parser.add_option("--tmpdir", action = "store", type = "string", dest = "tmpdir", help = "directory for the sorted runs [system default]")
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.input is None or options.output is None:
+		sys.stderr.write("\n***Error: specify the hit table and the output file!***\n\n")
+		sys.exit(1)
+	if min(options.q, options.s, options.e, options.b or 1) < 1 or options.n < 1 or options.memory < 1:
+		sys.stderr.write("\n***Error: column numbers, hits per query and memory must be at least 1!***\n\n")
+		sys.exit(1)
+## When all input is present
+	metrics = instrument.Instrument("best_hits.py")
+	parse = hit_parser(options.q, options.s, options.e, options.b)
+	def select():
+		try:
+			rows, queries, runs = best_hits(options.input, options.output, parse, options.n, options.grouped, \
+			options.memory, options.tmpdir, metrics, not options.unsorted)
+		except ValueError as error:
+			sys.stderr.write("\n***Error: "+str(error)+"!***\n\n")
+			sys.exit(1)
+		print("Lines read:\t"+str(rows)+"\nQueries:\t"+str(queries)+"\nSorted runs:\t"+str(runs))
+	instrument.run(select, metrics, options)
+
+if __name__ == '__main__':
+	main()
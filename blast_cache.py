@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import glob
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+import zlib
+from blast_shards import run_sharded
+from rbh_engine import top_subject_lines
+
+usage_line = """
+blast_cache.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (and module used by 'homology_blast.py' and 'orthorbb') that runs a blast search through a persistent, \
+per-sequence hit cache. Cached hits are keyed by a hash of the query sequence, the blast database fingerprint, the \
+blast program and its parameters, so only query sequences that have not been searched before with the same settings \
+are sent to blast; cached hits are merged back in query order. Output must be tabular (outfmt 6 with a qseqid \
+column). The thread count is not part of the key. The cache is a sqlite file in the cache directory and the least \
+recently used entries are evicted once it grows beyond the size limit. Hit/miss counts are reported for each run and \
+accumulated in the cache. The '--top1' option keeps only the rows for the best subject of every query (as 'blast_formatter -max_target_seqs 1' does).
+
+python blast_cache.py --cache <cache_dir> -b <blast_type> --db <database> --query <query_fasta> --out <output> \
+[--outfmt <format> -e <e-value> --max-target-seqs <N> --threads <N> --workers <N> --max-size <MB> --top1 --stats]"""
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+BATCH = 500
+STD_FIELDS = "qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore"
+
+
+#################################################
+###            Database fingerprint           ###
+#################################################
+
+## Fingerprint a blast database from the names, sizes and modification times of its files
+def db_fingerprint(db):
+	digest = hashlib.sha1()
+	for path in sorted(glob.glob(db + ".*")) + [db]:
+		if os.path.isfile(path):
+			info = os.stat(path)
+			digest.update(("%s\t%d\t%d\n" % (os.path.basename(path), info.st_size, int(info.st_mtime))).encode("utf-8"))
+	return digest.hexdigest()
+
+## Column of the query ID in a tabular output format ('6' alone means the standard 12 columns)
+def query_column(outfmt):
+	fields = outfmt.split()
+	if fields[0] != "6":
+		raise ValueError("the hit cache needs tabular blast output, not outfmt " + fields[0])
+	fields = fields[1:] or STD_FIELDS.split()
+	if "qseqid" not in fields:
+		raise ValueError("the hit cache needs a qseqid column in the output format")
+	return fields.index("qseqid")
+
+
+#################################################
+###               Persistent cache            ###
+#################################################
+
+class HitCache(object):
+
+	def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.db = sqlite3.connect(os.path.join(directory, "blast_cache.sqlite"), timeout=600)
+		self.db.execute("CREATE TABLE IF NOT EXISTS hits (key TEXT PRIMARY KEY, rows BLOB, size INTEGER, used REAL)")
+		self.db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+		self.db.commit()
+
+	## Look up many keys at once; returns {key: rows} for the keys that are cached
+	def get_many(self, keys):
+		found = {}
+		for start in range(0, len(keys), BATCH):
+			batch = keys[start:start + BATCH]
+			query = "SELECT key, rows FROM hits WHERE key IN (" + ",".join("?" * len(batch)) + ")"
+			for key, rows in self.db.execute(query, batch):
+				found[key] = zlib.decompress(bytes(rows)).decode("utf-8")
+		now = time.time()
+		self.db.executemany("UPDATE hits SET used = ? WHERE key = ?", [(now, key) for key in found])
+		self.db.commit()
+		self.hits += len(found)
+		self.misses += len(keys) - len(found)
+		return found
+
+	def put_many(self, items):
+		now = time.time()
+		records = []
+		for key, rows in items:
+			blob = zlib.compress(rows.encode("utf-8"))
+			records.append((key, sqlite3.Binary(blob), len(blob), now))
+		self.db.executemany("INSERT OR REPLACE INTO hits (key, rows, size, used) VALUES (?, ?, ?, ?)", records)
+		self.db.commit()
+		self.evict()
+
+	## Drop least recently used entries until the cache fits within max_bytes
+	def evict(self):
+		total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM hits").fetchone()[0]
+		if total <= self.max_bytes:
+			return 0
+		doomed = []
+		for key, size in self.db.execute("SELECT key, size FROM hits ORDER BY used"):
+			if total <= self.max_bytes:
+				break
+			doomed.append((key,))
+			total -= size
+		self.db.executemany("DELETE FROM hits WHERE key = ?", doomed)
+		self.db.commit()
+		self._add_stat("evicted", len(doomed))
+		return len(doomed)
+
+	def _add_stat(self, name, value):
+		self.db.execute("INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)", (name,))
+		self.db.execute("UPDATE stats SET value = value + ? WHERE name = ?", (value, name))
+		self.db.commit()
+
+	## Add this run's hit/miss counts to the cumulative statistics
+	def record_stats(self):
+		self._add_stat("hits", self.hits)
+		self._add_stat("misses", self.misses)
+
+	def stats(self):
+		values = dict(self.db.execute("SELECT name, value FROM stats"))
+		values["entries"], values["bytes"] = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM hits").fetchone()
+		return values
+
+	def close(self):
+		self.db.close()
+
+
+#################################################
+###            Cached blast search            ###
+#################################################
+
+## Yield (query ID, sequence bytes) for every record in a fasta file
+def fasta_records(path):
+	name = None
+	sequence = []
+	with open(path, "rb") as infile:
+		for line in infile:
+			if line.startswith(b">"):
+				if name is not None:
+					yield name, b"".join(sequence)
+				fields = line[1:].split(None, 1)
+				name = fields[0].decode("utf-8") if fields else ""
+				sequence = []
+			else:
+				sequence.append(line.strip())
+	if name is not None:
+		yield name, b"".join(sequence)
+
+## Search 'query' against 'db' with 'command' (a blast command without -query/-out) through the cache;
+## 'runner(command, query, output)' runs blast on the query sequences that are not cached yet
+def cached_search(command, db, outfmt, query, output, cache, runner):
+	column = query_column(outfmt)
+	parameters = [value for index, value in enumerate(command) if "-num_threads" not in command[max(0, index - 1):index + 1]]
+	settings = hashlib.sha1(("\t".join(parameters) + "\n" + db_fingerprint(db)).encode("utf-8")).hexdigest()
+	order = []
+	keys = {}
+	workdir = tempfile.mkdtemp(prefix="blast_cache.", dir=os.path.dirname(os.path.abspath(output)))
+	try:
+		for name, sequence in fasta_records(query):
+			key = hashlib.sha1(settings.encode("utf-8") + b"\n" + sequence.upper()).hexdigest()
+			order.append((name, key))
+			keys[key] = True
+		cached = cache.get_many(list(keys))
+		missing = [key for key in keys if key not in cached]
+		if missing:
+## Missing sequences are written (once each, in a second pass over the query) under their cache keys,
+## so blast's qseqid identifies them exactly
+			missing_fasta = os.path.join(workdir, "missing.fasta")
+			missing_out = os.path.join(workdir, "missing.out")
+			pending = set(missing)
+			with open(missing_fasta, "wb") as outfile:
+				for name, sequence in fasta_records(query):
+					key = hashlib.sha1(settings.encode("utf-8") + b"\n" + sequence.upper()).hexdigest()
+					if key in pending:
+						pending.discard(key)
+						outfile.write(b">" + key.encode("utf-8") + b"\n" + sequence + b"\n")
+			runner(command, missing_fasta, missing_out)
+			found = dict((key, []) for key in missing)
+			with open(missing_out, "r") as infile:
+				for line in infile:
+					fields = line.rstrip("\n").split("\t")
+					key = fields[column]
+					fields[column] = ""
+					found[key].append("\t".join(fields) + "\n")
+			new = [(key, "".join(rows)) for key, rows in found.items()]
+			cache.put_many(new)
+			cached.update(new)
+		with open(output, "w") as outfile:
+			for name, key in order:
+				for row in cached[key].splitlines():
+					fields = row.split("\t")
+					fields[column] = name
+					outfile.write("\t".join(fields) + "\n")
+	finally:
+		shutil.rmtree(workdir)
+	cache.record_stats()
+	return cache.hits, cache.misses
+
+## Default runner: one blast process, or a sharded pool when 'workers' > 1
+def blast_runner(workers=1, shards=None):
+	def runner(command, query, output):
+		if workers > 1:
+			run_sharded(command, query, output, workers, shards)
+		elif subprocess.call(command + ["-query", query, "-out", output]) != 0:
+			raise RuntimeError("blast failed on query " + query)
+	return runner
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("--cache", action = "store", type = "string", dest = "cache", help = "cache directory")
+	parser.add_option("-b", action = "store", type = "string", dest = "blast", help = "type of blast")
+	parser.add_option("--db", action = "store", type = "string", dest = "db", help = "blast database")
+	parser.add_option("--query", action = "store", type = "string", dest = "query", help = "query sequences (fasta)")
+	parser.add_option("--out", action = "store", type = "string", dest = "output", help = "tabular output file")
+	parser.add_option("--outfmt", action = "store", type = "string", dest = "outfmt", help = "tabular output format", default = "6")
+	parser.add_option("-e", action = "store", type = "string", dest = "evalue", help = "e-value threshold", default = "10")
+	parser.add_option("--max-target-seqs", action = "store", type = "string", dest = "max_target_seqs", help = "maximum number of subjects per query", default = "5")
+	parser.add_option("--threads", action = "store", type = "string", dest = "threads", help = "the number of threads blast will use", default = "1")
+	parser.add_option("--workers", action = "store", type = "int", dest = "workers", help = "number of blast processes to run on query shards", default = 1)
+	parser.add_option("--max-size", action = "store", type = "int", dest = "max_size", help = "maximum cache size in MB", default = DEFAULT_MAX_BYTES // (1024 * 1024))
+	parser.add_option("--top1", action = "store_true", dest = "top1", help = "keep only the best subject for each query", default = False)
+	parser.add_option("--stats", action = "store_true", dest = "stats", help = "print cumulative cache statistics and exit", default = False)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.cache is None:
+		print("\n***Error: specify the cache directory!***\n")
+	elif options.stats:
+		cache = HitCache(options.cache)
+		for name, value in sorted(cache.stats().items()):
+			print(name+"\t"+str(value))
+		cache.close()
+	elif options.blast is None or options.db is None or options.query is None or options.output is None:
+		print("\n***Error: specify the blast type, database, query and output!***\n")
+## When all input is present
+	else:
+		cache = HitCache(options.cache, options.max_size * 1024 * 1024)
+		command = [options.blast, "-num_threads", options.threads, "-outfmt", options.outfmt, "-max_target_seqs", options.max_target_seqs, \
+		"-evalue", options.evalue, "-db", options.db]
+		print("\n***Blasting "+options.query+" against "+options.db+" through the hit cache***\n")
+		hits, misses = cached_search(command, options.db, options.outfmt, options.query, options.output, cache, blast_runner(options.workers))
+		print("Cache hits:\t"+str(hits)+"\nCache misses:\t"+str(misses))
+		cache.close()
+		if options.top1:
+			fields = options.outfmt.split()[1:] or STD_FIELDS.split()
+			top = options.output + ".top1.tmp"
+			with open(options.output) as infile, open(top, "w") as outfile:
+				outfile.writelines(top_subject_lines(infile, fields.index("qseqid"), fields.index("sseqid")))
+			os.rename(top, options.output)
+
+if __name__ == '__main__':
+	main()
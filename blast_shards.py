@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+## Sharded blast execution used by 'homology_blast.py'
+## The query fasta is cut into contiguous shards holding roughly equal numbers of residues, each shard is searched
+## by its own blast process (a pool of 'workers' processes, each with its own '-num_threads'), and the tabular
+## results are concatenated in shard order, which reproduces the output of a single unsharded search.
+
+
+#################################################
+###           Length-balanced shards          ###
+#################################################
+
+## Total number of residues in a fasta file (sequence lines only)
+def residue_count(path):
+	total = 0
+	with open(path, "rb") as infile:
+		for line in infile:
+			if not line.startswith(b">"):
+				total += len(line.rstrip())
+	return total
+
+## Write the records of 'path' into at most 'shards' contiguous shard files of similar residue counts
+def shard_fasta(path, shards, workdir):
+	target = max(1, residue_count(path) // max(1, shards))
+	paths = []
+	outfile = None
+	filled = 0
+	with open(path, "rb") as infile:
+		for line in infile:
+			if line.startswith(b">"):
+				if outfile is None or (filled >= target and len(paths) < shards):
+					if outfile is not None:
+						outfile.close()
+					paths.append(os.path.join(workdir, "shard_%05d.fasta" % len(paths)))
+					outfile = open(paths[-1], "wb")
+					filled = 0
+			elif outfile is not None:
+				filled += len(line.rstrip())
+			if outfile is not None:
+				outfile.write(line)
+	if outfile is not None:
+		outfile.close()
+	return paths
+
+
+#################################################
+###          Run shards in a local pool       ###
+#################################################
+
+def _run(command):
+	if subprocess.call(command) != 0:
+		raise RuntimeError("blast failed: " + " ".join(command))
+
+## Run 'command' (a blast command without -query/-out) over shards of 'query' and merge the results into 'output'
+## (results must be in a concatenable format, i.e. tabular - blast archives cannot be merged)
+def run_sharded(command, query, output, workers, shards=None):
+	if shards is None:
+		shards = workers * 4											## Extra shards even out the load across workers
+	workdir = tempfile.mkdtemp(prefix="blast_shards.", dir=os.path.dirname(os.path.abspath(output)))
+	try:
+		queries = shard_fasta(query, shards, workdir)
+		results = [shard + ".out" for shard in queries]
+		jobs = [command + ["-query", shard, "-out", result] for shard, result in zip(queries, results)]
+		pool = ThreadPool(workers)										## Threads only wait on the blast processes
+		try:
+			pool.map(_run, jobs, chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+		with open(output, "wb") as outfile:
+			for result in results:
+				with open(result, "rb") as infile:
+					shutil.copyfileobj(infile, outfile, 1024 * 1024)
+	finally:
+		shutil.rmtree(workdir)
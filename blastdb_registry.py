@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+usage_line = """
+blastdb_registry.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (and module used by 'homology_blast.py', 'orthorbb' and 'Trinotate_run.py') that keeps a shared registry \
+of blast databases. Each database is identified by a fingerprint of the input fasta contents, the database type and \
+any extra makeblastdb options, so an existing database is reused whenever these match and a missing one is built \
+exactly once, under a file lock, even when several jobs ask for it at the same time. The registry directory is \
+taken from '--registry', the CONTIGANNOTATOR_BLASTDB environment variable, or '~/.cache/contigannotator/blastdb'. \
+The path of the database (for blast '-db') is written to STDOUT. With '--existing', a database built next to the \
+fasta by earlier versions of these scripts is used when the registry has none.
+
+python blastdb_registry.py -i <fasta> --dbtype <prot|nucl> [--args "<makeblastdb options>" --registry <directory> --existing]"""
+
+CHUNK = 4 * 1024 * 1024
+
+
+#################################################
+###              Registry location            ###
+#################################################
+
+def registry_dir(registry=None):
+	if registry is None:
+		registry = os.environ.get("CONTIGANNOTATOR_BLASTDB", os.path.join(os.path.expanduser("~"), ".cache", "contigannotator", "blastdb"))
+	if not os.path.isdir(registry):
+		try:
+			os.makedirs(registry)
+		except OSError:												## Another job may have created it first
+			if not os.path.isdir(registry):
+				raise
+	return registry
+
+
+#################################################
+###             Fasta fingerprints            ###
+#################################################
+
+## Content fingerprint of a fasta file; remembered per path (by size and modification time) so unchanged
+## files are not re-read on every invocation
+def fasta_fingerprint(fasta, registry):
+	info = os.stat(fasta)
+	stamp = [info.st_size, int(info.st_mtime)]
+	memo = os.path.join(registry, "paths", hashlib.sha1(os.path.realpath(fasta).encode("utf-8")).hexdigest() + ".json")
+	if os.path.exists(memo):
+		with open(memo) as infile:
+			record = json.load(infile)
+		if record["stamp"] == stamp:
+			return record["fingerprint"]
+	digest = hashlib.sha1()
+	with open(fasta, "rb") as infile:
+		while True:
+			block = infile.read(CHUNK)
+			if not block:
+				break
+			digest.update(block)
+	fingerprint = digest.hexdigest()
+	if not os.path.isdir(os.path.dirname(memo)):
+		try:
+			os.makedirs(os.path.dirname(memo))
+		except OSError:
+			pass
+	tmp = memo + ".%d.tmp" % os.getpid()
+	with open(tmp, "w") as outfile:
+		json.dump({"path": os.path.realpath(fasta), "stamp": stamp, "fingerprint": fingerprint}, outfile)
+	os.rename(tmp, memo)
+	return fingerprint
+
+def database_key(fasta, dbtype, extra, registry):
+	settings = "\t".join([fasta_fingerprint(fasta, registry), dbtype] + list(extra))
+	return hashlib.sha1(settings.encode("utf-8")).hexdigest()
+
+
+#################################################
+###          Look up or build databases       ###
+#################################################
+
+def _paths(fasta, dbtype, extra, registry):
+	key = database_key(fasta, dbtype, extra, registry)
+	directory = os.path.join(registry, key)
+	return key, directory, os.path.join(directory, os.path.basename(fasta))
+
+## Path of the registered database for this fasta and these settings, or None if it has not been built
+def lookup_blastdb(fasta, dbtype, extra=(), registry=None):
+	registry = registry_dir(registry)
+	key, directory, db = _paths(fasta, dbtype, extra, registry)
+	if os.path.exists(os.path.join(directory, "registry.json")):
+		return db
+	return None
+
+## Path of the database for this fasta and these settings, building it (once, under a lock) when it is missing
+def ensure_blastdb(fasta, dbtype, extra=(), registry=None):
+	registry = registry_dir(registry)
+	key, directory, db = _paths(fasta, dbtype, extra, registry)
+	marker = os.path.join(directory, "registry.json")
+	if os.path.exists(marker):
+		return db
+	with open(os.path.join(registry, key + ".lock"), "w") as lock:
+		fcntl.flock(lock, fcntl.LOCK_EX)							## Concurrent jobs wait here for the first builder
+		if os.path.exists(marker):
+			return db
+		build = tempfile.mkdtemp(prefix=key + ".", dir=registry)
+		try:
+			command = ["makeblastdb", "-dbtype", dbtype, "-in", fasta, "-out", os.path.join(build, os.path.basename(fasta))] + list(extra)
+			if subprocess.call(command, stdout=sys.stderr) != 0:
+				raise RuntimeError("makeblastdb failed on " + fasta)
+			with open(os.path.join(build, "registry.json"), "w") as outfile:
+				json.dump({"fasta": os.path.realpath(fasta), "dbtype": dbtype, "options": list(extra)}, outfile)
+			os.rename(build, directory)
+		except:
+			shutil.rmtree(build, ignore_errors=True)
+			raise
+	return db
+
+## Database to search for a fasta: the registered one, else a database built next to the fasta by earlier
+## versions of these scripts, else a newly registered one
+def resolve_blastdb(fasta, dbtype, extra=(), registry=None):
+	db = lookup_blastdb(fasta, dbtype, extra, registry)
+	if db is not None:
+		return db
+	suffix = "pin" if dbtype == "prot" else "nin"
+	if glob.glob(fasta + "." + suffix) or glob.glob(fasta + ".*." + suffix) or glob.glob(fasta + "." + suffix[0] + "al"):
+		return fasta
+	return ensure_blastdb(fasta, dbtype, extra, registry)
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-i", action = "store", type = "string", dest = "fasta", help = "input fasta file")
+	parser.add_option("--dbtype", action = "store", type = "string", dest = "dbtype", help = "database type (prot or nucl)")
+	parser.add_option("--args", action = "store", type = "string", dest = "args", help = "extra makeblastdb options", default = "")
+	parser.add_option("--registry", action = "store", type = "string", dest = "registry", help = "registry directory")
+	parser.add_option("--existing", action = "store_true", dest = "existing", help = "use a database next to the fasta when the registry has none", default = False)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.fasta is None:
+		sys.stderr.write("\n***Error: specify the input fasta file!***\n\n")
+		sys.exit(1)
+	elif options.dbtype not in ("prot", "nucl"):
+		sys.stderr.write("\n***Error: specify the database type (prot or nucl)!***\n\n")
+		sys.exit(1)
+	elif not os.path.isfile(options.fasta):
+		sys.stderr.write("\n***Error: fasta file "+options.fasta+" not found!***\n\n")
+		sys.exit(1)
+## When all input is present
+	elif options.existing:
+		print(resolve_blastdb(options.fasta, options.dbtype, shlex.split(options.args), options.registry))
+	else:
+		print(ensure_blastdb(options.fasta, options.dbtype, shlex.split(options.args), options.registry))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import bz2
+import gzip
+import io
+import struct
+import subprocess
+import zlib
+from multiprocessing.pool import ThreadPool
+
+## Transparent compressed input and output used by the annotation tools
+## Input compression is detected from the first bytes of a file (gzip, bgzip, bzip2, xz and zstd; anything else is
+## read as plain text), so compressed files can be given wherever a plain file is expected. Output compression is
+## chosen by name ('gzip', 'bgzip', 'bz2', 'xz', 'zstd' or 'none') or, by default, from the file extension ('.gz',
+## '.bgz', '.bz2', '.xz', '.zst'). bgzip (BGZF) files are series of independent gzip blocks of up to 64 kB, so
+## they are inflated and deflated by a pool of background threads (zlib releases the GIL) and remain readable by
+## gzip; zstd uses the 'zstandard' module when it is installed and the 'zstd' program otherwise (with its own
+## threads). All files are read and written through 1 MB buffers.
+
+BUFFER = 1 << 20
+CODECS = ["none", "gzip", "bgzip", "bz2", "xz", "zstd"]
+EXTENSIONS = [(".bgz", "bgzip"), (".gz", "gzip"), (".bz2", "bz2"), (".xz", "xz"), (".zst", "zstd")]
+
+BGZF_DATA = 65280														## Uncompressed bytes per block (as bgzip writes them)
+BGZF_TAIL = struct.Struct("<II")
+BGZF_EOF = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+BLOCKS_PER_THREAD = 16													## Blocks handed to each thread per batch (bounds memory use)
+
+
+#################################################
+###             Detect compression            ###
+#################################################
+
+## Codec of a file from its first bytes: 'bgzip', 'gzip', 'bz2', 'xz', 'zstd' or 'none'
+def detect(path):
+	with open(path, "rb") as infile:
+		magic = infile.read(18)
+	if magic[:2] == b"\x1f\x8b":
+		if len(magic) >= 18 and ord(magic[3:4]) & 4 and magic[12:14] == b"BC":	## FEXTRA with a BGZF 'BC' subfield
+			return "bgzip"
+		return "gzip"
+	if magic[:3] == b"BZh":
+		return "bz2"
+	if magic[:6] == b"\xfd7zXZ\x00":
+		return "xz"
+	if magic[:4] == b"\x28\xb5\x2f\xfd":
+		return "zstd"
+	return "none"
+
+## Output codec for 'path': 'codec' when given, else from the file extension
+def output_codec(path, codec=None):
+	if codec is not None:
+		if codec not in CODECS:
+			raise ValueError("unknown compression '"+codec+"' (choose from "+", ".join(CODECS)+")")
+		return codec
+	for extension, name in EXTENSIONS:
+		if path.endswith(extension):
+			return name
+	return "none"
+
+
+#################################################
+###              Threaded BGZF                ###
+#################################################
+
+def _inflate(block):
+	cdata, crc, size = block
+	data = zlib.decompress(cdata, -15)
+	if len(data) != size or zlib.crc32(data) & 0xffffffff != crc:
+		raise IOError("corrupt BGZF block")
+	return data
+
+def _deflate(data, level=6):
+	compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+	cdata = compressor.compress(data) + compressor.flush()
+	extra = struct.pack("<2sHH", b"BC", 2, len(cdata) + 25)				## BSIZE is the block size minus 1
+	header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff" + struct.pack("<H", len(extra)) + extra
+	return header + cdata + BGZF_TAIL.pack(zlib.crc32(data) & 0xffffffff, len(data))
+
+## Compressed blocks of a BGZF file as (deflated data, crc32, size) tuples
+def _raw_blocks(infile):
+	while True:
+		header = infile.read(12)
+		if not header:
+			return
+		if len(header) < 12 or header[:2] != b"\x1f\x8b":
+			raise IOError("not a BGZF file")
+		extra_size = struct.unpack("<H", header[10:12])[0]
+		extra = infile.read(extra_size)
+		if len(extra) < extra_size:
+			raise IOError("truncated BGZF file")
+		size = None
+		position = 0
+		while position + 4 <= len(extra):									## Find the 'BC' subfield holding the block size
+			length = struct.unpack("<H", extra[position + 2:position + 4])[0]
+			if extra[position:position + 2] == b"BC" and length == 2 and position + 6 <= len(extra):
+				size = struct.unpack("<H", extra[position + 4:position + 6])[0] + 1
+			position += 4 + length
+		if size is None:
+			raise IOError("gzip member without a BGZF block size")
+		cdata_size = size - 12 - len(extra) - 8
+		if cdata_size < 0:
+			raise IOError("corrupt BGZF block")
+		cdata = infile.read(cdata_size)
+		tail = infile.read(8)
+		if len(cdata) < cdata_size or len(tail) < 8:
+			raise IOError("truncated BGZF file")
+		crc, length = BGZF_TAIL.unpack(tail)
+		yield cdata, crc, length
+
+## Raw stream over the blocks inflated in order by a thread pool, a batch at a time
+class BGZFReader(io.RawIOBase):
+
+	def __init__(self, path, threads=1):
+		self._file = open(path, "rb", BUFFER)
+		self._pool = ThreadPool(threads) if threads > 1 else None
+		self._batch = max(1, threads) * BLOCKS_PER_THREAD
+		self._blocks = _raw_blocks(self._file)
+		self._chunks = []
+		self._data = b""
+		self._offset = 0
+
+	def readable(self):
+		return True
+
+	def _refill(self):
+		batch = []
+		for block in self._blocks:
+			batch.append(block)
+			if len(batch) == self._batch:
+				break
+		if not batch:
+			return False
+		self._chunks = list(self._pool.map(_inflate, batch) if self._pool is not None else map(_inflate, batch))
+		self._chunks.reverse()
+		return True
+
+	def readinto(self, buffer):
+		while self._offset >= len(self._data):
+			if not self._chunks and not self._refill():
+				return 0
+			self._data = self._chunks.pop()
+			self._offset = 0
+		size = min(len(buffer), len(self._data) - self._offset)
+		buffer[:size] = self._data[self._offset:self._offset + size]
+		self._offset += size
+		return size
+
+	def close(self):
+		if not self.closed:
+			if self._pool is not None:
+				self._pool.close()
+				self._pool.join()
+			self._file.close()
+		io.RawIOBase.close(self)
+
+## Raw output stream that cuts the data into blocks deflated by a thread pool and written in order, ending with
+## the BGZF end-of-file block
+class BGZFWriter(io.RawIOBase):
+
+	def __init__(self, path, threads=1, level=6):
+		self._file = open(path, "wb", BUFFER)
+		self._pool = ThreadPool(threads) if threads > 1 else None
+		self._batch = max(1, threads) * BLOCKS_PER_THREAD * BGZF_DATA
+		self._level = level
+		self._pending = []
+		self._size = 0
+
+	def writable(self):
+		return True
+
+	def _flush_blocks(self, final=False):
+		data = b"".join(self._pending)
+		end = len(data) if final else len(data) - len(data) % BGZF_DATA
+		blocks = [data[start:start + BGZF_DATA] for start in range(0, end, BGZF_DATA)]
+		deflate = lambda block: _deflate(block, self._level)
+		for block in (self._pool.map(deflate, blocks) if self._pool is not None else map(deflate, blocks)):
+			self._file.write(block)
+		self._pending = [data[end:]]
+		self._size = len(data) - end
+
+	def write(self, data):
+		data = data.tobytes() if isinstance(data, memoryview) else bytes(data)		## bytes(memoryview) is its repr on Python 2
+		self._pending.append(data)
+		self._size += len(data)
+		if self._size >= self._batch:
+			self._flush_blocks()
+		return len(data)
+
+	def close(self):
+		if not self.closed:
+			try:
+				self._flush_blocks(final=True)
+				self._file.write(BGZF_EOF)
+			finally:
+				if self._pool is not None:
+					self._pool.close()
+					self._pool.join()
+				self._file.close()
+		io.RawIOBase.close(self)
+
+
+#################################################
+###                   zstd                    ###
+#################################################
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+## Raw streams over the output or input of a 'zstd' process (used when the zstandard module is missing);
+## closing the stream waits for the process and raises IOError when it failed
+class _CommandReader(io.RawIOBase):
+
+	def __init__(self, command):
+		try:
+			self._process = subprocess.Popen(command, stdout=subprocess.PIPE)
+		except OSError:
+			raise IOError("zstd files need the 'zstandard' module or the 'zstd' program")
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer):
+		return self._process.stdout.readinto(buffer)
+
+	def close(self):
+		if not self.closed:
+			self._process.stdout.close()
+			if self._process.wait() not in (0, -13):					## -13: stopped by closing the stream early
+				raise IOError("zstd exited with status "+str(self._process.returncode))
+		io.RawIOBase.close(self)
+
+class _CommandWriter(io.RawIOBase):
+
+	def __init__(self, command):
+		try:
+			self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+		except OSError:
+			raise IOError("zstd files need the 'zstandard' module or the 'zstd' program")
+
+	def writable(self):
+		return True
+
+	def write(self, data):
+		self._process.stdin.write(data)
+		return len(data)
+
+	def close(self):
+		if not self.closed:
+			self._process.stdin.close()
+			if self._process.wait() != 0:
+				raise IOError("zstd exited with status "+str(self._process.returncode))
+		io.RawIOBase.close(self)
+
+def _zstd_input(path):
+	if zstandard is not None:
+		return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+	return _CommandReader(["zstd", "-dcq", path])
+
+def _zstd_output(path, threads, level):
+	if zstandard is not None:
+		compressor = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+		return compressor.stream_writer(open(path, "wb"), closefd=True)
+	return _CommandWriter(["zstd", "-qf", "-" + str(level), "-T" + str(max(1, threads)), "-o", path])
+
+
+#################################################
+###            Open input and output          ###
+#################################################
+
+## Text streams (utf-8, with undecodable bytes kept as they are) for Python 3; Python 2 strings are bytes already
+def _text(stream):
+	if bytes is str:
+		return stream
+	return io.TextIOWrapper(stream, encoding="utf-8", errors="surrogateescape")
+
+## Open 'path' for reading whatever its compression; 'text' gives lines as strings rather than bytes and 'threads'
+## inflates bgzip blocks in background threads
+def open_input(path, text=False, threads=1):
+	codec = detect(path)
+	if codec == "none":
+		stream = open(path, "rb", BUFFER)
+	elif codec == "bgzip":
+		stream = io.BufferedReader(BGZFReader(path, threads), BUFFER)
+	elif codec == "gzip":
+		stream = io.BufferedReader(gzip.open(path, "rb"), BUFFER)
+	elif codec == "bz2":
+		stream = bz2.BZ2File(path, "rb")
+		if isinstance(stream, io.IOBase):
+			stream = io.BufferedReader(stream, BUFFER)
+	elif codec == "xz":
+		try:
+			import lzma
+		except ImportError:
+			raise IOError("xz files need the lzma module (Python 3)")
+		stream = io.BufferedReader(lzma.open(path, "rb"), BUFFER)
+	else:
+		stream = io.BufferedReader(_zstd_input(path), BUFFER)
+	return _text(stream) if text else stream
+
+## Open 'path' for writing with 'codec' (default: from the extension); 'threads' deflates bgzip blocks (and zstd)
+## in background threads; 'level' defaults to each codec's usual level
+def open_output(path, codec=None, text=False, threads=1, level=None):
+	codec = output_codec(path, codec)
+	if codec == "none":
+		stream = open(path, "wb", BUFFER)
+	elif codec == "bgzip":
+		stream = io.BufferedWriter(BGZFWriter(path, threads, level or 6), BUFFER)
+	elif codec == "gzip":
+		stream = io.BufferedWriter(gzip.open(path, "wb", level or 6), BUFFER)
+	elif codec == "bz2":
+		stream = bz2.BZ2File(path, "wb", compresslevel=level or 9)
+		if isinstance(stream, io.IOBase):
+			stream = io.BufferedWriter(stream, BUFFER)
+	elif codec == "xz":
+		try:
+			import lzma
+		except ImportError:
+			raise IOError("xz files need the lzma module (Python 3)")
+		stream = io.BufferedWriter(lzma.open(path, "wb", preset=level), BUFFER)
+	else:
+		stream = io.BufferedWriter(_zstd_output(path, threads, level or 3), BUFFER)
+	return _text(stream) if text else stream
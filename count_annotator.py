@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+from compressed_io import open_input, open_output
+
+## Count table annotation engine used by 'annotate_counts.py' and 'annotation_service.py'
+## Every line of a tab-delimited count table (transcript ID as first column) is written with its annotation as a
+## new first column: the dictionary value, '*' for the special last line, or 'unannotated_<ID>' when the transcript
+## is not in the dictionary. The table is read as a stream, so memory use does not grow with its size; compressed
+## tables are read directly and the output can be compressed (see 'compressed_io.py').
+
+
+#################################################
+###              Annotate lines               ###
+#################################################
+
+## Write the annotated 'lines' (without line endings) to 'output'; returns (total lines, annotated lines)
+def annotate_lines(lines, annotation_dict, output):
+	total = 0
+	annotated = 0
+	for foo in lines:
+		total += 1
+		bar = foo.split()										## Tab-split elements
+		denovo = bar[0]
+		if denovo in annotation_dict:							## If de novo assembly transcript name is in dictionary keys
+			annotated += 1
+			output.write(annotation_dict[denovo]+"\t"+foo+"\n")	## Write EnsemblID<tab>original line
+		elif denovo == "*":										## Retain special last line
+			output.write("*\t"+foo+"\n")						## Write *<tab>original line
+		else:													## If no matching EnsemblID (i.e., no annotation)
+			output.write("unannotated_"+denovo+"\t"+foo+"\n")	## Write unannotated_denovoID<tab>original line
+	return total, annotated
+
+def table_lines(infile):
+	for line in infile:
+		yield line.rstrip("\r\n")
+
+
+#################################################
+###            Annotate whole table           ###
+#################################################
+
+## Annotate the count table 'input_path' into 'output_path'; returns (total lines, annotated lines)
+## ('count' can wrap the line iterator, e.g. to count rows for 'instrument.py'; 'codec' compresses the output, by
+## default as its extension says, and 'threads' inflates and deflates bgzip in background threads)
+def annotate_count_table(input_path, output_path, annotation_dict, count=None, codec=None, threads=1):
+	with open_input(input_path, text=True, threads=threads) as infile, \
+	open_output(output_path, codec, text=True, threads=threads) as output:
+		lines = table_lines(infile)
+		if count is not None:
+			lines = count(lines)
+		return annotate_lines(lines, annotation_dict, output)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+from compressed_io import open_input, open_output
+from annotation_db import AnnotationDB
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+## Count-matrix annotation engine used by 'annotate_counts.py --matrix'
+## The dictionary keys are held in one sorted NumPy array, so the transcript IDs of a chunk of rows (transcript ID
+## as first column, optionally below a header line such as Trinity's '<tab>sample1<tab>sample2...') are mapped to
+## their annotations with one 'numpy.searchsorted' call. When rows are summed per annotation ID, per Trinity gene
+## ('cN_gM' of isoform 'cN_gM_iK') or per (annotation, gene) pair, the count columns of the chunk are parsed into a
+## NumPy array, sorted by group and reduced with 'numpy.add.reduceat' into one array of group totals, so only a
+## chunk of the matrix and the totals are held in memory. Unannotated transcripts keep their own 'unannotated_<ID>'
+## group and the special '*' line is summed into a '*' row written last. Without grouping, the counts are not parsed
+## and rows are written as 'annotate_counts.py' writes them (annotation, then the input line).
+
+GROUPS = ["annotation", "gene", "both"]
+CHUNK_ROWS = 16384													## Rows parsed at a time
+BLOCK_ROWS = 16384													## Groups per block of totals
+
+
+#################################################
+###               Row grouping                ###
+#################################################
+
+## Trinity genes of an array of isoform IDs ('c12_g1_i3' -> 'c12_g1'); other IDs are their own gene
+def trinity_genes(ids):
+	parts = numpy.char.rpartition(ids, b"_i")
+	isoform = (parts[:, 1] == b"_i") & numpy.char.isdigit(parts[:, 2])
+	return numpy.where(isoform, parts[:, 0], ids)
+
+## Join two arrays of byte strings with a tab
+def tab_join(first, second):
+	return numpy.char.add(numpy.char.add(first, b"\t"), second)
+
+## Distinct values of an array in order of first appearance, and the position of each element among them
+def first_unique(values):
+	uniques, first, inverse = numpy.unique(values, return_index=True, return_inverse=True)
+	order = numpy.argsort(first)
+	rank = numpy.empty(len(order), dtype=numpy.int64)
+	rank[order] = numpy.arange(len(order))
+	return [bytes(value) for value in uniques[order]], rank[inverse.reshape(-1)]
+
+## Column names of the group keys written before the counts
+def key_header(group):
+	if group == "annotation":
+		return [b"annotation"]
+	if group == "gene":
+		return [b"gene", b"annotation"]
+	return [b"annotation", b"gene"]
+
+## Group totals as rows of numbers, in order of first appearance of each group; the totals are kept in blocks of
+## BLOCK_ROWS groups, so new groups never copy the totals already summed
+class GroupSums(object):
+
+	def __init__(self, columns):
+		self.index = {}
+		self.keys = []
+		self.columns = columns
+		self.totals = []
+
+	## Group numbers of an array of group keys (new groups are numbered in order of first appearance)
+	def codes(self, keys):
+		uniques, positions = first_unique(keys)
+		numbers = numpy.empty(len(uniques), dtype=numpy.int64)
+		for position, key in enumerate(uniques):
+			number = self.index.get(key)
+			if number is None:
+				number = self.index[key] = len(self.keys)
+				self.keys.append(key)
+			numbers[position] = number
+		return numbers[positions]
+
+	## Add a chunk of rows to the totals of their groups ('codes' from 'codes', one per row)
+	def add(self, codes, values):
+		while len(self.totals) * BLOCK_ROWS < len(self.keys):
+			self.totals.append(numpy.zeros((BLOCK_ROWS, self.columns)))
+		order = numpy.argsort(codes, kind="mergesort")
+		ordered = codes[order]
+		starts = numpy.flatnonzero(numpy.concatenate(([True], ordered[1:] != ordered[:-1])))
+		sums = numpy.add.reduceat(values[order], starts, axis=0)
+		groups = ordered[starts]
+		blocks = groups // BLOCK_ROWS
+		for block in numpy.unique(blocks).tolist():					## Groups are sorted, so each block is one slice
+			first, last = numpy.searchsorted(blocks, [block, block + 1])
+			self.totals[block][groups[first:last] - block * BLOCK_ROWS] += sums[first:last]
+
+	## Columns whose totals are all whole numbers
+	def whole_columns(self):
+		whole = numpy.ones(self.columns, dtype=bool)
+		for totals in self.totals:
+			whole &= numpy.all(numpy.floor(totals) == totals, axis=0)
+		return whole.tolist()
+
+	## (keys, totals as lists) blocks of groups in order, with the group 'last' (if present) moved to the end;
+	## 'integers' gives the totals as integers (which format faster)
+	def blocks(self, last=None, integers=False):
+		skip = self.index.get(last)
+		for number, totals in enumerate(self.totals):
+			start = number * BLOCK_ROWS
+			keys = self.keys[start:start + BLOCK_ROWS]
+			rows = totals[:len(keys)]
+			if skip is not None and start <= skip < start + len(keys):
+				del keys[skip - start]
+				rows = numpy.delete(rows, skip - start, axis=0)
+			yield keys, (rows.astype(numpy.int64) if integers else rows).tolist()
+		if skip is not None:
+			rows = self.totals[skip // BLOCK_ROWS][skip % BLOCK_ROWS:skip % BLOCK_ROWS + 1]
+			yield [last], (rows.astype(numpy.int64) if integers else rows).tolist()
+
+
+#################################################
+###             Read the matrix               ###
+#################################################
+
+## Chunks of (IDs, line remainders, original lines) of at most 'chunk_rows' rows, without line endings
+def matrix_chunks(lines, chunk_rows=CHUNK_ROWS):
+	ids = []
+	rests = []
+	originals = []
+	for line in lines:
+		line = line.rstrip(b"\r\n")
+		fields = line.split(None, 1)
+		if not fields:
+			continue
+		ids.append(fields[0])
+		rests.append(fields[1] if len(fields) > 1 else b"")
+		originals.append(line)
+		if len(ids) == chunk_rows:
+			yield ids, rests, originals
+			ids = []
+			rests = []
+			originals = []
+	if ids:
+		yield ids, rests, originals
+
+## Count columns of a chunk of line remainders as a (rows, columns) array; raises ValueError naming the first row
+## whose counts are missing or not numbers
+def parse_counts(ids, rests):
+	try:
+		values = numpy.loadtxt(rests, dtype=numpy.float64, ndmin=2)
+		if len(values) == len(rests):
+			return values
+	except ValueError:
+		pass
+	columns = None
+	for denovo, rest in zip(ids, rests):							## Find the row that failed
+		fields = rest.split()
+		try:
+			[float(field) for field in fields]
+		except ValueError:
+			raise ValueError("the counts of "+_name(denovo)+" are not all numbers")
+		if not fields:
+			raise ValueError(_name(denovo)+" has no counts")
+		if columns is not None and len(fields) != columns:
+			raise ValueError(_name(denovo)+" has "+str(len(fields))+" count columns rather than "+str(columns))
+		columns = len(fields)
+	raise ValueError("the counts of the rows from "+_name(ids[0])+" on could not be read")
+
+def _name(denovo):
+	return "'"+denovo.decode("utf-8", "replace")+"'"
+
+## 'lines' with the line already read put back in front
+def _chain(first, lines):
+	yield first
+	for line in lines:
+		yield line
+
+## True when the first line is a header rather than counts: Trinity writes the sample names after a leading tab
+## (other headers need 'header=True' in 'annotate_count_matrix')
+def is_header(line):
+	return line.startswith(b"\t")
+
+
+#################################################
+###           Look up annotations             ###
+#################################################
+
+## Dictionary keys in one sorted array with their annotations, to look up a chunk of IDs at once
+class AnnotationIndex(object):
+
+	def __init__(self, annotation_dict):
+		if isinstance(annotation_dict, AnnotationDB):				## Entries are already sorted by key
+			items = [(key.encode("utf-8"), value.encode("utf-8")) if bytes is not str else (key, value) \
+			for key, value in annotation_dict.iteritems()]
+		else:
+			items = sorted((_encode(key), _encode(value)) for key, value in annotation_dict.items())
+		self.keys = numpy.array([key for key, value in items] or [b""])
+		self.values = numpy.array([value for key, value in items] or [b""])
+		self.size = len(items)
+
+	## (annotation array, boolean array of the IDs found) for an array of IDs; IDs not found get an empty annotation
+	def lookup(self, ids):
+		positions = numpy.minimum(numpy.searchsorted(self.keys, ids), len(self.keys) - 1)
+		found = self.keys[positions] == ids
+		if self.size == 0:
+			found[:] = False
+		return numpy.where(found, self.values[positions], b""), found
+
+def _encode(text):
+	return text if isinstance(text, bytes) else text.encode("utf-8")
+
+## Row labels of an array of IDs: the annotation, '*' for the special last line or 'unannotated_<ID>';
+## returns (labels, boolean array of the annotated rows)
+def row_labels(index, ids):
+	labels, found = index.lookup(ids)
+	labels = numpy.where(found, labels, numpy.char.add(b"unannotated_", ids))
+	star = (ids == b"*") & ~found										## Retain special last line
+	labels[star] = b"*"
+	return labels, found
+
+
+#################################################
+###            Annotate the matrix            ###
+#################################################
+
+## Annotate the count matrix 'input_path' into 'output_path', summing rows per 'group' ('annotation', 'gene',
+## 'both' or None for one row per transcript); returns (total rows, annotated rows, rows written)
+## ('header' True takes the first line as a header, otherwise it is one when it starts with a tab; 'count' can wrap
+## the line iterator as in 'count_annotator.py'; 'codec' and 'threads' as in 'compressed_io.py'); counts that are
+## missing or not numbers raise ValueError
+def annotate_count_matrix(input_path, output_path, annotation_dict, group=None, count=None, codec=None, threads=1, header=False):
+	if numpy is None:
+		raise ImportError("the count-matrix mode needs NumPy")
+	if group is not None and group not in GROUPS:
+		raise ValueError("unknown grouping '"+group+"' (choose from "+", ".join(GROUPS)+")")
+	index = AnnotationIndex(annotation_dict)
+	total = 0
+	annotated = 0
+	with open_input(input_path, threads=threads) as infile, open_output(output_path, codec, threads=threads) as output:
+		lines = iter(infile)
+		if count is not None:
+			lines = count(lines)
+		names = None
+		first = next(lines, None)
+		if first is not None and (header or is_header(first)):
+			names = first.rstrip(b"\r\n").split(b"\t")[1:]
+		elif first is not None:
+			lines = _chain(first, lines)
+		if group is None and names is not None:
+			output.write(b"annotation\t" + first.rstrip(b"\r\n") + b"\n")
+		sums = None
+		genes = {}
+		for ids, rests, originals in matrix_chunks(lines):
+			total += len(ids)
+			ids = numpy.array(ids)
+			labels, found = row_labels(index, ids)
+			annotated += int(found.sum())
+			if group is None:										## The counts are written as they are
+				output.write(b"".join([label + b"\t" + line + b"\n" for label, line in zip(labels.tolist(), originals)]))
+				continue
+			values = parse_counts(ids.tolist(), rests)
+			if sums is None:
+				sums = GroupSums(values.shape[1])
+			elif values.shape[1] != sums.columns:
+				raise ValueError("the rows from "+_name(ids[0])+" on have "+str(values.shape[1])+" count columns rather than "+str(sums.columns))
+			if group == "annotation":
+				codes = sums.codes(labels)
+			elif group == "gene":
+				gene_ids = trinity_genes(ids)
+				codes = sums.codes(gene_ids)
+				kept = found | (labels == b"*")							## Annotations listed for each gene
+				for pair in first_unique(tab_join(gene_ids[kept], labels[kept]))[0]:
+					gene, label = pair.split(b"\t", 1)
+					listed = genes.setdefault(gene, [])
+					if label not in listed:
+						listed.append(label)
+			else:
+				codes = sums.codes(tab_join(labels, trinity_genes(ids)))
+			sums.add(codes, values)
+		if group is None:
+			return total, annotated, total
+		if names is not None:
+			output.write(b"\t".join(key_header(group) + names) + b"\n")
+		if sums is None:
+			return total, annotated, 0
+		whole = sums.whole_columns()							## Whole-number columns are written without a decimal point
+		template = b"\t".join([b"%d" if integral else b"%r" for integral in whole]) + b"\n"
+		for keys, rows in sums.blocks(b"*\t*" if group == "both" else b"*", all(whole)):
+			if group == "gene":											## Gene, then the annotations of its isoforms
+				prefixes = [gene + b"\t" + (b",".join(genes[gene]) if gene in genes else b"unannotated_" + gene) for gene in keys]
+			else:														## Annotation (and gene)
+				prefixes = keys
+			output.write(b"".join([prefix + b"\t" + template % tuple(row) for prefix, row in zip(prefixes, rows)]))
+		return total, annotated, len(sums.keys)
@@ -1,6 +1,10 @@
 #!/usr/local/env python
 
 import optparse
+import sys
+from ortholog_db import open_index, INDEX_SUFFIX
+from compressed_io import open_input, open_output
+import instrument
 
 usage_line = """
 A script to extract orthologous Ensembl IDs from a genome-of-interest using a list \
@@ -8,41 +12,93 @@ of Ensembl IDs already in hand. Input is a list of Ensembl IDs and a "database"
 downloaded from Ensembl that has the query Ensembl IDs in one column and the target/subject \
 Ensembl IDs in another column. The user can also specify which column contains the \
 query and the target Ensembl IDs and an output file name (tab-delimited text file). \
+The database file is indexed once (see 'ortholog_db.py'; the index is written next to it, \
+or to the file given with '--index', and rebuilt when the database file changes), so later \
+runs only look the query IDs up. Every ortholog of a query is written on its own line \
+(one-to-many and many-to-many orthologs are all kept); queries without an ortholog or \
+missing from the database are written with 'NA'. Several query lists can be given (repeat \
+'--query'), each written to the matching '--output' or to '<query_list>.orthologs.txt'. \
+Once the index exists, '--index' alone (without '--database', -q and -s) can be used. \
+The database file and query lists can be compressed (gzip, bgzip, bzip2, xz or zstd), and outputs are compressed \
+when their names end in '.gz', '.bgz', '.bz2', '.xz' or '.zst'. The time, rows and memory of each step are \
+written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a \
+cProfile dump). \
 
-python ensembl_orthologs.py --query <query_list> --database <ensembl_database> \
--q <query_column> -s <subject_column> --output <output.txt>
+python ensembl_orthologs.py --query <query_list> [--query <query_list> ...] --database <ensembl_database> \
+-q <query_column> -s <subject_column> [--output <output.txt> ... --index <index_file> --rebuild --verbose \
+--metrics <metrics.json> --profile <profile>]
 """
 
 usage = usage_line
 
 parser = optparse.OptionParser(usage=usage)
-parser.add_option("--query", action= "store", type= "string", dest="query", help="""The query list of Ensembl IDs to find orthologs for""")
+parser.add_option("--query", action= "append", type= "string", dest="query", help="""The query list of Ensembl IDs to find orthologs for (can be given several times)""", default = [])
 parser.add_option("--database", action="store", type= "string", dest="database", help="""A tab-delimited file with query IDs and subject IDs obtained from BioMart""")
 parser.add_option("-q", action = "store", type = "string", dest = "q", help = """Column number where query IDs are located in "database" file (1, 2, ..., N)""")
 parser.add_option("-s", action = "store", type = "string", dest = "s", help = """Column number where subject IDs are located in "database" file (1, 2, ..., N)""")
-parser.add_option("--output", action = "store", type = "string", dest = "output" , help = """Output file to write results""", default = "output.txt")
+parser.add_option("--output", action = "append", type = "string", dest = "output" , help = """Output file to write results (one per query list) [output.txt]""", default = [])
+parser.add_option("--index", action = "store", type = "string", dest = "index", help = """Ortholog index file [<database>"""+INDEX_SUFFIX+"""]""")
+parser.add_option("--rebuild", action = "store_true", dest = "rebuild", help = """Rebuild the ortholog index even if it is current""", default = False)
+instrument.add_options(parser)
 options, args = parser.parse_args()
 
 
+## Output file of each query list: the matching '--output' (one per list, checked before), 'output.txt' for a
+## single list, else '<list>.orthologs.txt'
+def output_names(queries, outputs):
+	if outputs:
+		return outputs
+	if len(queries) == 1:
+		return ["output.txt"]
+	return [query + ".orthologs.txt" for query in queries]
+
+## Write every ortholog of each listed query ('NA' when there is none); returns (queries, missing from database)
+def write_orthologs(query_path, output_path, index):
+	queries = []
+	with open_input(query_path, text=True) as infile:
+		for line in infile:
+			if not line.strip().startswith("#"):
+				queries.append(line.rstrip())
+	found = index.lookup(queries)
+	missing = 0
+	out = open_output(output_path, text=True)
+	for record in queries:
+		subjects = found.get(record)
+		if subjects is None:
+			missing += 1
+		for value in subjects or ["NA"]:
+			out.write(record+"\t"+value+"\n")
+	out.close()
+	return len(queries), missing
+
+
 if __name__ == '__main__':
-	db_dict = {}
-	for line in open(options.database, "r"):
-		if not line.strip().startswith("#"):
-			record = line.rstrip().split("\t")
-			q = str(options.q)
-			s = str(options.s)
-			query = int(q)-1
-			subject = int(s)-1
-			if len(record) == 2:
-				db_dict[record[query]] = record[subject]
+	if not options.query or (options.database is None and options.index is None):
+		sys.stderr.write("\n***Error: specify the query list(s) and the database file (or an existing --index)!***\n\n")
+		sys.exit(1)
+	if options.output and len(options.output) != len(options.query):
+		sys.stderr.write("\n***Error: the number of --output files ("+str(len(options.output))+") must match the number of --query lists ("+str(len(options.query))+")!***\n\n")
+		sys.exit(1)
+	if options.database is not None and (options.q is None or options.s is None):
+		sys.stderr.write("\n***Error: specify the query and subject columns of the database file!***\n\n")
+		sys.exit(1)
+	if options.database is not None and not (options.q.isdigit() and options.s.isdigit() and int(options.q) >= 1 and int(options.s) >= 1):
+		sys.stderr.write("\n***Error: column numbers start at 1!***\n\n")
+		sys.exit(1)
+	metrics = instrument.Instrument("ensembl_orthologs.py")
+	def find_orthologs():
+		try:
+			if options.database is not None:
+				index = open_index(options.database, options.index, int(options.q), int(options.s), options.rebuild, instrument=metrics)
 			else:
-				db_dict[record[query]] = "NA"
-	out = open(options.output, "w")
-	for line in open(options.query, "r"):
-		if not line.strip().startswith("#"):
-			record = line.rstrip()
-			value = db_dict[record]
-			outline = record+"\t"+value+"\n"
-			out.write(outline)
-	out.close()
-			
\ No newline at end of file
+				index = open_index(index_path=options.index)
+		except (IOError, OSError) as error:
+			sys.stderr.write("\n***Error: "+str(error)+"!***\n\n")
+			sys.exit(1)
+		for query_path, output_path in zip(options.query, output_names(options.query, options.output)):
+			with metrics.stage("orthologs "+query_path, inputs=[query_path], outputs=[output_path]) as stage:
+				total, missing = write_orthologs(query_path, output_path, index)
+				stage.rows += total
+			sys.stderr.write(query_path+": "+str(total)+" queries ("+str(missing)+" not in the database) written to "+output_path+"\n")
+		index.close()
+	instrument.run(find_orthologs, metrics, options)
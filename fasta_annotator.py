@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import os
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from annotation_db import AnnotationDB, load_dictionary
+from compressed_io import BUFFER, detect, open_input, open_output
+
+## Byte-level fasta annotation engine used by 'annotate_fasta.py'
+## The assembly is split into byte ranges that start on a record ('>') boundary, each range is annotated by
+## rewriting only its header lines (sequence bytes are copied through untouched), and the annotated ranges are
+## written back out in input order, so output is identical no matter how many worker processes are used.
+## An already opened dictionary (as 'annotation_service.py' keeps one) is shared by worker threads instead, which
+## annotate blocks of whole records read in order by the calling thread.
+## Compressed assemblies (see 'compressed_io.py') cannot be split by seeking, so they are decompressed as a stream
+## and cut into blocks of whole records as they are read; the output can be compressed as well.
+
+CHUNK_SIZE = 16 * 1024 * 1024										## Bytes of fasta handed to a worker at a time
+SCAN_SIZE = 1024 * 1024
+
+
+#################################################
+###       Split fasta at record boundaries    ###
+#################################################
+
+## Yield (start, end) byte ranges covering the whole file, each ending just before a '>' that starts a line
+def record_ranges(path, chunk_size=CHUNK_SIZE):
+	size = os.path.getsize(path)
+	start = 0
+	with open(path, "rb") as infile:
+		while start < size:
+			end = start + chunk_size
+			if end >= size:
+				end = size
+			else:
+				infile.seek(end - 1)
+				while True:
+					block = infile.read(SCAN_SIZE + 1)
+					index = block.find(b"\n>")
+					if index >= 0:
+						end += index
+						break
+					if len(block) <= 1:								## No later record, so the range runs to the end of the file
+						end = size
+						break
+					end += len(block) - 1
+					infile.seek(end - 1)
+			yield start, end
+			start = end
+
+## Yield blocks of about 'chunk_size' bytes of whole records read from a (decompressing) stream
+def record_blocks(infile, chunk_size=CHUNK_SIZE):
+	pending = []
+	size = 0
+	while True:
+		data = infile.read(BUFFER)
+		if not data:
+			break
+		pending.append(data)
+		size += len(data)
+		if size >= chunk_size:
+			data = b"".join(pending)
+			index = data.rfind(b"\n>")
+			if index < 0:											## One record so far, keep reading
+				pending = [data]
+				continue
+			yield data[:index + 1]
+			pending = [data[index + 1:]]
+			size = len(pending[0])
+	if size:
+		yield b"".join(pending)
+
+
+#################################################
+###        Annotate a block of records        ###
+#################################################
+
+## Build a bytes -> bytes (or None) lookup from either dictionary format
+def make_lookup(annotation_dict):
+	if isinstance(annotation_dict, AnnotationDB):
+		return annotation_dict.get_bytes
+	if bytes is str:
+		return annotation_dict.get
+	def lookup(denovo):
+		value = annotation_dict.get(denovo.decode("utf-8"))
+		if value is None:
+			return None
+		return value.encode("utf-8")
+	return lookup
+
+## Rewrite the headers of a block of whole fasta records; returns (annotated bytes, total records, annotated records)
+def annotate_block(data, lookup):
+	if not data.startswith(b">"):									## Skip anything before the first record (as SeqIO does)
+		index = data.find(b"\n>")
+		if index < 0:
+			return b"", 0, 0
+		data = data[index + 1:]
+	records = data[1:].split(b"\n>")
+	annotated = 0
+	for number, record in enumerate(records):
+		newline = record.find(b"\n")
+		if newline < 0:
+			header, sequence = record, None
+		else:
+			header, sequence = record[:newline], record[newline:]
+		fields = header.split(None, 1)
+		denovo = fields[0] if fields else b""
+		annotation = lookup(denovo)
+		if annotation is None:										## If no matching EnsemblID (i.e., no annotation)
+			header = b"unannotated_" + denovo
+		else:														## Header becomes the annotation ID
+			annotated += 1
+			header = annotation
+		records[number] = header if sequence is None else header + sequence
+	output = b">" + b"\n>".join(records)
+	if not output.endswith(b"\n"):
+		output += b"\n"
+	return output, len(records), annotated
+
+
+#################################################
+###              Worker processes             ###
+#################################################
+
+_worker = {}
+
+def _init_worker(input_path, dictionary_path):
+	_worker["input"] = input_path
+	_worker["lookup"] = make_lookup(load_dictionary(dictionary_path))
+
+def _annotate_range(byte_range):
+	start, end = byte_range
+	with open(_worker["input"], "rb") as infile:
+		infile.seek(start)
+		data = infile.read(end - start)
+	return annotate_block(data, _worker["lookup"])
+
+def _annotate_data(data):
+	return annotate_block(data, _worker["lookup"])
+
+## Run jobs through the pool in order, keeping at most 'window' results waiting to be written
+def _ordered(pool, function, jobs, window):
+	pending = deque()
+	for job in jobs:
+		pending.append(pool.apply_async(function, (job,)))
+		if len(pending) >= window:
+			yield pending.popleft().get()
+	while pending:
+		yield pending.popleft().get()
+
+
+#################################################
+###            Annotate whole fasta           ###
+#################################################
+
+## Annotate 'input_path' into 'output_path' in this process with an already opened dictionary (as
+## 'annotation_service.py' keeps one), shared by 'threads' worker threads (no processes are forked, so it is safe
+## to call from a threaded server); returns (total, annotated)
+def annotate_fasta_with(input_path, output_path, annotation_dict, chunk_size=CHUNK_SIZE, codec=None, threads=1):
+	lookup = make_lookup(annotation_dict)
+	def annotate(block):
+		return annotate_block(block, lookup)
+	total = 0
+	annotated = 0
+	pool = None
+	if threads > 1 and os.path.getsize(input_path) > chunk_size:
+		pool = ThreadPool(threads)
+	try:
+		with open_input(input_path, threads=threads) as infile, open_output(output_path, codec, threads=threads) as output:
+			blocks = record_blocks(infile, chunk_size)
+			if pool is not None:
+				results = _ordered(pool, annotate, blocks, threads * 2)
+			else:
+				results = (annotate(block) for block in blocks)
+			for data, records, hits in results:
+				output.write(data)
+				total += records
+				annotated += hits
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+	return total, annotated
+
+## Annotate 'input_path' into 'output_path' with 'threads' worker processes (which also inflate and deflate
+## bgzip); 'codec' compresses the output, by default as its extension says; returns (total, annotated)
+def annotate_fasta(input_path, output_path, dictionary_path, threads=1, chunk_size=CHUNK_SIZE, codec=None):
+	compressed = detect(input_path) != "none"
+	function = _annotate_data if compressed else _annotate_range
+	total = 0
+	annotated = 0
+	pool = None
+	if threads > 1 and os.path.getsize(input_path) > chunk_size:	## Workers are forked before any I/O threads start
+		pool = multiprocessing.Pool(threads, _init_worker, (input_path, dictionary_path))
+	else:
+		_init_worker(input_path, dictionary_path)
+	infile = None
+	if compressed:													## Compressed files are cut into blocks as they are read
+		infile = open_input(input_path, threads=threads)
+		jobs = record_blocks(infile, chunk_size)
+	else:															## Plain files are split into byte ranges
+		jobs = record_ranges(input_path, chunk_size)
+	if pool is not None:
+		results = _ordered(pool, function, jobs, threads * 2)
+	else:
+		results = (function(job) for job in jobs)
+	try:
+		with open_output(output_path, codec, threads=threads) as output:
+			for data, records, hits in results:
+				output.write(data)
+				total += records
+				annotated += hits
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+		if infile is not None:
+			infile.close()
+	return total, annotated
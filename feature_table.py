@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import gzip
+import io
+import re
+import sys
+import instrument
+
+usage_line = """
+feature_table.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (used by 'ncbi_CDS_creator.sh') that picks one CDS per gene from NCBI genome feature tables (gzipped or \
+plain text) and writes the related (transcript) accessions of the picked CDSs, ready for 'ncbi_fetch.py'. The \
+tables are read once as a stream and only the best CDS of each GeneID is kept in memory, so no sort is needed. The \
+pick is the one the original 'ncbi_CDS_creator.sh' pipeline (awk | sort -k1,1 -k4,4nr -k3,3 | awk) makes with \
+byte-order (LC_ALL=C) sorting: the CDS with the longest feature interval, then the smallest related accession, then \
+the smallest product accession. Output is ordered by GeneID, in lines of up to 1000 (see '--chunk') comma-separated \
+accessions (each followed by a comma, as the original pipeline wrote its batches). The time, accessions and memory \
+of the run are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a cProfile \
+dump).
+
+python feature_table.py [-o <accession_list> --chunk <N> --verbose --metrics <metrics.json> --profile <profile>] \
+<feature_table.txt.gz> [<feature_table.txt.gz> ...]"""
+
+SORT_BLANKS = re.compile(b"[ \t]*[^ \t]+|[ \t]+$")
+SORT_NUMBER = re.compile(b"[ \t]*(-?[0-9]*(?:\\.[0-9]*)?)")
+
+
+#################################################
+###           Read the feature table          ###
+#################################################
+
+## Lines of a feature table, decompressed if it is gzipped
+def table_lines(path):
+	with open(path, "rb") as infile:
+		magic = infile.read(2)
+	if magic == b"\x1f\x8b":
+		return io.BufferedReader(gzip.open(path, "rb"), 1 << 20)
+	return open(path, "rb")
+
+## Value of a field as 'sort -n' reads it (text that is not a number counts as 0)
+def sort_number(field):
+	number = SORT_NUMBER.match(field).group(1)
+	try:
+		return float(number)
+	except ValueError:
+		return 0.0
+
+## Sort key of a 'GeneID, product accession, related accession, interval length' line under -k1,1 -k4,4nr -k3,3
+## (sort splits fields at blanks, with the blanks belonging to the following field, and compares whole lines last)
+def sort_key(line):
+	fields = SORT_BLANKS.findall(line) + [b"", b"", b"", b""]
+	return (fields[0], -sort_number(fields[3]), fields[2], line)
+
+
+#################################################
+###            Pick one CDS per gene          ###
+#################################################
+
+## {GeneID: sort key of its best CDS} from the CDS lines of the feature tables
+def best_cds(paths):
+	best = {}
+	for path in paths:
+		with table_lines(path) as lines:
+			for line in lines:
+				if not line.startswith(b"CDS\t"):
+					continue
+				fields = line.rstrip(b"\r\n").split(b"\t", 18)
+				if len(fields) < 18:
+					fields += [b""] * 18
+				gene = fields[15]
+				related = fields[12]
+				length = fields[17]
+				selected = gene + b"\t" + fields[10] + b"\t" + related + b"\t" + length
+				if gene and fields[10] and related and length.isdigit() and b" " not in selected:
+					key = (gene, -int(length), b"\t" + related, selected)		## Usual case: no empty or blank-containing fields
+				else:
+					key = sort_key(selected)
+				found = best.get(gene)
+				if found is None or key < found:
+					best[gene] = key
+	return best
+
+## Related accessions of the picked CDSs, in the order the original pipeline printed them
+def picked_accessions(best):
+	accessions = []
+	for key in sorted(best.values()):
+		accession = key[3].split(b"\t")[2]
+		if accession:
+			accessions.append(accession)
+	return accessions
+
+## Write the accessions in lines of 'chunk' (each accession followed by a comma)
+def write_batches(accessions, output, chunk=1000):
+	for start in range(0, len(accessions), chunk):
+		output.write(b",".join(accessions[start:start + chunk]) + b",\n")
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-i", action = "append", type = "string", dest = "tables", help = "NCBI feature table (can be given several times, or listed after the options)", default = [])
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output accession list [STDOUT]")
+	parser.add_option("--chunk", action = "store", type = "int", dest = "chunk", help = "accessions per output line [1000]", default = 1000)
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+	tables = options.tables + args
+## Check for missing user input
+	if not tables:
+		sys.stderr.write("\n***Error: specify the feature table!***\n\n")
+		sys.exit(1)
+	if options.chunk < 1:
+		sys.stderr.write("\n***Error: the chunk size must be at least 1!***\n\n")
+		sys.exit(1)
+## When all input is present
+	metrics = instrument.Instrument("feature_table.py")
+	def select():
+		with metrics.stage("select CDS", inputs=tables, outputs=[options.output]) as stage:
+			accessions = picked_accessions(best_cds(tables))
+			stage.rows += len(accessions)
+			if options.output is None:
+				write_batches(accessions, getattr(sys.stdout, "buffer", sys.stdout), options.chunk)
+			else:
+				with open(options.output, "wb") as output:
+					write_batches(accessions, output, options.chunk)
+	instrument.run(select, metrics, options)
+
+if __name__ == '__main__':
+	main()
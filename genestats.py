@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import multiprocessing
+import os
+import sys
+from gff_index import GFFIndex, attribute, _to_bytes
+import instrument
+
+usage_line = """
+genestats.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (and engine used by 'genestats') that calculates gene structure measures from a GFF3 annotation file in a \
+single pass. Features are grouped in memory by their Parent IDs (exact matches; features with several parents count \
+for each of them) and the measures are computed with interval arithmetic, so no bgzip/tabix/bedtools runs or \
+temporary files are needed. Output is the same 12 column tab-delimited table as 'genestats', one row per mRNA in \
+file order: transcript ID, transcript length, number and total length of exons, introns (parts of the transcript \
+not covered by exons), CDS chunks, 5' UTR and 3' UTR sequences. As in 'genestats', each feature length is \
+end - start. With '--threads', blocks of whole chromosomes are processed in parallel (the file must then list each \
+chromosome's features together, as sorted GFF3 does; otherwise the file is processed serially). With \
+'--transcripts', only the listed transcripts are measured, using the persistent GFF index of 'gff_index.py' \
+(built once and reused while the GFF file is unchanged) instead of reading the whole file. The time, transcripts \
+and memory of the run are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and \
+a cProfile dump).
+
+python genestats.py -i <file.gff> [-o <output> --threads <N> --transcripts <ID,ID,...> --verbose --metrics <metrics.json> \
+--profile <profile>]"""
+
+COUNTED = {b"CDS": 0, b"five_prime_UTR": 1, b"three_prime_UTR": 2}
+
+
+#################################################
+###       Split GFF at chromosome boundaries  ###
+#################################################
+
+## Byte ranges covering the whole file, cut into about 'blocks' pieces that each start where a new chromosome begins
+def chromosome_ranges(path, blocks):
+	size = os.path.getsize(path)
+	offsets = [0]
+	with open(path, "rb") as infile:
+		for block in range(1, blocks):
+			target = size * block // blocks
+			if target <= offsets[-1]:
+				continue
+			infile.seek(target)
+			infile.readline()											## Finish the line the target falls in
+			seqid = None
+			while True:
+				start = infile.tell()
+				line = infile.readline()
+				if not line:
+					start = size
+					break
+				if line.startswith(b"#"):
+					continue
+				current = line.split(b"\t", 1)[0]
+				if seqid is None:
+					seqid = current
+				elif current != seqid:
+					break
+			if start < size and start > offsets[-1]:
+				offsets.append(start)
+	offsets.append(size)
+	return list(zip(offsets[:-1], offsets[1:]))
+
+
+#################################################
+###        Measure a block of features        ###
+#################################################
+
+## Parts of the transcript [start, end] not covered by exons (as 'bedtools subtract' reports them, 1-based)
+def intron_pieces(start, end, exons):
+	pieces = []
+	position = start
+	for exon_start, exon_end in sorted(exons):
+		if exon_start > end:
+			break
+		if exon_start > position:
+			pieces.append((position, exon_start - 1))
+		position = max(position, exon_end + 1)
+	if position <= end:
+		pieces.append((position, end))
+	return pieces
+
+## Measure every mRNA in an iterable of GFF lines; returns (output rows, chromosomes seen)
+def structure_stats(lines):
+	transcripts = []
+	exons = {}
+	counted = {}
+	seqids = set()
+	for line in lines:
+		if line.startswith(b"#"):
+			continue
+		fields = line.rstrip(b"\r\n").split(b"\t")
+		if len(fields) < 9:
+			continue
+		seqids.add(fields[0])
+		kind = fields[2]
+		if kind == b"mRNA":
+			transcripts.append((attribute(fields[8], b"ID"), int(fields[3]), int(fields[4])))
+		elif kind == b"exon" or kind in COUNTED:
+			parents = attribute(fields[8], b"Parent")
+			if parents is None:
+				continue
+			start = int(fields[3])
+			end = int(fields[4])
+			for parent in parents.split(b","):
+				if kind == b"exon":
+					exons.setdefault(parent, []).append((start, end))
+				else:
+					sums = counted.setdefault(parent, [0] * 6)
+					sums[COUNTED[kind] * 2] += 1
+					sums[COUNTED[kind] * 2 + 1] += end - start
+	rows = [transcript_row(transcript, start, end, exons.get(transcript, []), counted.get(transcript, [0] * 6)) \
+	for transcript, start, end in transcripts]
+	return rows, seqids
+
+## Output row of one transcript from its exon intervals and CDS/UTR counts and lengths
+def transcript_row(transcript, start, end, exons, counted):
+	introns = intron_pieces(start, end, exons)
+	values = [end - start, len(exons), sum(exon_end - exon_start for exon_start, exon_end in exons), \
+	len(introns), sum(intron_end - intron_start for intron_start, intron_end in introns)] + counted
+	return (transcript or b"") + b"\t" + b"\t".join(str(value).encode("ascii") for value in values) + b"\n"
+
+## Output rows for the given transcript IDs, answered from the persistent GFF index
+def indexed_stats(index, transcripts):
+	rows = []
+	for transcript in transcripts:
+		transcript = _to_bytes(transcript)
+		exons = []
+		counted = [0] * 6
+		for fields in index.children(transcript):
+			if fields[2] == b"exon":
+				exons.append((int(fields[3]), int(fields[4])))
+			elif fields[2] in COUNTED:
+				counted[COUNTED[fields[2]] * 2] += 1
+				counted[COUNTED[fields[2]] * 2 + 1] += int(fields[4]) - int(fields[3])
+		for fields in index.by_id(transcript, "mRNA"):
+			rows.append(transcript_row(transcript, int(fields[3]), int(fields[4]), exons, counted))
+	return rows
+
+
+#################################################
+###              Worker processes             ###
+#################################################
+
+_worker = {}
+
+def _init_worker(input_path):
+	_worker["input"] = input_path
+
+def _range_stats(byte_range):
+	start, end = byte_range
+	with open(_worker["input"], "rb") as infile:
+		infile.seek(start)
+		data = infile.read(end - start)
+	return structure_stats(data.split(b"\n"))
+
+
+#################################################
+###            Measure whole GFF file         ###
+#################################################
+
+## Measure 'input_path' into the binary file object 'output' with 'threads' worker processes; returns the number of mRNAs
+def gene_stats(input_path, output, threads=1):
+	rows = None
+	if threads > 1:
+		pool = multiprocessing.Pool(threads, _init_worker, (input_path,))
+		try:
+			results = pool.map(_range_stats, chromosome_ranges(input_path, threads * 4), chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+		seen = set()
+		rows = []
+		for block_rows, seqids in results:
+			if seen & seqids:										## A chromosome is split across blocks: measure serially
+				rows = None
+				break
+			seen |= seqids
+			rows.extend(block_rows)
+	if rows is None:
+		with open(input_path, "rb") as infile:
+			rows = structure_stats(infile)[0]
+	output.writelines(rows)
+	return len(rows)
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-i", action = "store", type = "string", dest = "gff", help = "input GFF3 file")
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output table [STDOUT]")
+	parser.add_option("--threads", action = "store", type = "int", dest = "threads", help = "number of worker processes [1]", default = 1)
+	parser.add_option("--transcripts", action = "store", type = "string", dest = "transcripts", help = "comma-separated transcript IDs to measure (uses the GFF index)")
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.gff is None:
+		sys.stderr.write("\n***Error: specify the input GFF3 file!***\n\n")
+		sys.exit(1)
+## When all input is present
+	if options.output is None:
+		output = getattr(sys.stdout, "buffer", sys.stdout)
+	else:
+		output = open(options.output, "wb")
+	metrics = instrument.Instrument("genestats.py")
+	def measure():
+		with metrics.stage("gene structure", inputs=[options.gff], outputs=[options.output]) as stage:
+			if options.transcripts is not None:
+				with GFFIndex(options.gff) as index:
+					rows = indexed_stats(index, options.transcripts.split(","))
+					output.writelines(rows)
+					stage.rows += len(rows)
+			else:
+				stage.rows += gene_stats(options.gff, output, options.threads)
+			output.flush()
+	try:
+		instrument.run(measure, metrics, options)
+	finally:
+		if options.output is not None:
+			output.close()
+
+if __name__ == '__main__':
+	main()
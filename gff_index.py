@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import bisect
+import json
+import mmap
+import os
+import sys
+from array import array
+
+usage_line = """
+gff_index.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Module (used by 'genestats.py') and query script for a persistent GFF3 feature index. The index is built with one \
+pass over the GFF file and saved next to it ('<file.gff>.gffidx', a json header line followed by plain arrays of \
+numbers and sorted lists of IDs, so reading it runs no code and IDs are found by binary search without building a \
+table of every ID); it is reused for as long as the size and modification time \
+of the GFF file are unchanged and rebuilt automatically otherwise. Features can be looked up by ID, by Parent ID (exact matches) and by genomic interval (features \
+overlapping seqid:start-end, 1-based and inclusive), optionally restricted to one feature type, and are read \
+straight from the GFF file (which is memory-mapped) by byte offset. Matching GFF lines are written to STDOUT in file order.
+
+python gff_index.py -i <file.gff> [--id <ID> | --parent <ID> | --region <seqid:start-end>] [--type <feature_type>]"""
+
+FORMAT = "gffidx"
+VERSION = 3
+
+
+#################################################
+###              Index structure              ###
+#################################################
+
+## The index is a dictionary of sections, held in memory as they are stored (arrays 'l' and byte strings):
+## rows:            one per feature line in file order - byte offset of the line
+## <table>_keys:    sorted keys of a table (IDs, Parent IDs or seqids), each followed by a newline
+## <table>_offsets: start of every key in '<table>_keys', plus the end of the last one
+## id_rows:         row of each feature ID, or -(group + 1) when several lines share the ID (e.g. CDS chunks)
+## parent_rows:     row of each Parent ID, or -(group + 1) when it has several children
+## group_rows:      rows of the IDs and Parent IDs with more than one line, one group after another
+## group_ends:      end of every group in 'group_rows'
+## seqid_ends:      end of the features of every seqid in the four interval arrays, which hold the features of
+##                  one seqid after another, sorted by start: starts, reach (running maximum of ends), ends and rows
+
+## Index file: one json line (format, version, fingerprint of the GFF file, item size and byte order of the arrays
+## and the length of every section), then the sections in the order listed, arrays written with 'tofile'
+SECTIONS = ["rows", "id_keys", "id_offsets", "id_rows", "parent_keys", "parent_offsets", "parent_rows", "group_rows", \
+"group_ends", "seqid_keys", "seqid_offsets", "seqid_ends", "starts", "reach", "ends", "interval_rows"]
+BLOBS = set(["id_keys", "parent_keys", "seqid_keys"])
+
+def _to_bytes(text):
+	if isinstance(text, bytes):
+		return text
+	return text.encode("utf-8")
+
+def fingerprint(path):
+	info = os.stat(path)
+	return (info.st_size, int(info.st_mtime))
+
+## Value of one attribute (e.g. ID or Parent) from column 9, or None
+def attribute(column, key):
+	key += b"="
+	for item in column.split(b";"):
+		item = item.strip()
+		if item.startswith(key):
+			return item[len(key):]
+	return None
+
+def _add(table, groups, key, row):
+	found = table.get(key)
+	if found is None:
+		table[key] = row
+	elif found >= 0:
+		table[key] = -(len(groups) + 1)
+		groups.append(array("l", [found, row]))
+	else:
+		groups[-found - 1].append(row)
+
+
+#################################################
+###               Build the index             ###
+#################################################
+
+## Index sections of 'path' (see SECTIONS)
+def build_index(path):
+	rows = array("l")
+	ids = {}
+	parents = {}
+	groups = []
+	intervals = {}
+	offset = 0
+	with open(path, "rb") as infile:
+		for line in infile:
+			start = offset
+			offset += len(line)
+			if line.startswith(b"#"):
+				if line.startswith(b"##FASTA"):						## Sequences follow the features
+					break
+				continue
+			fields = line.rstrip(b"\r\n").split(b"\t")
+			if len(fields) < 9:
+				continue
+			row = len(rows)
+			rows.append(start)
+			feature = attribute(fields[8], b"ID")
+			if feature is not None:
+				_add(ids, groups, feature, row)
+			parent = attribute(fields[8], b"Parent")
+			if parent is not None:
+				for name in parent.split(b","):
+					_add(parents, groups, name, row)
+			intervals.setdefault(fields[0], []).append((int(fields[3]), int(fields[4]), row))
+	index = {"fingerprint": fingerprint(path), "rows": rows, "group_rows": array("l"), "group_ends": array("l")}
+	for name, table in (("id", ids), ("parent", parents)):
+		keys = sorted(table)
+		_add_keys(index, name, keys)
+		index[name + "_rows"] = array("l", [table[key] for key in keys])
+	for group in groups:
+		index["group_rows"].extend(group)
+		index["group_ends"].append(len(index["group_rows"]))
+	keys = sorted(intervals)
+	_add_keys(index, "seqid", keys)
+	index["seqid_ends"] = array("l")
+	for name in ("starts", "reach", "ends", "interval_rows"):
+		index[name] = array("l")
+	for key in keys:
+		features = intervals[key]
+		features.sort()
+		furthest = 0
+		for feature in features:
+			furthest = max(furthest, feature[1])
+			index["starts"].append(feature[0])
+			index["reach"].append(furthest)
+			index["ends"].append(feature[1])
+			index["interval_rows"].append(feature[2])
+		index["seqid_ends"].append(len(index["starts"]))
+	return index
+
+def _add_keys(index, name, keys):
+	offsets = array("l", [0])
+	for key in keys:
+		offsets.append(offsets[-1] + len(key) + 1)
+	index[name + "_keys"] = b"".join([key + b"\n" for key in keys])
+	index[name + "_offsets"] = offsets
+
+
+#################################################
+###            Save and read the index        ###
+#################################################
+
+## Write the index to a temporary file and rename it into place
+def save_index(index, index_path):
+	header = {"format": FORMAT, "version": VERSION, "fingerprint": list(index["fingerprint"]), "itemsize": array("l").itemsize, \
+	"byteorder": sys.byteorder, "sections": [[name, len(index[name])] for name in SECTIONS]}
+	tmp = index_path + ".%d.tmp" % os.getpid()
+	with open(tmp, "wb") as outfile:
+		outfile.write(json.dumps(header).encode("utf-8") + b"\n")
+		for name in SECTIONS:
+			if name in BLOBS:
+				outfile.write(index[name])
+			else:
+				index[name].tofile(outfile)
+	os.rename(tmp, index_path)
+
+## The index saved in 'index_path' if it was written for the current contents of 'path', otherwise None
+def read_index(path, index_path):
+	with open(index_path, "rb") as infile:
+		header = json.loads(infile.readline().decode("utf-8"))
+		if header.get("format") != FORMAT or header.get("version") != VERSION or header.get("itemsize") != array("l").itemsize \
+		or header.get("byteorder") != sys.byteorder or tuple(header.get("fingerprint", ())) != fingerprint(path):
+			return None
+		index = {}
+		for name, length in header["sections"]:
+			if name in BLOBS:
+				index[name] = infile.read(length)
+				if len(index[name]) != length:
+					return None
+			else:
+				index[name] = array("l")
+				index[name].fromfile(infile, length)
+	index["fingerprint"] = fingerprint(path)
+	return index
+
+## The saved index for 'path' if it is still current, otherwise a newly built (and saved) index
+def load_index(path, index_path=None, rebuild=False):
+	if index_path is None:
+		index_path = path + ".gffidx"
+	if not rebuild and os.path.exists(index_path):
+		try:
+			index = read_index(path, index_path)
+			if index is not None:
+				return index
+		except Exception:											## Unreadable index (or an older format): rebuild it
+			pass
+	index = build_index(path)
+	try:
+		save_index(index, index_path)
+	except (IOError, OSError):										## Read-only directory: use the index without saving it
+		pass
+	return index
+
+
+#################################################
+###              Query the index              ###
+#################################################
+
+## Sorted keys of one table read in place from its blob, searched by bisection
+class SortedKeys(object):
+
+	def __init__(self, blob, offsets):
+		self.blob = blob
+		self.offsets = offsets
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def __getitem__(self, position):
+		return self.blob[self.offsets[position]:self.offsets[position + 1] - 1]
+
+	## Position of 'key', or None
+	def find(self, key):
+		position = bisect.bisect_left(self, key)
+		if position < len(self) and self[position] == key:
+			return position
+		return None
+
+class GFFIndex(object):
+
+	def __init__(self, path, index_path=None, rebuild=False):
+		self.index = load_index(path, index_path, rebuild)
+		self.rows = self.index["rows"]
+		self.keys = dict((name, SortedKeys(self.index[name + "_keys"], self.index[name + "_offsets"])) for name in ("id", "parent", "seqid"))
+		self._file = open(path, "rb")
+		if os.path.getsize(path) > 0:
+			self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		else:
+			self._data = b""
+
+	## Rows of 'key' in the 'id' or 'parent' table
+	def _rows(self, table, key):
+		position = self.keys[table].find(_to_bytes(key))
+		if position is None:
+			return []
+		found = self.index[table + "_rows"][position]
+		if found >= 0:
+			return [found]
+		ends = self.index["group_ends"]
+		group = -found - 1
+		return list(self.index["group_rows"][ends[group - 1] if group else 0:ends[group]])
+
+	## GFF line (bytes, without the line ending) of a row
+	def line(self, row):
+		start = self.rows[row]
+		end = self._data.find(b"\n", start)
+		if end < 0:
+			end = len(self._data)
+		return self._data[start:end].rstrip(b"\r")
+
+	## GFF columns (bytes) of a row
+	def fields(self, row):
+		return self.line(row).split(b"\t")
+
+	def _select(self, rows, kind):
+		features = [self.fields(row) for row in sorted(rows)]
+		if kind is None:
+			return features
+		kind = _to_bytes(kind)
+		return [fields for fields in features if fields[2] == kind]
+
+	## Features whose ID is 'feature'
+	def by_id(self, feature, kind=None):
+		return self._select(self._rows("id", feature), kind)
+
+	## Features whose Parent (one of them, for features with several) is 'parent'
+	def children(self, parent, kind=None):
+		return self._select(self._rows("parent", parent), kind)
+
+	## Rows of the features on 'seqid' overlapping start-end (1-based, inclusive)
+	def overlapping_rows(self, seqid, start, end):
+		found = self.keys["seqid"].find(_to_bytes(seqid))
+		if found is None:
+			return []
+		first = self.index["seqid_ends"][found - 1] if found else 0
+		starts, reach, ends, rows = [self.index[name] for name in ("starts", "reach", "ends", "interval_rows")]
+		position = bisect.bisect_right(starts, end, first, self.index["seqid_ends"][found]) - 1
+		hits = []
+		while position >= first and reach[position] >= start:		## Running maximum of ends bounds the backward scan
+			if ends[position] >= start:
+				hits.append(rows[position])
+			position -= 1
+		return hits
+
+	def overlapping(self, seqid, start, end, kind=None):
+		return self._select(self.overlapping_rows(seqid, start, end), kind)
+
+	def __len__(self):
+		return len(self.rows)
+
+	def close(self):
+		if not isinstance(self._data, bytes):
+			self._data.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-i", action = "store", type = "string", dest = "gff", help = "input GFF3 file")
+	parser.add_option("--id", action = "store", type = "string", dest = "feature", help = "feature ID to look up")
+	parser.add_option("--parent", action = "store", type = "string", dest = "parent", help = "Parent ID whose features to look up")
+	parser.add_option("--region", action = "store", type = "string", dest = "region", help = "genomic interval (seqid:start-end)")
+	parser.add_option("--type", action = "store", type = "string", dest = "kind", help = "only report features of this type")
+	parser.add_option("--rebuild", action = "store_true", dest = "rebuild", help = "rebuild the index even if it is current", default = False)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.gff is None:
+		sys.stderr.write("\n***Error: specify the input GFF3 file!***\n\n")
+		sys.exit(1)
+## When all input is present
+	with GFFIndex(options.gff, rebuild=options.rebuild) as index:
+		if options.feature is not None:
+			features = index.by_id(options.feature, options.kind)
+		elif options.parent is not None:
+			features = index.children(options.parent, options.kind)
+		elif options.region is not None:
+			seqid, interval = options.region.rsplit(":", 1)
+			start, end = interval.replace(",", "").split("-")
+			features = index.overlapping(seqid, int(start), int(end), options.kind)
+		else:
+			print(str(len(index))+" features indexed")
+			return
+		output = getattr(sys.stdout, "buffer", sys.stdout)
+		for fields in features:
+			output.write(b"\t".join(fields) + b"\n")
+
+if __name__ == '__main__':
+	main()
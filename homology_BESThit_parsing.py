@@ -2,8 +2,11 @@
 
 #print __name__
 
+from __future__ import print_function
 import optparse
-import os
+from rbh_engine import Interner, formatter_lines, top_subject_lines, best_hits, reciprocal_best_hits
+from compressed_io import open_input, open_output
+import instrument
 
 usage_line = """
 homology_BESThit_parsing.py
@@ -21,10 +24,16 @@ blast archives outputted by the 'homology_blasting.py' script and desired names
 reference blast archive (reference = subject, target = query) in order for the one-way results to be \
 correct. Outputs are tables with target ID in column 1 and reference ID in column 2. These results can \
 be fed into the 'make_annotation_dictionary.py' script and subsequently used for annotating both \
-contigs (fasta) and count tables.
+contigs (fasta) and count tables. Blast archives are converted with blast_formatter and streamed straight \
+into the parser (no temporary files are written, so several runs can share a directory). Alternatively, the \
+'--tabular' flag accepts tabular blast output (subject ID, query ID, e-value columns; i.e., outfmt \
+'6 sseqid qseqid evalue') in place of the two archives (the first row of each query is taken as its best hit; \
+tables in another order can be reduced first with 'best_hits.py -q 2 -s 1'); it can be compressed (gzip, bgzip, bzip2, xz or zstd), and \
+the outputs are compressed when their names end in '.gz', '.bgz', '.bz2', '.xz' or '.zst'. The time, hits and memory of each step are written to STDERR \
+with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a cProfile dump).
 
 python homology_hit_parsing.py -o <oneway_blast_results> -r <reciprocal_blast_results> --oneway <oneway_output> \
---reciprocal <reciprocal_best_blast_output>"""
+--reciprocal <reciprocal_best_blast_output> [--tabular --verbose --metrics <metrics.json> --profile <profile>]"""
 
 
 #################################################
@@ -38,8 +47,11 @@ parser.add_option("-o", action = "store", type = "string", dest = "oneway", help
 parser.add_option("-r", action = "store", type = "string", dest = "reciprocal", help = "reciprocal blast results")
 parser.add_option("--oneway", action = "store", type = "string", dest = "oneout", help = "one-way blast output")
 parser.add_option("--reciprocal", action = "store", type = "string", dest = "recout", help = "reciprocal blast output")
+parser.add_option("--tabular", action = "store_true", dest = "tabular", help = "blast results are tabular (sseqid qseqid evalue) instead of archives", default = False)
+instrument.add_options(parser)
 
 options, args = parser.parse_args()
+metrics = instrument.Instrument("homology_BESThit_parsing.py")
 
 
 #################################################
@@ -47,45 +59,49 @@ options, args = parser.parse_args()
 #################################################
 
 ## convert each blast archive to a standard tab-delimited subject ID/query ID output for parsing
-## command: blast_formatter -outfmt "6 sseqid qseqid" -archive <blast_archive> -out <output.tsv>
-
-def convert():
-	print "\n***Converting one-way target to reference blast archive***\n"
-	os.system("""blast_formatter -max_target_seqs 1 -outfmt "6 sseqid qseqid evalue" -archive """+options.oneway+""" -out one-way_best_hits.tsv""") 
-	print "\n***Converting reciprocal reference to target blast archive***\n"
-	os.system("""blast_formatter -max_target_seqs 1 -outfmt "6 sseqid qseqid evalue" -archive """+options.reciprocal+""" -out reciprocal_best_hits.tsv""") 
+## command: blast_formatter -max_target_seqs 1 -outfmt "6 sseqid qseqid evalue" -archive <blast_archive>
+## (output is read through a pipe; tabular input, which can be compressed, is read directly and reduced to the top subject per query in the same way)
+
+def convert(results):
+	if options.tabular:
+		with open_input(results, text=True) as lines:				## closed once the hits are read
+			for line in top_subject_lines(lines, query_col=1, subject_col=0):
+				yield line
+	else:
+		for line in top_subject_lines(formatter_lines(results), query_col=1, subject_col=0):
+			yield line
 
 
 #################################################
 ###             Parse one-way hits 		      ###
 #################################################
 
-## create dictionary with column 1 as key and column 2 as value for one-way blast results
-oneway_dict = {}
+## reference and target IDs are interned to integer codes shared by both directions
+references = Interner()
+targets = Interner()
+
+## best hit array with reference code as index and target code as value for one-way blast results
 def oneway():
-	print "\n***Parsing one-way target to reference blast results***\n"
-	for foo in open("one-way_best_hits.tsv").read().splitlines():
-		bar = foo.split()
-		subjectID = bar[0]
-		queryID = bar[1]
-		if subjectID not in oneway_dict.keys():
-			oneway_dict[subjectID] = queryID
+	print("\n***Parsing one-way target to reference blast results***\n")
+	with metrics.stage("one-way hits", inputs=[options.oneway]) as stage:
+		return best_hits(stage.counted(convert(options.oneway)), references, targets)
 			
 
 #################################################
 ###            Parse reciprocal hits 	      ###
 #################################################
 
-## create dictionary with column 1 as key and column 2 as value for reciprocal blast results
-reciprocal_dict = {}
+## best hit array with target code as index and reference code as value for reciprocal blast results
+## the parsed rows are also copied to the one-way best blast output file as they stream past
 def reciprocal():
-	print "\n***Parsing reciprocal reference to target blast results***\n"
-	for foo in open("reciprocal_best_hits.tsv").read().splitlines():
-		bar = foo.split()
-		subjectID = bar[0]
-		queryID = bar[1]
-		if subjectID not in reciprocal_dict.keys():
-			reciprocal_dict[subjectID] = queryID
+	print("\n***Parsing reciprocal reference to target blast results***\n")
+	with metrics.stage("reciprocal hits", inputs=[options.reciprocal], outputs=[options.oneout]) as stage:
+		with open_output(options.oneout, text=True) as outfile:
+			def copy(lines):
+				for line in lines:
+					outfile.write(line)
+					yield line
+			return best_hits(stage.counted(copy(convert(options.reciprocal))), targets, references)
 			
 			
 #################################################
@@ -93,23 +109,13 @@ def reciprocal():
 #################################################
 
 ## check to see whether one-way best blast hit is reciprocally the best blast hit
-rbh = {}
-def rbh_analysis():
-	print "\n***Performing reciprocal best blast analysis***\n"
-	for key1 in oneway_dict.keys():
-		value1 = oneway_dict[key1]
-		if value1 in reciprocal_dict.keys():
-			if key1 == reciprocal_dict[value1]:
-				rbh[value1] = key1
-
-## output file with target ID (fasta header) as column 1 and reference ID (fasta header) as column 2		
-	outfile = open(options.recout, "w")
-	for key in rbh.keys():
-		line = key + '\t' + rbh[key] + '\n'
-		outfile.write(line)
-	outfile.close()
-## also copy working one-way best blast (target blasted against reference) to desired output file name
-	os.system("cp reciprocal_best_hits.tsv "+options.oneout)
+## output file with target ID (fasta header) as column 1 and reference ID (fasta header) as column 2
+def rbh_analysis(oneway_best, reciprocal_best):
+	print("\n***Performing reciprocal best blast analysis***\n")
+	with metrics.stage("reciprocal best hits", outputs=[options.recout]) as stage:
+		with open_output(options.recout, text=True) as outfile:
+			for reference, target in stage.counted(reciprocal_best_hits(oneway_best, reciprocal_best)):
+				outfile.write(targets.names[target] + "\t" + references.names[reference] + "\n")
 
 
 #################################################
@@ -119,18 +125,18 @@ def rbh_analysis():
 def main():
 ## Check for missing user input
 	if options.oneway is None:
-		print "\n***Error: specify the one-way (target to reference) blast archive!***\n"
+		print("\n***Error: specify the one-way (target to reference) blast archive!***\n")
 	elif options.reciprocal is None:
-		print "\n***Error: specify the reciprocal (reference to target) blast archive!***\n"
+		print("\n***Error: specify the reciprocal (reference to target) blast archive!***\n")
 	elif options.oneout is None:
-		print "\n***Error: specify a file name for the one-way best-blast results!***\n"
+		print("\n***Error: specify a file name for the one-way best-blast results!***\n")
 	elif options.recout is None:
-		print "\n***Error: specify a file name for the reciprocal best-blast results!***\n"
+		print("\n***Error: specify a file name for the reciprocal best-blast results!***\n")
 ## When all input is present
 	else:
-		convert()
-		oneway()
-		reciprocal()
-		rbh_analysis()
+		oneway_best = oneway()
+		reciprocal_best = reciprocal()
+		rbh_analysis(oneway_best, reciprocal_best)
 		
-main()
+if __name__ == '__main__':
+	instrument.run(main, metrics, options)
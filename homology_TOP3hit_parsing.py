@@ -1,64 +1,145 @@
-id_dict = {}
-
-for row in top3blast
-	if row[0] not in id_dict.keys()
-		id_dict[row[0]] = 1
-
-## Do for one-way blast
-## Assuming blast hits are ordered from best to worst e-value
-for key in id_dict()
-	list = []
-	for row in top3blast
-		if row[0] = key
-			list.append entire.row
-	for rows from 0 to len(list)
-		if len(list) == 1
-			first = row[0]
-			print row[0] to first_hits.tsv
-		elif len(list) == 2
-			first = row[0]
-			print row[0] to first_hits.tsv
-			second = row[1]
-			print row[1] to second_hits.tsv
-		else
-			first = row[0]
-			print row[0] to first_hits.tsv
-			second = row[1]
-			print row[1] to second_hits.tsv
-			third = row[2]
-			print row[2] to third_hits.tsv
-
-## Do for reciprocal blast
-## Assuming blast hits are ordered from best to worst e-value
-for key in id_dict()
-	list = []
-	for row in top3blast
-		if row[0] = key
-			list.append entire.row
-	for rows from 0 to len(list)
-		if len(list) == 1
-			first = row[0]
-			print row[0] to first_hits.tsv
-		elif len(list) == 2
-			first = row[0]
-			print row[0] to first_hits.tsv
-			second = row[1]
-			print row[1] to second_hits.tsv
-		else
-			first = row[0]
-			print row[0] to first_hits.tsv
-			second = row[1]
-			print row[1] to second_hits.tsv
-			third = row[2]
-			print row[2] to third_hits.tsv
-			
-## reciprocal hits analysis
-one-way		reciprocal
-first_hits	second_hits
-second_hits	first_hits
-first_hits	third_hits
-third_hits	first_hits
-second_hits	second_hits
-second_hits	third_hits
-third_hits	second_hits
-third_hits	third_hits
\ No newline at end of file
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+from rbh_engine import Interner, formatter_lines, top_hits, reciprocal_ranks
+from compressed_io import open_input
+import instrument
+
+usage_line = """
+homology_TOP3hit_parsing.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script that checks for reciprocal hits among the top blast hits (not only the best hits) of homologous loci. \
+The top N (default 3) distinct subjects of every query are kept from the one-way (target to reference) and \
+reciprocal (reference to target) blast results, and every combination of one-way and reciprocal rank is \
+evaluated (first/first, first/second, second/first, ... up to N/N; first/first are the reciprocal best hits \
+reported by 'homology_BESThit_parsing.py'). Inputs are the two blast archives outputted by the \
+'homology_blasting.py' script, which are streamed through blast_formatter, or with the '--tabular' flag tabular \
+blast output with subject ID and query ID columns (i.e., outfmt '6 sseqid qseqid evalue'; it can be compressed \
+with gzip, bgzip, bzip2, xz or zstd). Hits must be ordered \
+from best to worst for each query, as blast writes them (other tables can be ranked and reduced first with \
+'best_hits.py -q 2 -s 1 -n <top_hits>'). Each table is read once, so the run time grows linearly \
+with the number of hits. One table is written per rank pair, named \
+<prefix>_oneway<rank>_reciprocal<rank>.tsv, with target ID in column 1 and reference ID in column 2. The time, hits \
+and memory of each step are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json \
+and a cProfile dump).
+
+python homology_TOP3hit_parsing.py -o <oneway_blast_results> -r <reciprocal_blast_results> --prefix <output_prefix> \
+[-n <top_hits> --tabular --verbose --metrics <metrics.json> --profile <profile>]"""
+
+
+#################################################
+###           Parse command options           ###
+#################################################
+
+usage = usage_line
+
+parser = optparse.OptionParser(usage=usage)
+parser.add_option("-o", action = "store", type = "string", dest = "oneway", help = "one-way blast results (target to reference)")
+parser.add_option("-r", action = "store", type = "string", dest = "reciprocal", help = "reciprocal blast results")
+parser.add_option("--prefix", action = "store", type = "string", dest = "prefix", help = "prefix of the rank pair output tables")
+parser.add_option("-n", action = "store", type = "int", dest = "top", help = "number of top hits per query to compare [3]", default = 3)
+parser.add_option("--tabular", action = "store_true", dest = "tabular", help = "blast results are tabular (sseqid qseqid evalue) instead of archives", default = False)
+instrument.add_options(parser)
+
+options, args = parser.parse_args()
+metrics = instrument.Instrument("homology_TOP3hit_parsing.py")
+
+
+#################################################
+###            Convert blast archive          ###
+#################################################
+
+## convert each blast archive to a standard tab-delimited subject ID/query ID output for parsing
+## command: blast_formatter -max_target_seqs <N> -outfmt "6 sseqid qseqid evalue" -archive <blast_archive>
+## (output is read through a pipe; tabular input, which can be compressed, is read directly)
+
+def convert(results):
+	if options.tabular:
+		with open_input(results, text=True) as lines:				## closed once the hits are read
+			for line in lines:
+				yield line
+	else:
+		for line in formatter_lines(results, max_target_seqs=options.top):
+			yield line
+
+
+#################################################
+###         Parse one-way and reciprocal      ###
+#################################################
+
+## reference and target IDs are interned to integer codes shared by both directions
+references = Interner()
+targets = Interner()
+
+## top hit buffers with target code as key and reference codes as values for one-way blast results
+def oneway():
+	print("\n***Parsing one-way target to reference blast results***\n")
+	with metrics.stage("one-way hits", inputs=[options.oneway]) as stage:
+		return top_hits(stage.counted(convert(options.oneway)), targets, references, options.top, key_col=1, value_col=0)
+
+## top hit buffers with reference code as key and target codes as values for reciprocal blast results
+def reciprocal():
+	print("\n***Parsing reciprocal reference to target blast results***\n")
+	with metrics.stage("reciprocal hits", inputs=[options.reciprocal]) as stage:
+		return top_hits(stage.counted(convert(options.reciprocal)), references, targets, options.top, key_col=1, value_col=0)
+
+
+#################################################
+###        Check for reciprocal top hits      ###
+#################################################
+
+## join the two sets of top hits and write one table per (one-way rank, reciprocal rank) pair
+## output files with target ID (fasta header) as column 1 and reference ID (fasta header) as column 2
+def rank_analysis(oneway_top, reciprocal_top):
+	print("\n***Performing reciprocal top "+str(options.top)+" blast analysis***\n")
+	outfiles = []
+	counts = []
+	for oneway_rank in range(options.top):
+		for reciprocal_rank in range(options.top):
+			outfiles.append(open(options.prefix+"_oneway"+str(oneway_rank + 1)+"_reciprocal"+str(reciprocal_rank + 1)+".tsv", "w"))
+			counts.append(0)
+	with metrics.stage("reciprocal top hits", outputs=[outfile.name for outfile in outfiles]) as stage:
+		try:
+			for target, reference, oneway_rank, reciprocal_rank in reciprocal_ranks(oneway_top, reciprocal_top, options.top):
+				index = oneway_rank * options.top + reciprocal_rank
+				outfiles[index].write(targets.names[target] + "\t" + references.names[reference] + "\n")
+				counts[index] += 1
+		finally:
+			for outfile in outfiles:
+				outfile.close()
+		stage.rows += sum(counts)
+	print("One-way rank\tReciprocal rank\tHits")
+	for index, count in enumerate(counts):
+		print(str(index // options.top + 1)+"\t"+str(index % options.top + 1)+"\t"+str(count))
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+## Check for missing user input
+	if options.oneway is None:
+		print("\n***Error: specify the one-way (target to reference) blast results!***\n")
+	elif options.reciprocal is None:
+		print("\n***Error: specify the reciprocal (reference to target) blast results!***\n")
+	elif options.prefix is None:
+		print("\n***Error: specify a prefix for the rank pair output tables!***\n")
+	elif options.top < 1:
+		print("\n***Error: the number of top hits must be at least 1!***\n")
+## When all input is present
+	else:
+		oneway_top = oneway()
+		reciprocal_top = reciprocal()
+		rank_analysis(oneway_top, reciprocal_top)
+
+if __name__ == '__main__':
+	instrument.run(main, metrics, options)
@@ -2,8 +2,11 @@
 
 #print __name__
 
+from __future__ import print_function
 import optparse
-import os
+from blast_cache import HitCache, cached_search, blast_runner
+from blastdb_registry import ensure_blastdb, resolve_blastdb
+import instrument
 
 usage_line = """
 homology_blast.py
@@ -19,10 +22,19 @@ reference and a target genome for the purposes of annotation. Script takes both
 will only keep hits with an e-value below that specified by the user. A '--run' option is also available for \
 circumstances where multiple blasts may be run, so as to not unnecessarily repeat blast database creation. \
 In this circumstance, the user passes the numbers 1 (=blast database creation) or 2 (=reciprocal blast) for \
-the '--run' option (e.g., '--run 12')
+the '--run' option (e.g., '--run 12'). Blast databases are kept in a shared registry (see 'blastdb_registry.py') \
+and are only built when no database exists for the same fasta contents and makeblastdb options. With '--workers N' (N > 1) each query fasta is split into length-balanced \
+shards that are searched by N blast processes at once (each using '--threads' threads) and the per-shard results \
+are merged back into a single file. Blast archives cannot be merged, so sharded runs write tabular output \
+('--outfmt', default '6 sseqid qseqid evalue', as read by 'homology_BESThit_parsing.py --tabular'). With \
+'--cache <directory>' hits are kept in a persistent per-sequence cache (see 'blast_cache.py') and only query \
+sequences that were not searched before with the same database and settings are sent to blast (also tabular output). \
+The time and memory of each database build and search (including the blast processes) are written to STDERR with \
+'--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a cProfile dump).
 
 python homology_blast.py -r <reference_fasta> -t <target_fasta> --reference <reference_name> \
---target <target_name> -b <blast_type> -e <e-value> [-r <12>]"""
+--target <target_name> -b <blast_type> -e <e-value> [-r <12> --workers <N> --shards <N> --outfmt <format> --cache <directory> \
+--verbose --metrics <metrics.json> --profile <profile>]"""
 
 
 #################################################
@@ -40,8 +52,14 @@ parser.add_option("--reference", action = "store", type = "string", dest = "refg
 parser.add_option("--target", action = "store", type = "string", dest = "targen", help = "target name or ID")
 parser.add_option("--run", action = "store", type = "string", dest = "run", help = "processes to run (1-2)", default = "12")
 parser.add_option("--threads", action = "store", type = "string", dest = "threads", help = "the number of threads blast will use", default = "2")
+parser.add_option("--workers", action = "store", type = "int", dest = "workers", help = "number of blast processes to run on query shards", default = 1)
+parser.add_option("--shards", action = "store", type = "int", dest = "shards", help = "number of query shards (default 4 per worker)")
+parser.add_option("--outfmt", action = "store", type = "string", dest = "outfmt", help = "blast output format (default 11, or tabular '6 sseqid qseqid evalue' with --workers/--cache)")
+parser.add_option("--cache", action = "store", type = "string", dest = "cache", help = "directory of the persistent blast hit cache")
+instrument.add_options(parser)
 
 options, args = parser.parse_args()
+metrics = instrument.Instrument("homology_blast.py")
 
 
 #################################################
@@ -49,12 +67,15 @@ options, args = parser.parse_args()
 #################################################
 
 ## command: makeblastdb -dbtype nucl -parse_seqids -in <input.fasta>
+## (run through the shared database registry, which reuses a database already built from the same fasta and options)
 
 def makedb():
-	print "\n***Creating a blast database for "+options.refgen+"***"
-	os.system("makeblastdb -dbtype nucl -parse_seqids -in "+options.reference)
-	print "\n***Creating a blast database for "+options.targen+"***"
-	os.system("makeblastdb -dbtype nucl -parse_seqids -in "+options.target)
+	print("\n***Creating a blast database for "+options.refgen+"***")
+	with metrics.stage("makeblastdb "+options.refgen, inputs=[options.reference]):
+		print(ensure_blastdb(options.reference, "nucl", ["-parse_seqids"]))
+	print("\n***Creating a blast database for "+options.targen+"***")
+	with metrics.stage("makeblastdb "+options.targen, inputs=[options.target]):
+		print(ensure_blastdb(options.target, "nucl", ["-parse_seqids"]))
 
 
 #################################################
@@ -64,14 +85,35 @@ def makedb():
 ## command: <blast_type> -max_target_seqs 1 -outfmt 11 -evalue <evalue> -db <reference/target.fasta> \
 ## -query <reference/target.fasta> -out <db-name_TO_qry-name.out.asn>
 ## all blast hits are outputted to blast archive (option 11) format so they can be converted to any format later ##
+## sharded (--workers) and cached (--cache) runs write tabular output instead, since archives cannot be merged ##
+
+def outfmt():
+	if options.outfmt is not None:
+		return options.outfmt
+	if options.workers > 1 or options.cache is not None:
+		return "6 sseqid qseqid evalue"
+	return "11"
+
+## (cached searches count the query sequences as rows)
+def search(db, query, output):
+	command = [options.blast, "-num_threads", options.threads, "-outfmt", outfmt(), "-max_target_seqs", "5", "-evalue", options.evalue, "-db", db]
+	runner = blast_runner(options.workers, options.shards)
+	with metrics.stage("blast "+output, inputs=[query], outputs=[output]) as stage:
+		if options.cache is None:
+			runner(command, query, output)
+		else:														## Only sequences missing from the cache are blasted
+			cache = HitCache(options.cache)
+			hits, misses = cached_search(command, db, outfmt(), query, output, cache, runner)
+			cache.close()
+			stage.rows += hits + misses
+			print("Cache hits:\t"+str(hits)+"\nCache misses:\t"+str(misses))
 
 def blast():
-	print "\n***Blasting "+options.targen+" query against "+options.refgen+" database***"
-	os.system(options.blast+" -num_threads "+options.threads+" -outfmt 11 -max_target_seqs 5 -evalue "+options.evalue+" -db "+options.reference+ \
-	" -query "+options.target+" -out db-"+options.refgen+"_TO_qry-"+options.targen+"_e"+options.evalue+".out.asn")
-	print "\n***Blasting "+options.refgen+" query against "+options.targen+" database***\n"
-	os.system(options.blast+" -num_threads "+options.threads+" -outfmt 11 -max_target_seqs 5 -evalue "+options.evalue+" -db "+options.target+ \
-	" -query "+options.reference+" -out db-"+options.targen+"_TO_qry-"+options.refgen+"_e"+options.evalue+".out.asn")
+	suffix = ".out.asn" if outfmt().split()[0] == "11" else ".out.tsv"
+	print("\n***Blasting "+options.targen+" query against "+options.refgen+" database***")
+	search(resolve_blastdb(options.reference, "nucl", ["-parse_seqids"]), options.target, "db-"+options.refgen+"_TO_qry-"+options.targen+"_e"+options.evalue+suffix)
+	print("\n***Blasting "+options.refgen+" query against "+options.targen+" database***\n")
+	search(resolve_blastdb(options.target, "nucl", ["-parse_seqids"]), options.reference, "db-"+options.targen+"_TO_qry-"+options.refgen+"_e"+options.evalue+suffix)
 
 #################################################
 ###           		Main function             ###
@@ -80,17 +122,19 @@ def blast():
 def main():
 ## Check for missing user input
 	if options.reference is None:
-		print "\n***Error: specify reference fasta file!***\n"
+		print("\n***Error: specify reference fasta file!***\n")
 	elif options.target is None:
-		print "\n***Error: specify target fasta file!***\n"
+		print("\n***Error: specify target fasta file!***\n")
 	elif options.refgen is None:
-		print "\n***Error: specify a name or ID for your reference genome!***\n"
+		print("\n***Error: specify a name or ID for your reference genome!***\n")
 	elif options.targen is None:
-		print "\n***Error: specify a name or ID for your target genome!***\n"
+		print("\n***Error: specify a name or ID for your target genome!***\n")
 	elif options.blast is None:
-		print "\n***Error: specify the type of blast you would like to use!***\n"
+		print("\n***Error: specify the type of blast you would like to use!***\n")
 	elif options.evalue is None:
-		print "\n***Error: specify the threshold e-value a blast hit must be less than!***\n"
+		print("\n***Error: specify the threshold e-value a blast hit must be less than!***\n")
+	elif (options.workers > 1 or options.cache is not None) and outfmt().split()[0] != "6":
+		print("\n***Error: sharded (--workers) or cached (--cache) blast needs a tabular (6) output format!***\n")
 ## When all input is present, run user-specified processes (12 by default)
 	else:
 		if "1" in options.run:
@@ -98,4 +142,4 @@ def main():
 		if "2" in options.run:
 			blast()
 		
-main()
+instrument.run(main, metrics, options)
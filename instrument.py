@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import json
+import os
+import resource
+import sys
+import time
+
+## Instrumentation shared by the entry points ('--verbose', '--metrics' and '--profile' options)
+## A run is divided into named stages. For each stage the wall time, the number of rows (records, lines or hits,
+## as counted by the stage), rows per second, the bytes of its input files (size when the stage starts) and output
+## files (size when it ends) and the peak resident memory (RSS) of the process and of its finished child processes
+## so far are recorded. With '--verbose' or '--metrics' a summary table is written to STDERR at the end of the run,
+## and with '--metrics' the stages are also written to a json file. With '--profile', the run is profiled with cProfile and the statistics are dumped
+## to a file (read them with 'python -m pstats <file>'). Progress is reported on STDERR at most once per interval
+## (default 10 s), so counting rows costs next to nothing.
+
+CHECK_ROWS = 4096
+
+
+#################################################
+###              Memory and files             ###
+#################################################
+
+## Peak RSS of this process in kB (VmHWM on Linux, ru_maxrss elsewhere)
+def peak_rss():
+	if os.path.exists("/proc/self/status"):
+		with open("/proc/self/status") as status:
+			for line in status:
+				if line.startswith("VmHWM:"):
+					return int(line.split()[1])
+	usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return usage // 1024 if sys.platform == "darwin" else usage					## bytes on macOS, kB on Linux
+
+## Largest peak RSS of the finished child processes (e.g., worker pools) in kB
+def children_peak_rss():
+	usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+	return usage // 1024 if sys.platform == "darwin" else usage
+
+def file_bytes(paths):
+	total = 0
+	for path in paths:
+		if path is not None and os.path.isfile(path):
+			total += os.path.getsize(path)
+	return total
+
+
+#################################################
+###                  Stages                   ###
+#################################################
+
+## One stage of a run; 'advance' and 'counted' count rows and report progress at most once per interval
+class Stage(object):
+
+	def __init__(self, name, inputs, outputs, log, interval):
+		self.name = name
+		self.inputs = [path for path in inputs if path is not None]
+		self.outputs = [path for path in outputs if path is not None]
+		self.log = log
+		self.interval = interval
+		self.rows = 0
+		self.start = time.time()
+		self.next_report = self.start + interval
+		self.next_check = CHECK_ROWS
+		self.bytes_read = file_bytes(self.inputs)
+		self.seconds = None
+
+	## The clock is only read every CHECK_ROWS rows
+	def advance(self, rows=1):
+		self.rows += rows
+		if self.rows >= self.next_check:
+			self.next_check = self.rows + CHECK_ROWS
+			if self.interval and time.time() >= self.next_report:
+				self.progress()
+
+	## Iterate over 'items', counting each as a row (in batches, so the loop is barely slowed)
+	def counted(self, items):
+		batch = 0
+		for item in items:
+			yield item
+			batch += 1
+			if batch == CHECK_ROWS:
+				self.advance(batch)
+				batch = 0
+		self.advance(batch)
+
+	def progress(self):
+		now = time.time()
+		self.next_report = now + self.interval
+		elapsed = now - self.start
+		self.log.write("["+self.name+"] "+str(self.rows)+" rows in "+"%.0f" % elapsed+" s ("+ \
+		"%.0f" % (self.rows / elapsed if elapsed > 0 else 0)+" rows/s)\n")
+		self.log.flush()
+
+	def finish(self):
+		self.seconds = time.time() - self.start
+		return {"stage": self.name, "seconds": round(self.seconds, 4), "rows": self.rows, \
+		"rows_per_second": round(self.rows / self.seconds, 1) if self.seconds > 0 else None, \
+		"bytes_read": self.bytes_read, "bytes_written": file_bytes(self.outputs), "peak_rss_kb": peak_rss(), \
+		"children_peak_rss_kb": children_peak_rss()}
+
+class _StageContext(object):
+
+	def __init__(self, instrument, stage):
+		self.instrument = instrument
+		self.stage = stage
+
+	def __enter__(self):
+		return self.stage
+
+	def __exit__(self, kind, value, traceback):
+		record = self.stage.finish()
+		if kind is not None:
+			record["failed"] = True
+		self.instrument.stages.append(record)
+		return False
+
+
+#################################################
+###                Instrumented run           ###
+#################################################
+
+## Stages of one run of a script; use 'with instrument.stage(name, inputs, outputs) as stage:' around each step
+class Instrument(object):
+
+	def __init__(self, program, log=sys.stderr, interval=10.0):
+		self.program = program
+		self.log = log
+		self.interval = interval
+		self.stages = []
+		self.start = time.time()
+
+	def stage(self, name, inputs=(), outputs=()):
+		return _StageContext(self, Stage(name, inputs, outputs, self.log, self.interval))
+
+	def summary(self):
+		return {"program": self.program, "python": sys.version.split()[0], "seconds": round(time.time() - self.start, 4), \
+		"peak_rss_kb": peak_rss(), "children_peak_rss_kb": children_peak_rss(), "stages": self.stages}
+
+	def report(self):
+		summary = self.summary()
+		self.log.write("\nStage\tSeconds\tRows\tRows/s\tBytes read\tBytes written\tPeak RSS (kB)\n")
+		for stage in self.stages:
+			self.log.write(stage["stage"]+"\t"+"%.2f" % stage["seconds"]+"\t"+str(stage["rows"])+"\t"+ \
+			("%.0f" % stage["rows_per_second"] if stage["rows_per_second"] is not None else "-")+"\t"+ \
+			str(stage["bytes_read"])+"\t"+str(stage["bytes_written"])+"\t"+str(stage["peak_rss_kb"])+"\n")
+		self.log.write("Total\t"+"%.2f" % summary["seconds"]+"\t\t\t\t\t"+str(summary["peak_rss_kb"])+"\n")
+		self.log.flush()
+		return summary
+
+	def write(self, path):
+		with open(path, "w") as outfile:
+			json.dump(self.summary(), outfile, indent=1)
+
+
+#################################################
+###           Command options and runs        ###
+#################################################
+
+## Add '--verbose', '--metrics' and '--profile' to an optparse parser
+def add_options(parser):
+	parser.add_option("--verbose", action = "store_true", dest = "verbose", help = "write the per-stage timing, throughput and memory table to STDERR", default = False)
+	parser.add_option("--metrics", action = "store", type = "string", dest = "metrics", help = "write per-stage timing, throughput and memory as json")
+	parser.add_option("--profile", action = "store", type = "string", dest = "profile", help = "write cProfile statistics of the run to this file")
+
+## Run 'function' (under cProfile with '--profile'), then report the stages (with '--verbose' or '--metrics') and write
+## '--metrics' (also after a failure)
+def run(function, instrument, options):
+	profiler = None
+	if getattr(options, "profile", None) is not None:
+		import cProfile
+		profiler = cProfile.Profile()
+	try:
+		if profiler is not None:
+			return profiler.runcall(function)
+		return function()
+	finally:
+		if profiler is not None:
+			profiler.dump_stats(options.profile)
+		if getattr(options, "verbose", False) or getattr(options, "metrics", None) is not None:
+			instrument.report()
+		if getattr(options, "metrics", None) is not None:
+			instrument.write(options.metrics)
@@ -4,7 +4,10 @@
 
 from __future__ import print_function
 import optparse
-import json
+import sys
+from annotation_merge import parse_label, source_dest, merge_sources
+from annotation_db import write_annotation_db, export_json
+import instrument
 
 usage_line = """
 make_annotation_dictionary.py
@@ -22,12 +25,19 @@ This script is meant to be run before the 'annotate_counts.py' and 'annotate_fas
 which actually annotate count (expression) tables and genome/transcriptome assembly contigs (fasta), respectively. \
 Input is tabular output from a reciprocal best-hit and/or one-way blast between the genome/transcriptome of \
 interest and a high-quality, annotated genome with target contig IDs as column 1 and reference contig \
-IDs as column 2. Multiple input blast files can be designated - up to 3 reciprocal best-hit and 3 one-way
-best-hit (script is annotated to allow addition of more) - and the user must specify the order in which they \
-should be considered (i.e., rank the confidence of homology between blast inputs). Output is a json formatted \
-version of the dictionary that may be named by the user. Errors will be written to STDOUT if user input is missing!
+IDs as column 2. Any number of reciprocal best-hit (rN) and one-way best-hit (bN) blast files can be designated \
+with '--source rN=<file>' or '--source bN=<file>' (repeated once per file; '--r1' to '--r3' and '--b1' to '--b3' \
+remain as shorthands for the first three of each), and the user must specify the order in which they should be considered (i.e., rank \
+the confidence of homology between blast inputs). Inputs are read as streams in that order and each contig keeps the \
+annotation of the first input that has it; the number of lines read and of new contigs contributed by each input \
+are reported. Inputs can be compressed (gzip, bgzip, bzip2, xz or zstd; see 'compressed_io.py'). Output is a binary, memory-mappable \
+version of the dictionary that may be named by the user (see 'annotation_db.py'). Output names ending in '.json' are \
+written in the older json format instead, and a json copy can also be exported alongside the binary dictionary with \
+the '--json' option. The time, rows and memory of each step are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' \
+and '--profile' write them as json and a cProfile dump). Errors will be written to STDOUT if user input is missing!
 
-python make_annotation_dictionary.py --confidence rN,bN [--rN <RBH_output> --bN <one-way_output> --out <dictionary>]"""
+python make_annotation_dictionary.py --confidence rN,bN [--source rN=<RBH_output> --source bN=<one-way_output> --out <dictionary> --json <json_dictionary> \
+--verbose --metrics <metrics.json> --profile <profile>]"""
 
 
 #################################################
@@ -43,134 +53,84 @@ parser.add_option("--r2", action = "store", type = "string", dest = "reciprocal2
 parser.add_option("--b2", action = "store", type = "string", dest = "oneway2", help = "one-way best-blast output")
 parser.add_option("--r3", action = "store", type = "string", dest = "reciprocal3", help = "reciprocal best-blast output")
 parser.add_option("--b3", action = "store", type = "string", dest = "oneway3", help = "one-way best-blast output")
-## Note: To allow for more reciprocal/one-way blast input, copy the above definition(s) and adjust accordingly (e.g., --b3 -> --bN) ##
-parser.add_option("--out", action = "store", type = "string", dest = "output", help = "output dictionary", default = "assembly_dictionary.json")
+parser.add_option("--source", action = "append", type = "string", dest = "sources", help = "blast output labelled rN (reciprocal) or bN (one-way), as LABEL=PATH (repeat for each input)", default = [])
+parser.add_option("--out", action = "store", type = "string", dest = "output", help = "output dictionary", default = "assembly_dictionary.adb")
+parser.add_option("--json", action = "store", type = "string", dest = "json", help = "also export the dictionary in json format")
 parser.add_option("--confidence", action = "store", type = "string", dest = "conf", help = "rank homology confidence of each blast input")
+instrument.add_options(parser)
 
 options, args = parser.parse_args()
 
 ## Establish dictionary
 annotation_dict = {}
+metrics = instrument.Instrument("make_annotation_dictionary.py")
 
 #################################################
-###           	Read RBH output	   	          ###
+###        Read RBH and one-way output        ###
 #################################################
-	
-def r1_in():
-	if options.reciprocal1 is None:									## If no rbh output was specified
-		print("\n\n***Error: specify reciprocal best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
-	else:															## If necessary rbh output was specified
-		total = 0
-		print("\n\n***Parsing reciprocal best-blast output***\n")
-		for foo in open(options.reciprocal1).read().splitlines():	## Open file and split by lines
-			total += 1
-			print(total, end='\r')
-			bar = foo.split()										## Split by tabs
-			denovo = bar[0]											## de novo transcriptome ID
-			ensembl = bar[1]+"_rbh1"								## blast match Ensembl ID
-			if denovo not in annotation_dict.keys():				## If de novo ID not already in keys
-				annotation_dict[denovo] = ensembl					## Put de novo id as key and ensembl id as value
-
-def r2_in():
-	if options.reciprocal2 is None:									## If no rbh output was specified
-		print("\n\n***Error: specify reciprocal best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
-	else:															## If necessary rbh output was specified
-		total = 0
-		print("\n\n***Parsing reciprocal best-blast output***\n")
-		for foo in open(options.reciprocal2).read().splitlines():	## Open file and split by lines
-			total += 1
-			print(total, end='\r')
-			bar = foo.split()										## Split by tabs
-			denovo = bar[0]											## de novo transcriptome ID
-			ensembl = bar[1]+"_rbh2"								## blast match Ensembl ID
-			if denovo not in annotation_dict.keys():				## If de novo ID not already in keys
-				annotation_dict[denovo] = ensembl					## Put de novo id as key and ensembl id as value
-				
-def r3_in():
-	if options.reciprocal3 is None:									## If no rbh output was specified
-		print("\n\n***Error: specify reciprocal best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
-	else:															## If necessary rbh output was specified
-		total = 0
-		print("\n\n***Parsing reciprocal best-blast output***\n")
-		for foo in open(options.reciprocal3).read().splitlines():	## Open file and split by lines
-			total += 1
-			print(total, end='\r')
-			bar = foo.split()										## Split by tabs
-			denovo = bar[0]											## de novo transcriptome ID
-			ensembl = bar[1]+"_rbh3"								## blast match Ensembl ID
-			if denovo not in annotation_dict.keys():				## If de novo ID not already in keys
-				annotation_dict[denovo] = ensembl					## Put de novo id as key and ensembl id as value
-		
-## Note: To allow for more reciprocal blast input, copy the above definition and adjust it accordingly (e.g., r3_in -> rN_in) ##
 
-#################################################
-###         Read one-way blast output         ###
-#################################################
-
-def b1_in():
-	if options.oneway1 is None:										## If no oneway output was specified
-		print("\n\n***Error: specify one-way best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
-	else:															## If necessary rbh output was specified	
-		total = 0
-		print("\n\n***Parsing oneway best-blast output***\n")
-		for foo in open(options.oneway1).read().splitlines():		## Open file and split by lines
-			total += 1
-			print(total, end='\r')
-			bar = foo.split()										## Split by tabs
-			denovo = bar[0]											## de novo transcriptome ID
-			ensembl = bar[1]+"_one1_"+bar[2]
-			if denovo not in annotation_dict.keys():				## If de novo ID not already in keys
-				annotation_dict[denovo] = ensembl					## Put de novo id as key and ensembl id as value
-				
-def b2_in():
-	if options.oneway2 is None:										## If no oneway output was specified
-		print("\n\n***Error: specify one-way best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
-	else:															## If necessary rbh output was specified	
-		total = 0
-		print("\n\n***Parsing oneway best-blast output***\n")
-		for foo in open(options.oneway2).read().splitlines():		## Open file and split by lines
-			total += 1
-			print(total, end='\r')
-			bar = foo.split()										## Split by tabs
-			denovo = bar[0]											## de novo transcriptome ID
-			ensembl = bar[1]+"_one2_"+bar[2]
-			if denovo not in annotation_dict.keys():				## If de novo ID not already in keys
-				annotation_dict[denovo] = ensembl					## Put de novo id as key and ensembl id as value
-				
-def b3_in():
-	if options.oneway3 is None:										## If no oneway output was specified
-		print("\n\n***Error: specify one-way best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
-	else:															## If necessary rbh output was specified	
-		total = 0
-		print("\n\n***Parsing oneway best-blast output***\n")
-		for foo in open(options.oneway3).read().splitlines():		## Open file and split by lines
-			total += 1
-			print(total, end='\r')
-			bar = foo.split()										## Split by tabs
-			denovo = bar[0]											## de novo transcriptome ID
-			ensembl = bar[1]+"_one3_"+bar[2]
-			if denovo not in annotation_dict.keys():				## If de novo ID not already in keys
-				annotation_dict[denovo] = ensembl					## Put de novo id as key and ensembl id as value
-
-## Note: To allow for more one-way blast input, copy the above definition and adjust it accordingly (e.g., r3_in -> rN_in) ##
+## Blast inputs given with '--source LABEL=PATH' and the '--rN'/'--bN' shorthands, as label -> file
+def given_sources():
+	given = {}
+	for source in options.sources:
+		label, separator, path = source.partition("=")
+		label = label.strip()
+		if not separator or not path or parse_label(label) is None:
+			print("\n***Error: '--source "+source+"' is not LABEL=PATH with a label such as r1 or b2!***\n")
+			sys.exit(1)
+		if label in given:
+			print("\n***Error: blast input '"+label+"' is given more than once!***\n")
+			sys.exit(1)
+		given[label] = path
+	for label in ("r1", "b1", "r2", "b2", "r3", "b3"):
+		path = getattr(options, source_dest(label))
+		if path is not None:
+			if label in given:
+				print("\n***Error: blast input '"+label+"' is given more than once!***\n")
+				sys.exit(1)
+			given[label] = path
+	return given
+
+## Blast inputs as (label, file) in the order of '--confidence'; inputs that were not given are reported and left out
+def ranked_sources():
+	given = given_sources()
+	sources = []
+	for label in options.conf.split(","):
+		label = label.strip()
+		if parse_label(label) is None:
+			print("\n***Error: '"+label+"' is not a blast input (use rN for reciprocal and bN for one-way best-blast output)!***\n")
+			sys.exit(1)
+		path = given.get(label)
+		if path is None:												## If the ranked output was not specified
+			kind = "reciprocal" if label.startswith("r") else "one-way"
+			print("\n\n***Error: specify "+kind+" best-blast output!***\n***Error: outputted assembly dictionary is incomplete!***")
+		else:
+			sources.append((label, path))
+	return sources
 
 #################################################
 ###         	  Store dictionary            ###
 #################################################
 
-## Store the created dictionary with both rbh and oneway results into an output file for storage and input into annotation scripts		
+## Store the created dictionary with both rbh and oneway results into an output file for storage and input into annotation scripts
+## (binary format unless a '.json' output name is given; an extra json copy is written on request for compatibility)
 def store_dict():
-	with open(options.output, "wb") as outfile:						
-		json.dump(annotation_dict, outfile)
+	with metrics.stage("store", outputs=[options.output, options.json]) as stage:
+		if options.output.endswith(".json"):
+			export_json(annotation_dict, options.output)
+		else:
+			write_annotation_db(annotation_dict, options.output)
+		if options.json is not None:
+			export_json(annotation_dict, options.json)
+		stage.rows += len(annotation_dict)
 
 def main():
 	if options.conf is None:
 		print("\n***Error: specify the homology confidence ranking for all of your blast input files!***\n")
 	else:
-		order = options.conf.split(",")
-		for x in range(0, len(order)):
-			line = str(order[x])+"_in()"
-			eval(line)
+		print("\n***Parsing best-blast output in order of confidence***\n")
+		merge_sources(ranked_sources(), annotation_dict, instrument=metrics)
+		print("\n"+str(len(annotation_dict))+" annotated contigs")
 		store_dict()
 
-main()
+instrument.run(main, metrics, options)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+from uniprot_species import default_index
+import instrument
+try:
+	from urllib.request import urlopen
+	from urllib.parse import urlencode
+except ImportError:													## Python 2
+	from urllib2 import urlopen
+	from urllib import urlencode
+
+usage_line = """
+ncbi2uniprot.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (and engine used by 'ncbi2uniprot') that renames the header lines of an NCBI protein fasta file so that they \
+are very similar to the standard UniProt fasta headers. Gene symbols and names are looked up on mygene.info in \
+batches (up to 1000 IDs per request, several requests at a time, retried with increasing waits when they fail) and \
+kept in a persistent cache, so proteins that were looked up before are not queried again. The fasta is then \
+rewritten in one pass and written to STDOUT (sequences on one line, as 'ncbi2uniprot' writes them). Values that \
+mygene does not have are written as 'null'. The species codes are looked up offline in the indexed UniProt species \
+list of 'uniprot_species.py' (exact name, or a prefix matching only one species). The mygene URL can be changed with '--url' (e.g. to use a local server). \
+The time, proteins and memory of each step are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' \
+and '--profile' write them as json and a cProfile dump).
+
+python ncbi2uniprot.py -p <raw_proteins.faa> -s <"Genus species"> [--cache <cache.sqlite> --batch <N> \
+--connections <N> --retries <N> --url <mygene_query_url> --scopes <fields> --verbose --metrics <metrics.json> --profile <profile>]"""
+
+MYGENE_URL = "http://mygene.info/v3/query"
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "contigannotator", "mygene.sqlite")
+
+
+#################################################
+###               Species codes               ###
+#################################################
+
+## Mnemonic and numerical taxon codes of 'genspec' (raises KeyError when it names no species or several)
+def species_codes(genspec, index=None):
+	if index is None:
+		index = default_index()
+	mnemonic, kingdom, taxon, name = index.lookup(genspec)
+	return mnemonic, str(taxon)
+
+
+#################################################
+###             Persistent cache              ###
+#################################################
+
+class SymbolCache(object):
+
+	def __init__(self, path):
+		if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+			os.makedirs(os.path.dirname(os.path.abspath(path)))
+		self.db = sqlite3.connect(path, timeout=600)
+		self.db.execute("CREATE TABLE IF NOT EXISTS symbols (query TEXT, scopes TEXT, symbol TEXT, name TEXT, fetched REAL, PRIMARY KEY (query, scopes))")
+		self.db.commit()
+
+	## Cached {ID: (symbol, name)} for the IDs that have been looked up before
+	def get_many(self, ids, scopes):
+		found = {}
+		ids = list(ids)
+		for start in range(0, len(ids), 500):
+			batch = ids[start:start + 500]
+			query = "SELECT query, symbol, name FROM symbols WHERE scopes = ? AND query IN (" + ",".join("?" * len(batch)) + ")"
+			for protein, symbol, name in self.db.execute(query, [scopes] + batch):
+				found[protein] = (symbol, name)
+		return found
+
+	def put_many(self, results, scopes):
+		now = time.time()
+		self.db.executemany("INSERT OR REPLACE INTO symbols (query, scopes, symbol, name, fetched) VALUES (?, ?, ?, ?, ?)", \
+		[(protein, scopes, symbol, name, now) for protein, (symbol, name) in results.items()])
+		self.db.commit()
+
+	def close(self):
+		self.db.close()
+
+
+#################################################
+###           Batched mygene queries          ###
+#################################################
+
+## Default HTTP layer: POST form data and return the decoded json response
+def post_form(url, data, timeout=120):
+	response = urlopen(url, urlencode(data).encode("ascii"), timeout)
+	try:
+		return json.loads(response.read().decode("utf-8"))
+	finally:
+		response.close()
+
+## Field value as 'jq' writes it (with quotes removed, as 'ncbi2uniprot' does); missing values are 'null'
+def jq_value(value):
+	if value is None:
+		return "null"
+	if isinstance(value, bool):
+		return "true" if value else "false"
+	if isinstance(value, (dict, list)):
+		return json.dumps(value).replace('"', "")
+	return ("%s" % value).replace('"', "")
+
+## Look up one batch of IDs, retrying with exponentially increasing waits; returns {ID: (symbol, name)}
+def query_batch(ids, url, scopes, post, retries, wait):
+	data = {"q": ",".join(ids), "scopes": scopes, "fields": "symbol,name", "species": "all"}
+	for attempt in range(retries + 1):
+		try:
+			hits = post(url, data)
+			break
+		except Exception:
+			if attempt == retries:
+				raise
+			time.sleep(wait * 2 ** attempt)
+	results = dict((protein, ("null", "null")) for protein in ids)
+	seen = set()
+	for hit in hits:													## Hits come back in query order; keep the first for each ID
+		protein = hit.get("query")
+		if protein in results and protein not in seen:
+			seen.add(protein)
+			if not hit.get("notfound"):
+				results[protein] = (jq_value(hit.get("symbol")), jq_value(hit.get("name")))
+	return results
+
+## {ID: (symbol, name)} for all 'ids', from the cache where possible and from mygene in concurrent batches otherwise
+def lookup_symbols(ids, cache, url=MYGENE_URL, scopes="refseq,accession", batch=1000, connections=4, retries=5, \
+wait=1.0, post=post_form):
+	results = cache.get_many(ids, scopes)
+	missing = [protein for protein in ids if protein not in results]
+	batches = [missing[start:start + batch] for start in range(0, len(missing), batch)]
+	if batches:
+		pool = ThreadPool(max(1, min(connections, len(batches))))
+		try:
+			for found in pool.imap_unordered(lambda ids: query_batch(ids, url, scopes, post, retries, wait), batches):
+				cache.put_many(found, scopes)							## Saved as they arrive, so an interrupted run keeps its progress
+				results.update(found)
+		finally:
+			pool.close()
+			pool.join()
+	return results, len(ids) - len(missing), len(batches)
+
+
+#################################################
+###            Rewrite fasta headers          ###
+#################################################
+
+## Protein IDs (header up to the first whitespace) of every record, in file order
+def fasta_ids(path):
+	ids = []
+	with open(path, "rb") as infile:
+		for line in infile:
+			if line.startswith(b">"):
+				fields = line[1:].split(None, 1)
+				ids.append(fields[0].decode("utf-8") if fields else "")
+	return ids
+
+## UniProt-style header for a protein ID ('ncbi2uniprot' writes an empty header for IDs not starting with N or X)
+def uniprot_header(protein, symbol, name, genspec, taxon, mnemonic):
+	parts = protein.split(".")
+	accession = parts[0]
+	version = parts[1] if len(parts) > 1 else ""
+	if accession.startswith("N"):
+		evidence = "2"
+	elif accession.startswith("X"):
+		evidence = "3"
+	else:
+		return ""
+	return "ncbi|"+accession+"|"+symbol+"_"+mnemonic+" "+name+" OS="+genspec+" OX="+taxon+" GN="+symbol+" PE="+evidence+" SV="+version
+
+## Stream 'path' to 'output' (binary) with renamed headers and each sequence on one line
+def rewrite_fasta(path, output, symbols, genspec, taxon, mnemonic):
+	header = None
+	sequence = []
+	def flush():
+		output.write(b">" + header.encode("utf-8") + b"\n" + b"".join(sequence) + b"\n")
+	with open(path, "rb") as infile:
+		for line in infile:
+			if line.startswith(b">"):
+				if header is not None:
+					flush()
+				fields = line[1:].split(None, 1)
+				protein = fields[0].decode("utf-8") if fields else ""
+				symbol, name = symbols.get(protein, ("null", "null"))
+				header = uniprot_header(protein, symbol, name, genspec, taxon, mnemonic)
+				sequence = []
+			elif header is not None:
+				sequence.append(line.strip())
+	if header is not None:
+		flush()
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-p", action = "store", type = "string", dest = "proteins", help = "input protein sequences for NCBI genome annotation")
+	parser.add_option("-s", action = "store", type = "string", dest = "genspec", help = "full genus and species")
+	parser.add_option("--cache", action = "store", type = "string", dest = "cache", help = "lookup cache file [~/.cache/contigannotator/mygene.sqlite]", default = DEFAULT_CACHE)
+	parser.add_option("--batch", action = "store", type = "int", dest = "batch", help = "IDs per mygene request [1000]", default = 1000)
+	parser.add_option("--connections", action = "store", type = "int", dest = "connections", help = "concurrent mygene requests [4]", default = 4)
+	parser.add_option("--retries", action = "store", type = "int", dest = "retries", help = "retries of a failed request [5]", default = 5)
+	parser.add_option("--url", action = "store", type = "string", dest = "url", help = "mygene query URL", default = MYGENE_URL)
+	parser.add_option("--scopes", action = "store", type = "string", dest = "scopes", help = "mygene fields searched for the IDs [refseq,accession]", default = "refseq,accession")
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.proteins is None or options.genspec is None:
+		sys.stderr.write("\n***Error: specify the protein sequences and the genus and species!***\n\n")
+		sys.exit(1)
+## When all input is present
+	metrics = instrument.Instrument("ncbi2uniprot.py")
+	def rename():
+		with metrics.stage("species codes"):
+			try:
+				mnemonic, taxon = species_codes(options.genspec)
+			except KeyError as error:
+				sys.stderr.write("\n***Error: "+error.args[0]+"!***\n\n")
+				sys.exit(1)
+		with metrics.stage("read IDs", inputs=[options.proteins]) as stage:
+			ids = fasta_ids(options.proteins)
+			stage.rows += len(ids)
+		with metrics.stage("look up symbols", outputs=[options.cache]) as stage:
+			cache = SymbolCache(options.cache)
+			try:
+				symbols, cached, requests = lookup_symbols(sorted(set(ids)), cache, options.url, options.scopes, options.batch, \
+				options.connections, options.retries)
+			finally:
+				cache.close()
+			stage.rows += len(symbols)
+		sys.stderr.write("Proteins: "+str(len(ids))+"\tcached: "+str(cached)+"\tmygene requests: "+str(requests)+"\n")
+		with metrics.stage("rewrite fasta", inputs=[options.proteins]) as stage:
+			rewrite_fasta(options.proteins, getattr(sys.stdout, "buffer", sys.stdout), symbols, options.genspec, taxon, mnemonic)
+			stage.rows += len(ids)
+	instrument.run(rename, metrics, options)
+
+if __name__ == '__main__':
+	main()
@@ -12,10 +12,11 @@ This script is provided as-is, with no support and no guarantee of proper or
 desirable functioning.
 
 This script creates a CDS file from a NCBI genome using the feature table. The only
-dependencies are rsync (should be installed on all Unix systems) and the NCBI Entrez
-Direct E-utilities (www.ncbi.nlm.nih.gov/books/NBK179288). The script can automatically
-download the feature table for the target genome and will use it to gather CDS sequences
-from NCBI databases using Entrez. The user only has to specify the type of taxa (-t) using
+dependencies are rsync (should be installed on all Unix systems), python (for feature_table.py
+and ncbi_fetch.py, found next to this script) and the NCBI Entrez Direct E-utilities
+(www.ncbi.nlm.nih.gov/books/NBK179288). The script can automatically download the feature
+table for the target genome and will use it to gather CDS sequences from NCBI databases using
+Entrez. The user only has to specify the type of taxa (-t) using
 the list of options and the name of the organism (-n) in the format "Genus_species". Note that
 the name must adhere to the naming convention adopted by NCBI. Alternatively, the user can
 pass in the feature table file if they have already obtained it from NCBI by specifying
@@ -23,11 +24,16 @@ the -f flag with the file (and leaving off the -n flag). The user can specify an
 output directory (-o) where all intermediate, temporary and final files will be placed.
 Output is a multi-FASTA sequence of the full genome CDSs.
 
+Sequences are downloaded by ncbi_fetch.py (found next to this script), which runs several
+efetch requests at a time (-j) while starting no more than -r requests per second. Finished
+chunks of 1000 accessions are recorded in <output>/<Genus_species>_fetch, so if the download
+is interrupted or a chunk fails, running the same command again only fetches what is missing.
+
 Note: this script will apparently not work for all NCBI genomes and failed on those tested
 outside of the 'refseq' directory at ftp://ftp.ncbi.nlm.nih.gov/genomes/ (i.e., those in 'all').
 Use with caution and if an error arises, it is probably not an easy fix!
 
-zsh ncbi_CDS_creator.sh -n <Genus_species> [-t <taxon> | -f <feature_table>] [-o <output> -h]
+zsh ncbi_CDS_creator.sh -n <Genus_species> [-t <taxon> | -f <feature_table>] [-o <output> -j <jobs> -r <rate> -h]
 
 OPTIONS:
         -h      usage information and help (this message)
@@ -36,6 +42,8 @@ OPTIONS:
 		'vertebrate_mammalian', 'vertebrate_other', or 'viral'
 	-f	feature table from NCBI for the genome
         -o      directory for output files (files are named automatically) [.]
+	-j	number of concurrent efetch requests [3]
+	-r	maximum efetch requests started per second [3]
 EOF
 }
 
@@ -43,8 +51,10 @@ NAME=
 TAXON=
 FEAT=
 OUTPUT="."
+JOBS=3
+RATE=3
 
-while getopts "hn:t:f:o:" OPTION
+while getopts "hn:t:f:o:j:r:" OPTION
 do
         case $OPTION in
                 h)
@@ -63,6 +73,12 @@ do
 		o)
 			OUTPUT=$OPTARG
 			;;
+		j)
+			JOBS=$OPTARG
+			;;
+		r)
+			RATE=$OPTARG
+			;;
 	esac
 done
 
@@ -95,9 +111,8 @@ rsync -av rsync://ftp.ncbi.nlm.nih.gov/genomes/refseq/${TAXON}/${NAME}/represent
 # from downloaded feature table, parse CDS feature lines, eliminate redundancy using geneID field, and export accessions
 echo "\n**Extracting CDS metadata**"
 # if file was downloaded
-zcat ${OUTPUT}/*${SAFE_NAME_1}*${SAFE_NAME_2}*_feature_table.txt.gz | awk 'BEGIN{FS="\t";OFS="\t"}$1=="CDS"{print $16,$11,$13,$18}' | \
-sort -k1,1 -k4,4nr -k3,3 | awk 'BEGIN{FS="\t";OFS="\t";gene=0}{if(gene!=$1){print $3};gene=$1}END{if(gene!=$1){print $3","}}' \
-> ${OUTPUT}/${NAME}_id_list.tmp
+# (one streaming pass keeping the longest CDS per gene, as 'sort -k1,1 -k4,4nr -k3,3' would pick it)
+python ${0:A:h}/feature_table.py -o ${OUTPUT}/${NAME}_id_list.tmp ${OUTPUT}/*${SAFE_NAME_1}*${SAFE_NAME_2}*_feature_table.txt.gz
 
 fi
 
@@ -105,26 +120,20 @@ if [[ -n $FEAT && -z $TAXON ]]; then
 # from supplied feature table, parse CDS feature lines, eliminate redundancy using geneID field, and export accessions
 echo "\n**Extracting CDS metadata**"
 # if file was supplied
-zcat ${FEAT} | awk 'BEGIN{FS="\t";OFS="\t"}$1=="CDS"{print $16,$11,$13,$18}' | \
-sort -k1,1 -k4,4nr -k3,3 | awk 'BEGIN{FS="\t";OFS="\t";gene=0}{if(gene!=$1){print $3};gene=$1}END{if(gene!=$1){print $3","}}' \
-> ${OUTPUT}/${NAME}_id_list.tmp
+python ${0:A:h}/feature_table.py -i ${FEAT} -o ${OUTPUT}/${NAME}_id_list.tmp
 
 fi
 
-#split list of accessions into smaller batches (not sure why... inherited from hacked script)
-split -l 1000 ${OUTPUT}/${NAME}_id_list.tmp ${OUTPUT}/${NAME}_tmp.
-
-# for each batch of accessions, remove new lines and separate by only commas
-foreach file (`ls $OUTPUT/${NAME}_tmp*`)
-  cat ${file} | sed 's/$/,/' | perl -pe 'chop' | sed 's/$/\n/' >> ${OUTPUT}/${NAME}_chunks.tmp
-end
-
 echo "\n**Creating CDS sequences**"
 
-# for each accession, run efetch to extract CDS sequence and append to the output file
-foreach chunk (`cat ${OUTPUT}/${NAME}_chunks.tmp`)
-  efetch -db nuccore -id "${chunk}" -format fasta_cds_na >> ${OUTPUT}/${NAME}.transcript_cds.fa
-end
+# fetch the CDS sequences of the accessions in concurrent, rate-limited batches of 1000
+# (finished batches are kept in ${NAME}_fetch, so a failed run can be resumed by running it again)
+if ! python ${0:A:h}/ncbi_fetch.py -i ${OUTPUT}/${NAME}_id_list.tmp -o ${OUTPUT}/${NAME}.transcript_cds.fa \
+  --workdir ${OUTPUT}/${NAME}_fetch --chunk 1000 --jobs ${JOBS} --rate ${RATE}
+then
+  echo "\n**Some CDS sequences could not be downloaded; run the same command again to resume**"
+  exit 1
+fi
 
 # remove all temporary intermediate files
 rm -f ${OUTPUT}/*tmp*
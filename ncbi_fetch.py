@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import hashlib
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+import instrument
+
+usage_line = """
+ncbi_fetch.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (and downloader used by 'ncbi_CDS_creator.sh') that fetches sequences for a list of accessions (one per line, \
+or several per line separated by commas, as 'feature_table.py' writes them) in chunks (default 1000 accessions per \
+chunk). Several chunks are fetched at a time, but no more requests are started per second than the rate limit \
+allows (default 3, NCBI's limit without an API key). Each chunk is written to its own \
+file in a working directory (written to a temporary file and renamed into place once complete) and recorded in a \
+manifest there. A failed chunk is retried with increasing waits; when it still fails, the other chunks are finished \
+and the run stops, and running the same command again only fetches the chunks that are missing. Once all chunks are \
+present they are concatenated in order into the output file and the working directory is removed (unless '--keep' \
+is given). The fetch command is a template in which '{ids}' is replaced by the comma-separated accessions of a chunk \
+and whose STDOUT is the chunk's sequence; any command can be used (e.g. a local stand-in for testing). The time, \
+chunks and memory of each step are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and \
+'--profile' write them as json and a cProfile dump).
+
+python ncbi_fetch.py -i <accession_list> -o <output.fa> [--workdir <directory> --chunk <N> --jobs <N> --rate <N> \
+--retries <N> --fetch-cmd <command_template> --keep --verbose --metrics <metrics.json> --profile <profile>]"""
+
+FETCH_CMD = "efetch -db nuccore -id {ids} -format fasta_cds_na"
+
+
+#################################################
+###              Accession chunks             ###
+#################################################
+
+## Accessions from a list with one or more (separated by commas) per line; empty entries are ignored
+def read_accessions(path):
+	accessions = []
+	with open(path) as infile:
+		for line in infile:
+			for accession in line.split(","):
+				accession = accession.strip()
+				if accession:
+					accessions.append(accession)
+	return accessions
+
+def chunk_accessions(accessions, size):
+	return [accessions[start:start + size] for start in range(0, len(accessions), size)]
+
+## Identifies the accessions of a chunk, so a changed list is never mistaken for a finished chunk
+def chunk_digest(chunk):
+	return hashlib.md5(",".join(chunk).encode("utf-8")).hexdigest()
+
+def chunk_path(workdir, number):
+	return os.path.join(workdir, "chunk_%06d.fa" % number)
+
+
+#################################################
+###                  Manifest                 ###
+#################################################
+
+## The manifest lists one finished chunk per line: chunk number, accession digest and file size
+
+class Manifest(object):
+
+	def __init__(self, workdir):
+		self.path = os.path.join(workdir, "manifest.tsv")
+		self.lock = threading.Lock()
+		self.done = {}
+		if os.path.exists(self.path):
+			with open(self.path) as infile:
+				for line in infile:
+					fields = line.rstrip("\n").split("\t")
+					if len(fields) == 3 and fields[2].isdigit():		## A line cut short by an interruption is ignored
+						self.done[int(fields[0])] = (fields[1], int(fields[2]))
+
+	## True when chunk 'number' was finished with the same accessions and its file is intact
+	def finished(self, workdir, number, digest):
+		found = self.done.get(number)
+		if found is None or found[0] != digest:
+			return False
+		path = chunk_path(workdir, number)
+		return os.path.exists(path) and os.path.getsize(path) == found[1]
+
+	def record(self, number, digest, size):
+		with self.lock:
+			with open(self.path, "a") as outfile:
+				outfile.write(str(number)+"\t"+digest+"\t"+str(size)+"\n")
+			self.done[number] = (digest, size)
+
+
+#################################################
+###                Rate limiting              ###
+#################################################
+
+## Spaces request starts at least 1/rate seconds apart, across all threads
+class RateLimiter(object):
+
+	def __init__(self, rate):
+		self.interval = 1.0 / rate if rate > 0 else 0.0
+		self.lock = threading.Lock()
+		self.next_start = 0.0
+
+	def wait(self):
+		with self.lock:
+			now = time.time()
+			start = max(now, self.next_start)
+			self.next_start = start + self.interval
+		if start > now:
+			time.sleep(start - now)
+
+
+#################################################
+###               Fetch the chunks            ###
+#################################################
+
+## Default fetch backend: run the command template for a chunk and return its STDOUT (bytes)
+def command_fetcher(template):
+	arguments = shlex.split(template)
+	def fetch(chunk):
+		ids = ",".join(chunk)
+		process = subprocess.Popen([argument.replace("{ids}", ids) for argument in arguments], stdout=subprocess.PIPE)
+		output = process.communicate()[0]
+		if process.returncode != 0:
+			raise RuntimeError("fetch command exited with status "+str(process.returncode))
+		return output
+	return fetch
+
+## Fetch one chunk (retrying with exponentially increasing waits) and write it atomically; returns an error or None
+def fetch_chunk(number, chunk, workdir, manifest, fetch, limiter, retries, wait):
+	digest = chunk_digest(chunk)
+	error = None
+	for attempt in range(retries + 1):
+		limiter.wait()
+		try:
+			data = fetch(chunk)
+			break
+		except Exception as exception:
+			error = exception
+			if attempt < retries:
+				time.sleep(wait * 2 ** attempt)
+	else:
+		return "chunk "+str(number)+": "+str(error)
+	path = chunk_path(workdir, number)
+	tmp = path + ".%d.%d.tmp" % (os.getpid(), number)
+	with open(tmp, "wb") as outfile:
+		outfile.write(data)
+		outfile.flush()
+		os.fsync(outfile.fileno())
+	os.rename(tmp, path)
+	manifest.record(number, digest, len(data))
+	return None
+
+## Fetch every chunk not yet finished in 'workdir'; returns (chunks fetched now, chunks already finished, errors)
+def fetch_all(chunks, workdir, fetch, jobs=3, rate=3.0, retries=5, wait=2.0):
+	if not os.path.isdir(workdir):
+		os.makedirs(workdir)
+	manifest = Manifest(workdir)
+	pending = [(number, chunk) for number, chunk in enumerate(chunks) \
+	if not manifest.finished(workdir, number, chunk_digest(chunk))]
+	limiter = RateLimiter(rate)
+	errors = []
+	if pending:
+		pool = ThreadPool(max(1, min(jobs, len(pending))))
+		try:
+			for error in pool.imap_unordered(lambda item: fetch_chunk(item[0], item[1], workdir, manifest, fetch, limiter, \
+			retries, wait), pending):
+				if error is not None:
+					sys.stderr.write("Failed to fetch "+error+"\n")
+					errors.append(error)
+		finally:
+			pool.close()
+			pool.join()
+	return len(pending) - len(errors), len(chunks) - len(pending), errors
+
+## Concatenate the chunk files in order into 'output' (written to a temporary file and renamed into place)
+def concatenate(chunks, workdir, output):
+	tmp = output + ".%d.tmp" % os.getpid()
+	with open(tmp, "wb") as outfile:
+		for number in range(len(chunks)):
+			with open(chunk_path(workdir, number), "rb") as infile:
+				shutil.copyfileobj(infile, outfile, 1 << 20)
+	os.rename(tmp, output)
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-i", action = "store", type = "string", dest = "accessions", help = "accession list (one per line)")
+	parser.add_option("-o", action = "store", type = "string", dest = "output", help = "output sequence file")
+	parser.add_option("--workdir", action = "store", type = "string", dest = "workdir", help = "directory for chunk files and manifest [<output>.chunks]")
+	parser.add_option("--chunk", action = "store", type = "int", dest = "chunk", help = "accessions per request [1000]", default = 1000)
+	parser.add_option("--jobs", action = "store", type = "int", dest = "jobs", help = "concurrent requests [3]", default = 3)
+	parser.add_option("--rate", action = "store", type = "float", dest = "rate", help = "maximum requests started per second (0 for no limit) [3]", default = 3.0)
+	parser.add_option("--retries", action = "store", type = "int", dest = "retries", help = "retries of a failed chunk [5]", default = 5)
+	parser.add_option("--fetch-cmd", action = "store", type = "string", dest = "fetch_cmd", help = "fetch command template ({ids} is replaced by the accessions) ["+FETCH_CMD+"]", default = FETCH_CMD)
+	parser.add_option("--keep", action = "store_true", dest = "keep", help = "keep the working directory after concatenating", default = False)
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.accessions is None or options.output is None:
+		sys.stderr.write("\n***Error: specify the accession list and the output file!***\n\n")
+		sys.exit(1)
+	if options.chunk < 1:
+		sys.stderr.write("\n***Error: the chunk size must be at least 1!***\n\n")
+		sys.exit(1)
+## When all input is present
+	workdir = options.workdir if options.workdir is not None else options.output + ".chunks"
+	metrics = instrument.Instrument("ncbi_fetch.py")
+	def fetch():
+		chunks = chunk_accessions(read_accessions(options.accessions), options.chunk)
+		with metrics.stage("fetch chunks", inputs=[options.accessions]) as stage:
+			fetched, finished, errors = fetch_all(chunks, workdir, command_fetcher(options.fetch_cmd), options.jobs, options.rate, \
+			options.retries)
+			stage.rows += fetched
+		sys.stderr.write("Chunks: "+str(len(chunks))+"\tfetched: "+str(fetched)+"\talready finished: "+str(finished)+"\tfailed: "+str(len(errors))+"\n")
+		if errors:
+			sys.stderr.write("\n***Error: "+str(len(errors))+" chunk(s) could not be fetched; run the same command again to resume!***\n\n")
+			sys.exit(1)
+		with metrics.stage("concatenate", outputs=[options.output]) as stage:
+			concatenate(chunks, workdir, options.output)
+			stage.rows += len(chunks)
+		if not options.keep:
+			shutil.rmtree(workdir)
+	instrument.run(fetch, metrics, options)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import os
+import sqlite3
+import sys
+from compressed_io import open_input
+import instrument
+
+usage_line = """
+ortholog_db.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Module (used by 'ensembl_orthologs.py') and build script for a persistent ortholog index. A tab-delimited BioMart \
+export with query IDs in one column and subject (ortholog) IDs in another is read once and every distinct \
+query-subject pair is stored in an SQLite file next to it ('<export>.orthodb'), sorted and keyed by query ID, so \
+one-to-many and many-to-many orthologs are all kept. Queries listed without a subject are kept too (reported as \
+'NA'). The index records the size and modification time of the export and the two columns; it is reused for as \
+long as they are unchanged and rebuilt automatically otherwise. Lookups of any number of query IDs are answered \
+from the index without reading the export again. Lines starting with '#' are ignored and the export can be \
+compressed (gzip, bgzip, bzip2, xz or zstd). The time, pairs and memory of the build are written to STDERR with \
+'--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them as json and a cProfile dump).
+
+python ortholog_db.py -d <biomart_export> -q <query_column> -s <subject_column> [--index <index_file> --rebuild \
+--verbose --metrics <metrics.json> --profile <profile>]"""
+
+INDEX_SUFFIX = ".orthodb"
+INDEX_VERSION = "1"
+BATCH = 100000
+LOOKUP_BATCH = 500													## Query IDs per SELECT (below SQLite's 999 parameter limit)
+
+
+#################################################
+###             Read BioMart export           ###
+#################################################
+
+## Size and modification time of the export, recorded in the index to notice when the export changes
+def fingerprint(path):
+	info = os.stat(path)
+	return str(info.st_size) + ":" + str(int(info.st_mtime))
+
+## (query, subject) pairs of an export with 1-based column numbers; the subject is '' when a query has none
+def export_pairs(infile, query_col, subject_col):
+	query = query_col - 1
+	subject = subject_col - 1
+	for line in infile:
+		if line.strip().startswith("#"):
+			continue
+		record = line.rstrip().split("\t")
+		if len(record) <= query or not record[query]:
+			continue
+		yield record[query], record[subject].strip() if len(record) > subject else ""
+
+
+#################################################
+###                Build index                ###
+#################################################
+
+## Build the index of 'export' into 'index_path' (written to a temporary file and renamed into place);
+## returns the number of distinct pairs
+def build_index(export, index_path, query_col, subject_col, batch=BATCH):
+	tmp = index_path + ".%d.tmp" % os.getpid()
+	if os.path.exists(tmp):
+		os.remove(tmp)
+	db = sqlite3.connect(tmp)
+	try:
+		db.execute("PRAGMA journal_mode=OFF")								## A failed build removes its temporary file
+		db.execute("PRAGMA synchronous=OFF")
+		db.execute("CREATE TABLE meta(key TEXT PRIMARY KEY, value TEXT)")
+		db.execute("CREATE TEMP TABLE staging(query TEXT, subject TEXT)")
+		with open_input(export, text=True) as infile:
+			chunk = []
+			for pair in export_pairs(infile, query_col, subject_col):
+				chunk.append(pair)
+				if len(chunk) == batch:
+					db.executemany("INSERT INTO staging VALUES (?, ?)", chunk)
+					chunk = []
+			db.executemany("INSERT INTO staging VALUES (?, ?)", chunk)
+		## Sorted insert into the clustered (query, subject) key, which also removes duplicate pairs
+		db.execute("CREATE TABLE orthologs(query TEXT NOT NULL, subject TEXT NOT NULL, PRIMARY KEY(query, subject)) WITHOUT ROWID")
+		db.execute("INSERT OR IGNORE INTO orthologs SELECT query, subject FROM staging ORDER BY query, subject")
+		db.execute("DROP TABLE staging")
+		pairs = db.execute("SELECT COUNT(*) FROM orthologs").fetchone()[0]
+		db.executemany("INSERT INTO meta VALUES (?, ?)", [("version", INDEX_VERSION), ("export", os.path.abspath(export)), \
+		("fingerprint", fingerprint(export)), ("query_col", str(query_col)), ("subject_col", str(subject_col))])
+		db.commit()
+	except BaseException:
+		db.close()
+		os.remove(tmp)
+		raise
+	db.close()
+	os.rename(tmp, index_path)
+	return pairs
+
+## Settings recorded in an index file, or None when it is missing or unreadable
+def index_meta(index_path):
+	if not os.path.exists(index_path):
+		return None
+	try:
+		db = sqlite3.connect(index_path)
+		try:
+			return dict(db.execute("SELECT key, value FROM meta").fetchall())
+		finally:
+			db.close()
+	except sqlite3.DatabaseError:
+		return None
+
+## True when 'index_path' was built from the current 'export' with the same columns
+def index_current(index_path, export, query_col, subject_col):
+	meta = index_meta(index_path)
+	return meta is not None and meta.get("version") == INDEX_VERSION and meta.get("fingerprint") == fingerprint(export) \
+	and meta.get("query_col") == str(query_col) and meta.get("subject_col") == str(subject_col)
+
+
+#################################################
+###               Query the index             ###
+#################################################
+
+## Read-only view of an index; subjects are returned in sorted order
+class OrthologDB(object):
+
+	def __init__(self, index_path):
+		self.path = index_path
+		self.db = sqlite3.connect(index_path)
+		self.db.text_factory = str
+		self.meta = dict(self.db.execute("SELECT key, value FROM meta").fetchall())
+
+	def __len__(self):
+		return self.db.execute("SELECT COUNT(*) FROM orthologs").fetchone()[0]
+
+	## Subjects of one query ([] when it is listed without one, None when it is not in the export)
+	def subjects(self, query):
+		return self.lookup([query]).get(query)
+
+	## {query: [subjects]} for the queries found in the export (listed without a subject: []), any number of queries
+	def lookup(self, queries):
+		found = {}
+		queries = list(set(queries))
+		for start in range(0, len(queries), LOOKUP_BATCH):
+			chunk = queries[start:start + LOOKUP_BATCH]
+			for query, subject in self.db.execute("SELECT query, subject FROM orthologs WHERE query IN (" + \
+			",".join("?" * len(chunk)) + ") ORDER BY query, subject", chunk):
+				subjects = found.setdefault(query, [])
+				if subject:
+					subjects.append(subject)
+		return found
+
+	def close(self):
+		self.db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+## Open the index of 'export' (at 'index_path', default '<export>.orthodb'), building it first when it is missing,
+## out of date or 'rebuild' is set; without an export, an existing index is opened as it is
+## (with an 'instrument.Instrument', the build is recorded as a stage)
+def open_index(export=None, index_path=None, query_col=1, subject_col=2, rebuild=False, log=sys.stderr, instrument=None):
+	if index_path is None:
+		index_path = export + INDEX_SUFFIX
+	if export is not None and (rebuild or not index_current(index_path, export, query_col, subject_col)):
+		log.write("Building ortholog index "+index_path+" from "+export+"\n")
+		if instrument is None:
+			pairs = build_index(export, index_path, query_col, subject_col)
+		else:
+			with instrument.stage("build index", inputs=[export], outputs=[index_path]) as stage:
+				pairs = build_index(export, index_path, query_col, subject_col)
+				stage.rows += pairs
+		log.write(str(pairs)+" distinct query-subject pairs indexed\n")
+		log.flush()
+	elif index_meta(index_path) is None:
+		raise IOError("no ortholog index at "+index_path)
+	return OrthologDB(index_path)
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-d", action = "store", type = "string", dest = "database", help = "tab-delimited BioMart export")
+	parser.add_option("-q", action = "store", type = "int", dest = "q", help = "column number of the query IDs (1, 2, ..., N)")
+	parser.add_option("-s", action = "store", type = "int", dest = "s", help = "column number of the subject IDs (1, 2, ..., N)")
+	parser.add_option("--index", action = "store", type = "string", dest = "index", help = "index file [<export>"+INDEX_SUFFIX+"]")
+	parser.add_option("--rebuild", action = "store_true", dest = "rebuild", help = "rebuild the index even if it is current", default = False)
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.database is None or options.q is None or options.s is None:
+		sys.stderr.write("\n***Error: specify the BioMart export and its query and subject columns!***\n\n")
+		sys.exit(1)
+	if options.q < 1 or options.s < 1:
+		sys.stderr.write("\n***Error: column numbers start at 1!***\n\n")
+		sys.exit(1)
+## When all input is present
+	metrics = instrument.Instrument("ortholog_db.py")
+	def build():
+		try:
+			index = open_index(options.database, options.index, options.q, options.s, options.rebuild, instrument=metrics)
+		except (IOError, OSError) as error:
+			sys.stderr.write("\n***Error: "+str(error)+"!***\n\n")
+			sys.exit(1)
+		with index:
+			print(index.path+"\t"+str(len(index))+" pairs")
+	instrument.run(build, metrics, options)
+
+if __name__ == '__main__':
+	main()
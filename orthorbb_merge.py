@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import gc
+import re
+import instrument
+
+usage_line = """
+orthorbb_merge.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Script (and module used by 'orthorbb') that performs the post-BLAST steps of 'orthorbb' in a single pass over the two \
+tabular (outfmt 6) blastp tables: top-hit selection, reciprocal best blastp (RBB) detection, one-way best blastp \
+e-value filtering and the RBB-over-OBB priority merge. It writes the same '_RBB', '_ONEWAY', '_homology_annotation' \
+and summary files as the original shell pipeline (byte for byte, as produced by GNU sort in the C locale and gawk). \
+By default the two tables are the 'top1hits' files written by 'orthorbb', but any outfmt 6 tables can be given \
+with '--forward' (query to reference) and '--reverse' (reference to query); only the best subject of each query is used. \
+The time and memory of the merge are written to STDERR with '--verbose' (see 'instrument.py'; '--metrics' and '--profile' write them \
+as json and a cProfile dump).
+
+python orthorbb_merge.py -p <query_proteins> -q <query_name> -r <reference_name> -e <RBB_e-value> -f <ONEWAY_e-value> \
+[--forward <query_to_reference.fmt6> --reverse <reference_to_query.fmt6> --verbose --metrics <metrics.json> --profile <profile>]"""
+
+## awk treats a field as a number when it looks like one (otherwise it is compared as a string)
+AWK_NUMBER = re.compile(r"^[ \t]*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?[ \t]*$")
+## sort -g reads the longest numeric prefix of a field; fields without one sort before all numbers
+SORT_NUMBER = re.compile(r"^[ \t]*([-+]?(inf|infinity|nan|[0-9]+\.?[0-9]*([eE][-+]?[0-9]+)?|\.[0-9]+([eE][-+]?[0-9]+)?))", re.I)
+
+
+#################################################
+###          Shell tool equivalents           ###
+#################################################
+
+## Fields 1 to 12 of a line as split by awk's default FS (missing fields are empty)
+def awk_fields(line):
+	fields = line.split()
+	if len(fields) < 12:
+		fields.extend([""] * (12 - len(fields)))
+	return fields
+
+## Rows of a tabular blast file as (line, query/subject pair as split by awk -F "\t", fields as split by awk),
+## keeping only the rows for the first (best) subject of each query (as 'rbh_engine.top_subject_lines' does)
+def top_subject_rows(path):
+	rows = []
+	query = None
+	subject = None
+	with open(path) as infile:
+		for line in infile:
+			fields = line.split()
+			if not fields:
+				continue
+			if fields[0] != query:
+				query = fields[0]
+				subject = fields[1] if len(fields) > 1 else None
+			if len(fields) > 1 and fields[1] == subject:
+				if len(fields) < 12:
+					fields.extend([""] * (12 - len(fields)))
+				pair = line.rstrip("\n").split("\t", 2)
+				rows.append((line, (pair[0], pair[1] if len(pair) > 1 else ""), fields))
+	return rows
+
+## awk -F "\t" '!_[$1 FS $2]++' : keep the first row for each query/subject pair
+def first_per_pair(rows):
+	seen = set()
+	kept = []
+	for row in rows:
+		if row[1] not in seen:
+			seen.add(row[1])
+			kept.append(row)
+	return kept
+
+## Numeric value of a field for 'sort -g' as a (class, value) pair (non-numbers form the lowest class)
+def sort_general(field):
+	try:
+		value = float(field)
+	except ValueError:
+		match = SORT_NUMBER.match(field)
+		if match is None:
+			return (0, 0.0)
+		value = float(match.group(1))
+	if value != value:												## NaN sorts after non-numbers, before all numbers
+		return (1, 0.0)
+	return (2, value)
+
+## Key of 'sort -k1,1 -k11,11gr -k12,12g' (ties are broken by comparing whole lines), carrying the row along
+def rbb_order(row):
+	line, pair, fields = row
+	evalue = sort_general(fields[10])
+	return (fields[0], -evalue[0], -evalue[1], sort_general(fields[11]), line.rstrip("\n"), row)
+
+
+#################################################
+###     Reciprocal best blastp (rank = 1)     ###
+#################################################
+
+## Pairs found in both directions, reporting the row that 'sort -k1,1 -k11,11gr -k12,12g' places second
+## (i.e. the e-value and bitscore of the less confident alignment are kept); rows are grouped by pair first,
+## so only the rows of repeated pairs are sorted
+def reciprocal_best(forward, reverse):
+	groups = {}
+	for line, pair, fields in first_per_pair(reverse):
+		fields = [fields[1], fields[0], fields[2], fields[3], fields[4], fields[5], fields[8], fields[9], fields[6], fields[7], fields[10], fields[11]]
+		pair = (fields[0], fields[1])
+		if "" in fields:											## Empty fields shift when the reordered line is split again
+			line = "\t".join(fields) + "\n"
+			fields = (line, pair, awk_fields(line))
+		groups.setdefault(pair, []).append(fields)
+	for row in first_per_pair(forward):
+		group = groups.get(row[1])
+		if group is not None:
+			group.append(row)
+	selected = []
+	for pair, group in groups.items():
+		if len(group) > 1:
+			rows = [item if isinstance(item, tuple) else ("\t".join(item) + "\n", pair, item) for item in group]
+			if len(rows) == 2:										## The usual case: one row from each direction
+				selected.append(max(rbb_order(rows[0]), rbb_order(rows[1])))
+			else:
+				selected.extend(sorted(rbb_order(row) for row in rows)[1:])
+	selected.sort()
+	return [key[-1] for key in selected]
+
+
+#################################################
+###      One-way best blastp (rank = 2)       ###
+#################################################
+
+## awk '$11 < oeval' : numeric comparison when both sides look numeric, string comparison otherwise
+def oneway_best(forward, oeval):
+	limit = float(oeval) if AWK_NUMBER.match(oeval) else None
+	passed = []
+	for row in forward:
+		evalue = row[2][10]
+		if limit is not None and (evalue == "" or AWK_NUMBER.match(evalue)):
+			if float(evalue or 0) < limit:
+				passed.append(row)
+		elif evalue < oeval:
+			passed.append(row)
+	return first_per_pair(passed)
+
+
+#################################################
+###         Priority merge and summary        ###
+#################################################
+
+## sort -u -k1,1 over the tagged RBB rows followed by the tagged ONEWAY rows: the first row for each query wins
+def priority_merge(rbb_rows, oneway_rows):
+	merged = {}
+	for rows, tag in ((rbb_rows, "|RBB"), (oneway_rows, "|OBB")):
+		for line, pair, fields in rows:
+			if fields[0] not in merged:
+				merged[fields[0]] = "\t".join([fields[0], fields[1] + tag] + fields[2:12]) + "\n"
+	return [merged[query] for query in sorted(merged)]
+
+## Number of records in a fasta file (grep -c "^>")
+def count_records(path):
+	count = 0
+	previous = b"\n"
+	with open(path, "rb") as infile:
+		while True:
+			block = infile.read(4 * 1024 * 1024)
+			if not block:
+				break
+			count += (previous + block).count(b"\n>")
+			previous = block[-1:]
+	return count
+
+def summary_lines(merged, total):
+	rbb = 0
+	obb = 0
+	for line in merged:
+		subject = line.split("\t", 2)[1]
+		if subject.endswith("RBB") or "\\" in subject:
+			rbb += 1
+		if subject.endswith("OBB") or "\\" in subject:
+			obb += 1
+	return "RBB proteins to proteins = " + (str(rbb) if rbb else "") + "\n" + \
+	"ONEWAY proteins to proteins = " + (str(obb) if obb else "") + "\n" + \
+	"Total annotated = " + str(rbb + obb) + "\n" + \
+	"Total input sequences = " + str(total) + "\n"
+
+
+#################################################
+###            Full post-BLAST merge          ###
+#################################################
+
+def output_names(qry, ref, reval, oeval):
+	return {"rbb": qry+"_"+ref+"_RBB.blastp.e"+reval+".fmt6.txt",
+		"oneway": qry+"_"+ref+"_ONEWAY.blastp.e"+oeval+".fmt6.txt",
+		"annotation": qry+"_"+ref+"_homology_annotation.fmt6.txt",
+		"summary": qry+"_"+ref+"_homology_annotation.summary.txt"}
+
+## Read both tables once, then write the RBB, ONEWAY, homology annotation and summary files
+def merge(forward_path, reverse_path, query_fasta, outputs, oeval):
+	gc.disable()													## Many small rows; cyclic garbage collection only slows this down
+	try:
+		forward = top_subject_rows(forward_path)
+		reverse = top_subject_rows(reverse_path)
+		rbb = reciprocal_best(forward, reverse)
+		oneway = oneway_best(forward, oeval)
+		merged = priority_merge(rbb, oneway)
+	finally:
+		gc.enable()
+	for name, rows in (("rbb", [row[0] for row in rbb]), ("oneway", [row[0] for row in oneway]), ("annotation", merged)):
+		with open(outputs[name], "w") as outfile:
+			outfile.writelines(rows)
+	with open(outputs["summary"], "w") as outfile:
+		outfile.write(summary_lines(merged, count_records(query_fasta)))
+	return len(rbb), len(oneway), len(merged)
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-p", action = "store", type = "string", dest = "qprot", help = "query protein sequences")
+	parser.add_option("-q", action = "store", type = "string", dest = "qry", help = "name of query sample")
+	parser.add_option("-r", action = "store", type = "string", dest = "ref", help = "name of reference sample")
+	parser.add_option("-e", action = "store", type = "string", dest = "reval", help = "e-value used for RBB (output naming)", default = "")
+	parser.add_option("-f", action = "store", type = "string", dest = "oeval", help = "e-value to filter BLAST hits for ONEWAY", default = "")
+	parser.add_option("--forward", action = "store", type = "string", dest = "forward", help = "query to reference blastp table (outfmt 6)")
+	parser.add_option("--reverse", action = "store", type = "string", dest = "reverse", help = "reference to query blastp table (outfmt 6)")
+	instrument.add_options(parser)
+	options, args = parser.parse_args()
+## Check for missing user input
+	if options.qprot is None or options.qry is None or options.ref is None:
+		print("\n***Error: specify the query proteins and the query and reference names!***\n")
+## When all input is present
+	else:
+		forward = options.forward or "qry-"+options.qry+"_2_ref-"+options.ref+"_blastp_e"+options.reval+".top1hits.fmt6.txt"
+		reverse = options.reverse or "qry-"+options.ref+"_2_ref-"+options.qry+"_blastp_e"+options.reval+".top1hits.fmt6.txt"
+		outputs = output_names(options.qry, options.ref, options.reval, options.oeval)
+		metrics = instrument.Instrument("orthorbb_merge.py")
+		def merge_hits():
+			with metrics.stage("merge", inputs=[forward, reverse, options.qprot], outputs=outputs.values()):
+				merge(forward, reverse, options.qprot, outputs, options.oeval)
+		instrument.run(merge_hits, metrics, options)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import subprocess
+from array import array
+
+## Streaming BLAST tabular (outfmt 6) parsing and reciprocal hit engine used by 'homology_BESThit_parsing.py' and
+## 'homology_TOP3hit_parsing.py'
+## Sequence IDs are interned into integer codes and the best (or top N) hits for every ID are kept in compact integer
+## arrays, so reciprocal hits are found with one pass over each hit table and one join between the two arrays.
+
+NO_HIT = -1
+
+
+#################################################
+###              Intern sequence IDs          ###
+#################################################
+
+## Map each distinct sequence ID to a small integer code (and back)
+class Interner(object):
+
+	def __init__(self):
+		self.codes = {}
+		self.names = []
+
+	def code(self, name):
+		code = self.codes.get(name)
+		if code is None:
+			code = len(self.names)
+			self.codes[name] = code
+			self.names.append(name)
+		return code
+
+	def __len__(self):
+		return len(self.names)
+
+
+#################################################
+###            Stream tabular hits            ###
+#################################################
+
+## Yield the lines of a blast archive converted to tabular format by blast_formatter (read from a pipe, no temporary file)
+def formatter_lines(archive, fields="sseqid qseqid evalue", max_target_seqs=1):
+	command = ["blast_formatter", "-max_target_seqs", str(max_target_seqs), "-outfmt", "6 " + fields, "-archive", archive]
+	process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+	for line in process.stdout:
+		yield line
+	process.stdout.close()
+	if process.wait() != 0:
+		raise RuntimeError("blast_formatter failed on " + archive)
+
+## Keep only the rows for the first (best) subject of each query, as 'blast_formatter -max_target_seqs 1' does
+## (rows are grouped by query in blast output)
+def top_subject_lines(lines, query_col, subject_col):
+	query = None
+	subject = None
+	for line in lines:
+		fields = line.split()
+		if not fields:
+			continue
+		if fields[query_col] != query:
+			query = fields[query_col]
+			subject = fields[subject_col]
+		if fields[subject_col] == subject:
+			yield line
+
+
+#################################################
+###          Best hit per sequence ID         ###
+#################################################
+
+## Store the first hit seen for every key ID (hits are ordered best first) as value codes indexed by key code
+def best_hits(lines, keys, values, key_col=0, value_col=1):
+	best = array("l")
+	for line in lines:
+		fields = line.split()
+		if not fields:
+			continue
+		key = keys.code(fields[key_col])
+		if key >= len(best):
+			best.extend([NO_HIT] * (key - len(best) + 1))
+		if best[key] == NO_HIT:
+			best[key] = values.code(fields[value_col])
+	return best
+
+
+## Store the first 'n' distinct value codes seen for every key ID (hits are ordered best first) in fixed-size
+## buffers of 'n' slots per key code (slot key * n + rank, rank counted from 0)
+def top_hits(lines, keys, values, n, key_col=0, value_col=1):
+	top = array("l")
+	for line in lines:
+		fields = line.split()
+		if not fields:
+			continue
+		start = keys.code(fields[key_col]) * n
+		if start >= len(top):
+			top.extend([NO_HIT] * (start + n - len(top)))
+		if top[start + n - 1] != NO_HIT:							## Buffer already full
+			continue
+		value = values.code(fields[value_col])
+		for slot in range(start, start + n):
+			if top[slot] == value:									## Further HSPs of a subject already ranked
+				break
+			if top[slot] == NO_HIT:
+				top[slot] = value
+				break
+	return top
+
+
+#################################################
+###            Reciprocal hit joins           ###
+#################################################
+
+## Join the two best-hit arrays: yield (a, b) code pairs where a's best hit is b and b's best hit is a
+def reciprocal_best_hits(best_ab, best_ba):
+	limit = len(best_ba)
+	for a, b in enumerate(best_ab):
+		if b != NO_HIT and b < limit and best_ba[b] == a:
+			yield a, b
+
+## Hash join of two top-hit arrays (n slots per key): yield (a, b, rank_ab, rank_ba) for every hit of a to b
+## whose reverse hit of b to a is also present (ranks counted from 0)
+def reciprocal_ranks(top_ab, top_ba, n):
+	ranks = {}
+	for slot, a in enumerate(top_ba):
+		if a != NO_HIT:
+			ranks[(slot // n, a)] = slot % n
+	for slot, b in enumerate(top_ab):
+		if b != NO_HIT:
+			rank = ranks.get((b, slot // n))
+			if rank is not None:
+				yield slot // n, b, slot % n, rank
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+## Dependency-aware stage scheduler used by 'Trinotate_run.py'
+## A pipeline is a list of stages, each a series of shell commands that may only start once the stages it requires
+## have finished. Stages whose requirements are met run concurrently within a CPU budget: every running stage holds
+## the threads it was started with, and the free threads are split evenly among the stages started together (up to
+## what each stage can use). The first command that exits with a non-zero status stops the run: running stages are
+## terminated and no further stages are started. The wall time of every stage is reported as it finishes.
+## With a run manifest, each finished stage records its parameters and the fingerprints (size and modification time)
+## of its input and output files, and a later run skips the stages whose record still matches (as make would):
+## same parameters, unchanged inputs, outputs present, unchanged and newer than the inputs, and no required stage
+## re-run. '--force' re-runs everything and '--from-stage' re-runs a stage and everything that depends on it.
+
+
+class StageError(Exception):
+	pass
+
+
+#################################################
+###                  Stages                   ###
+#################################################
+
+## name:      unique stage name
+## commands:  function of the number of threads given to the stage, returning its shell commands (run in order)
+## requires:  names of the stages that must finish first
+## threads:   most threads the stage can use (1 for single-threaded tools)
+## inputs:    files the stage reads, outputs: files it writes (a stage without outputs is never skipped)
+## params:    settings that change the outputs (default: the stage's commands for one thread)
+
+class Stage(object):
+
+	def __init__(self, name, commands, requires=(), threads=1, inputs=(), outputs=(), params=None):
+		self.name = name
+		self.commands = commands
+		self.requires = tuple(requires)
+		self.threads = max(1, threads)
+		self.inputs = tuple(inputs)
+		self.outputs = tuple(outputs)
+		self.params = params
+
+	def fingerprint(self):
+		if self.params is not None:
+			return self.params
+		return list(self.commands(1))
+
+## Check that stage names are unique and that the requirements name defined stages without forming a cycle;
+## returns the stages in an order where every stage follows the stages it requires
+def check_stages(stages):
+	names = {}
+	for stage in stages:
+		if stage.name in names:
+			raise ValueError("stage '"+stage.name+"' is defined twice")
+		names[stage.name] = stage
+	for stage in stages:
+		for required in stage.requires:
+			if required not in names:
+				raise ValueError("stage '"+stage.name+"' requires unknown stage '"+required+"'")
+	ordered = []
+	placed = set()
+	remaining = list(stages)
+	while remaining:
+		ready = [stage for stage in remaining if all(required in placed for required in stage.requires)]
+		if not ready:
+			raise ValueError("stages "+", ".join(stage.name for stage in remaining)+" depend on each other in a cycle")
+		for stage in ready:
+			ordered.append(stage)
+			placed.add(stage.name)
+		remaining = [stage for stage in remaining if stage.name not in placed]
+	return ordered
+
+## Names of 'name' and of every stage that depends on it, directly or not
+def downstream(stages, name):
+	found = set([name])
+	grown = True
+	while grown:
+		grown = False
+		for stage in stages:
+			if stage.name not in found and any(required in found for required in stage.requires):
+				found.add(stage.name)
+				grown = True
+	return found
+
+## Threads for each stage started together: at least one each, the rest of 'free' handed out one at a time
+def split_threads(stages, free):
+	threads = [1] * len(stages)
+	free -= len(stages)
+	while free > 0:
+		grown = False
+		for position, stage in enumerate(stages):
+			if free > 0 and threads[position] < stage.threads:
+				threads[position] += 1
+				free -= 1
+				grown = True
+		if not grown:
+			break
+	return threads
+
+
+#################################################
+###                Run manifest               ###
+#################################################
+
+## [size, modification time] of a file, or None when it is missing
+def file_state(path):
+	try:
+		info = os.stat(path)
+	except OSError:
+		return None
+	return [info.st_size, info.st_mtime]
+
+## The manifest is a json file with one record per finished stage: its parameters and input and output fingerprints
+
+class RunManifest(object):
+
+	def __init__(self, path):
+		self.path = path
+		self.records = {}
+		if os.path.exists(path):
+			try:
+				with open(path) as infile:
+					self.records = json.load(infile)
+			except ValueError:											## Unreadable manifest: nothing is up to date
+				self.records = {}
+
+	## True when the recorded run of 'stage' still matches its parameters and files
+	def up_to_date(self, stage):
+		record = self.records.get(stage.name)
+		if record is None or not stage.outputs or record.get("params") != stage.fingerprint():
+			return False
+		inputs = dict((path, file_state(path)) for path in stage.inputs)
+		outputs = dict((path, file_state(path)) for path in stage.outputs)
+		if record.get("inputs") != inputs or record.get("outputs") != outputs or None in outputs.values():
+			return False
+		newest_input = max([state[1] for state in inputs.values() if state is not None] or [0])
+		return min(state[1] for state in outputs.values()) >= newest_input
+
+	## Record a finished stage (with the input fingerprints taken when it started) and save the manifest
+	def record(self, stage, inputs):
+		self.records[stage.name] = {"params": stage.fingerprint(), "inputs": inputs, \
+		"outputs": dict((path, file_state(path)) for path in stage.outputs)}
+		tmp = self.path + ".%d.tmp" % os.getpid()
+		with open(tmp, "w") as outfile:
+			json.dump(self.records, outfile, indent=1, sort_keys=True)
+		os.rename(tmp, self.path)
+
+
+#################################################
+###               Run the stages              ###
+#################################################
+
+class Scheduler(object):
+
+	def __init__(self, stages, cpus, log=sys.stdout, manifest=None, force=False, from_stage=None):
+		self.ordered = check_stages(stages)
+		if from_stage is not None and from_stage not in [stage.name for stage in stages]:
+			raise ValueError("there is no stage '"+from_stage+"' (stages: "+", ".join(stage.name for stage in stages)+")")
+		self.stages = list(stages)
+		self.cpus = max(1, cpus)
+		self.log = log
+		self.manifest = RunManifest(manifest) if manifest is not None else None
+		self.force = force
+		self.from_stage = from_stage
+		self.lock = threading.Condition()
+		self.processes = {}
+		self.finished = set()
+		self.running = {}
+		self.failure = None
+		self.timings = []
+
+	def _write(self, text):
+		with self.lock:
+			self.log.write(text + "\n")
+			self.log.flush()
+
+	## Run one shell command in its own process group (so it can be terminated with everything it started)
+	def _command(self, stage, command):
+		with self.lock:
+			if self.failure is not None:
+				return False
+			process = subprocess.Popen(command, shell=True, preexec_fn=os.setsid)
+			self.processes[stage.name] = process
+		status = process.wait()
+		with self.lock:
+			del self.processes[stage.name]
+			if status != 0 and self.failure is None:
+				self.failure = "stage '"+stage.name+"' failed (exit status "+str(status)+"): "+command
+			return status == 0
+
+	## Stages that can be skipped: up to date in the manifest, not forced and not depending on a stage that will run
+	def _skipped(self):
+		if self.manifest is None or self.force:
+			return set()
+		forced = downstream(self.stages, self.from_stage) if self.from_stage is not None else set()
+		skipped = set()
+		for stage in self.ordered:										## Requirements are decided before the stages that need them
+			if stage.name not in forced and all(required in skipped for required in stage.requires) and \
+			self.manifest.up_to_date(stage):
+				skipped.add(stage.name)
+		return skipped
+
+	def _stage(self, stage, threads):
+		start = time.time()
+		inputs = dict((path, file_state(path)) for path in stage.inputs)
+		completed = True
+		try:
+			for command in stage.commands(threads):
+				if not self._command(stage, command):
+					completed = False
+					break
+		except Exception as error:
+			completed = False
+			with self.lock:
+				if self.failure is None:
+					self.failure = "stage '"+stage.name+"' failed: "+str(error)
+		elapsed = time.time() - start
+		with self.lock:
+			del self.running[stage.name]
+			if completed:
+				self.finished.add(stage.name)
+				if self.manifest is not None:
+					self.manifest.record(stage, inputs)
+				self.timings.append((stage.name, threads, elapsed))
+				self._write("*** Finished "+stage.name+" in "+"%.1f" % elapsed+" s ("+str(threads)+" thread(s)) ***")
+			self.lock.notify_all()
+
+	def _terminate(self):
+		for process in list(self.processes.values()):
+			try:
+				os.killpg(process.pid, signal.SIGTERM)
+			except OSError:
+				pass
+
+	## Run every stage; returns [(name, threads, seconds)] in order of completion, or raises StageError on a failure
+	def run(self):
+		workers = []
+		with self.lock:
+			skipped = self._skipped()
+			for stage in self.stages:
+				if stage.name in skipped:
+					self.finished.add(stage.name)
+					self._write("*** Skipping "+stage.name+" (up to date) ***")
+			while len(self.finished) < len(self.stages):
+				if self.failure is not None:
+					break
+				free = self.cpus - sum(self.running.values())
+				ready = [stage for stage in self.stages if stage.name not in self.finished and stage.name not in self.running \
+				and all(required in self.finished for required in stage.requires)]
+				if ready and free > 0:
+					ready = ready[:free]
+					for stage, threads in zip(ready, split_threads(ready, free)):
+						self.running[stage.name] = threads
+						self._write("*** Starting "+stage.name+" ("+str(threads)+" thread(s)) ***")
+						worker = threading.Thread(target=self._stage, args=(stage, threads))
+						worker.daemon = True
+						worker.start()
+						workers.append(worker)
+				self.lock.wait(1.0)
+			if self.failure is not None:
+				self._terminate()
+		for worker in workers:
+			worker.join()
+		if self.failure is not None:
+			raise StageError(self.failure)
+		return self.timings
+
+## Run 'stages' within a budget of 'cpus' threads and report the wall time of each; raises StageError on a failure
+## (with a 'manifest' path, stages that are up to date are skipped; see above)
+def run_stages(stages, cpus, log=sys.stdout, manifest=None, force=False, from_stage=None):
+	start = time.time()
+	timings = Scheduler(stages, cpus, log, manifest, force, from_stage).run()
+	log.write("\nStage\tThreads\tWall time (s)\n")
+	for name, threads, elapsed in timings:
+		log.write(name+"\t"+str(threads)+"\t"+"%.1f" % elapsed+"\n")
+	log.write("Total\t"+str(cpus)+"\t"+"%.1f" % (time.time() - start)+"\n")
+	log.flush()
+	return timings
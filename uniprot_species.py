@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+#print __name__
+
+from __future__ import print_function
+import optparse
+import bisect
+import json
+import os
+import re
+import sys
+from array import array
+try:
+	from html import unescape
+except ImportError:													## Python 2
+	from HTMLParser import HTMLParser
+	unescape = HTMLParser().unescape
+
+usage_line = """
+uniprot_species.py
+
+Version 1.0 (18 October, 2026)
+License: GNU GPLv2
+To report bugs or errors, please contact Daren Card (dcard@uta.edu).
+This script is provided as-is, with no support and no guarantee of proper or desirable functioning.
+
+Module (used by 'ncbi2uniprot.py') and query script for the UniProt species list that ships with ContigAnnotator \
+('uniprot_species_list_2018-05-30.txt'). The list is parsed once into a compact index of mnemonic codes, kingdoms, \
+numerical taxon IDs and official (scientific) names, which is saved next to it as json ('<speclist>.idx') and reused \
+for as long as the list is unchanged. The index is only loaded when a lookup is \
+made, and no network access is needed. Species can be looked up by exact name (case is ignored when there is no \
+case-sensitive match), by name prefix, by mnemonic code or by taxon ID. Matches are written to STDOUT as \
+tab-delimited mnemonic code, kingdom, taxon ID and name.
+
+python uniprot_species.py [-s <"Genus species"> | --prefix <text> | --mnemonic <code> | --taxon <ID>] \
+[--speclist <speclist.txt> --rebuild]"""
+
+SPECIES_LIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uniprot_species_list_2018-05-30.txt")
+FORMAT = "speclist"
+VERSION = 2
+ENTRY = re.compile(r"^([A-Z0-9]{1,5}) +([A-Z]) +([0-9]+): N=(.*)$")
+TAG = re.compile(r"<[^>]*>")
+
+
+#################################################
+###              Index structure              ###
+#################################################
+
+## mnemonics, names:  one per species in list order
+## kingdoms:          one letter per species (A, B, E, V or X)
+## taxa:              numerical taxon IDs (array 'l')
+## exact:             name -> row (first species of that name)
+## keys, order:       lower-case names sorted, with the row of each (for prefix lookups)
+## codes, taxon_rows: mnemonic -> row, taxon ID -> row
+## The index file is json holding the format, version and fingerprint of the list and the columns SAVED; the
+## lookup tables are made again from them when the file is read
+SAVED = ["mnemonics", "names", "kingdoms", "taxa", "keys", "order"]
+
+def fingerprint(path):
+	info = os.stat(path)
+	return (info.st_size, int(info.st_mtime))
+
+## Species name without the HTML markup the downloaded list contains
+def clean_name(text):
+	return unescape(TAG.sub("", text)).strip()
+
+
+#################################################
+###               Build the index             ###
+#################################################
+
+def build_index(path=SPECIES_LIST):
+	mnemonics = []
+	names = []
+	kingdoms = []
+	taxa = array("l")
+	with open(path, "rb") as infile:
+		for line in infile:
+			match = ENTRY.match(line.decode("utf-8", "replace").rstrip("\r\n"))
+			if match is not None:
+				mnemonics.append(match.group(1))
+				kingdoms.append(match.group(2))
+				taxa.append(int(match.group(3)))
+				names.append(clean_name(match.group(4)))
+	ranked = sorted((name.lower(), row) for row, name in enumerate(names))
+	return add_tables({"fingerprint": fingerprint(path), "mnemonics": mnemonics, "names": names, "kingdoms": "".join(kingdoms), \
+	"taxa": taxa, "keys": [key for key, row in ranked], "order": array("l", [row for key, row in ranked])})
+
+## Add the exact name, mnemonic and taxon ID lookup tables to an index
+def add_tables(index):
+	exact = {}
+	codes = {}
+	taxon_rows = {}
+	for row, name in enumerate(index["names"]):
+		exact.setdefault(name, row)
+		codes.setdefault(index["mnemonics"][row], row)
+		taxon_rows.setdefault(index["taxa"][row], row)
+	index.update({"exact": exact, "codes": codes, "taxon_rows": taxon_rows})
+	return index
+
+## Write the index to a temporary file and rename it into place
+def save_index(index, index_path):
+	saved = {"format": FORMAT, "version": VERSION, "fingerprint": list(index["fingerprint"])}
+	for name in SAVED:
+		saved[name] = list(index[name]) if isinstance(index[name], array) else index[name]
+	tmp = index_path + ".%d.tmp" % os.getpid()
+	with open(tmp, "w") as outfile:
+		json.dump(saved, outfile)
+	os.rename(tmp, index_path)
+
+## The index saved in 'index_path' if it was written for the current contents of 'path', otherwise None
+def read_index(path, index_path):
+	with open(index_path, "r") as infile:
+		saved = json.load(infile)
+	if saved.get("format") != FORMAT or saved.get("version") != VERSION or tuple(saved.get("fingerprint", ())) != fingerprint(path):
+		return None
+	index = dict((name, saved[name]) for name in SAVED)
+	index["taxa"] = array("l", index["taxa"])
+	index["order"] = array("l", index["order"])
+	index["fingerprint"] = fingerprint(path)
+	return add_tables(index)
+
+## The saved index for 'path' if it is still current, otherwise a newly built (and saved) index
+def load_index(path=SPECIES_LIST, index_path=None, rebuild=False):
+	if index_path is None:
+		index_path = path + ".idx"
+	if not rebuild and os.path.exists(index_path):
+		try:
+			index = read_index(path, index_path)
+			if index is not None:
+				return index
+		except Exception:											## Unreadable index (or an older format): rebuild it
+			pass
+	index = build_index(path)
+	try:
+		save_index(index, index_path)
+	except (IOError, OSError):										## Read-only directory: use the index without saving it
+		pass
+	return index
+
+
+#################################################
+###              Query the index              ###
+#################################################
+
+class SpeciesIndex(object):
+
+	def __init__(self, path=SPECIES_LIST, index_path=None, rebuild=False):
+		self.path = path
+		self.index_path = index_path
+		self.rebuild = rebuild
+		self._index = None
+
+	## Loaded on first use
+	@property
+	def index(self):
+		if self._index is None:
+			self._index = load_index(self.path, self.index_path, self.rebuild)
+		return self._index
+
+	## (mnemonic, kingdom, taxon ID, name) of a row
+	def species(self, row):
+		index = self.index
+		return (index["mnemonics"][row], index["kingdoms"][row], index["taxa"][row], index["names"][row])
+
+	def _row(self, table, key):
+		row = self.index[table].get(key)
+		if row is None:
+			return None
+		return self.species(row)
+
+	## Species with exactly this name (case is ignored when there is no case-sensitive match), or None
+	def exact(self, name):
+		name = name.strip()
+		row = self.index["exact"].get(name)
+		if row is None:
+			keys = self.index["keys"]
+			position = bisect.bisect_left(keys, name.lower())
+			if position == len(keys) or keys[position] != name.lower():
+				return None
+			row = self.index["order"][position]
+		return self.species(row)
+
+	## Species whose names start with 'text' (ignoring case), in alphabetical order
+	def prefix(self, text, limit=None):
+		text = text.strip().lower()
+		keys = self.index["keys"]
+		order = self.index["order"]
+		found = []
+		position = bisect.bisect_left(keys, text)
+		while position < len(keys) and keys[position].startswith(text):
+			if limit is not None and len(found) == limit:
+				break
+			found.append(self.species(order[position]))
+			position += 1
+		return found
+
+	def by_mnemonic(self, code):
+		return self._row("codes", code.strip().upper())
+
+	def by_taxon(self, taxon):
+		return self._row("taxon_rows", int(taxon))
+
+	## The one species meant by 'name': an exact match, or else the only species whose name starts with it
+	## (raises KeyError, listing the candidates, when there is none or more than one)
+	def lookup(self, name):
+		found = self.exact(name)
+		if found is not None:
+			return found
+		candidates = self.prefix(name, 11)
+		if len(candidates) == 1:
+			return candidates[0]
+		if not candidates:
+			raise KeyError("no species named '"+name+"' in the UniProt species list")
+		raise KeyError("'"+name+"' matches several species: "+", ".join(species[3] for species in candidates[:10]) + \
+		(", ..." if len(candidates) > 10 else ""))
+
+	def __len__(self):
+		return len(self.index["names"])
+
+_default = {}
+
+## Shared index of the bundled species list, loaded lazily
+def default_index():
+	if "index" not in _default:
+		_default["index"] = SpeciesIndex()
+	return _default["index"]
+
+
+#################################################
+###           		Main function             ###
+#################################################
+
+def main():
+	parser = optparse.OptionParser(usage=usage_line)
+	parser.add_option("-s", action = "store", type = "string", dest = "name", help = "exact species name (or unique prefix)")
+	parser.add_option("--prefix", action = "store", type = "string", dest = "prefix", help = "list species whose names start with this text")
+	parser.add_option("--mnemonic", action = "store", type = "string", dest = "mnemonic", help = "mnemonic species code to look up")
+	parser.add_option("--taxon", action = "store", type = "int", dest = "taxon", help = "numerical taxon ID to look up")
+	parser.add_option("--speclist", action = "store", type = "string", dest = "speclist", help = "UniProt species list [bundled list]", default = SPECIES_LIST)
+	parser.add_option("--rebuild", action = "store_true", dest = "rebuild", help = "rebuild the index even if it is current", default = False)
+	options, args = parser.parse_args()
+## When all input is present
+	index = SpeciesIndex(options.speclist, rebuild=options.rebuild)
+	if options.name is not None:
+		try:
+			found = [index.lookup(options.name)]
+		except KeyError as error:
+			sys.stderr.write("\n***Error: "+error.args[0]+"!***\n\n")
+			sys.exit(1)
+	elif options.prefix is not None:
+		found = index.prefix(options.prefix)
+	elif options.mnemonic is not None:
+		found = [index.by_mnemonic(options.mnemonic)]
+	elif options.taxon is not None:
+		found = [index.by_taxon(options.taxon)]
+	else:
+		print(str(len(index))+" species indexed")
+		return
+	output = getattr(sys.stdout, "buffer", sys.stdout)
+	for species in found:
+		if species is not None:
+			output.write(("\t".join("%s" % value for value in species) + "\n").encode("utf-8"))
+
+if __name__ == '__main__':
+	main()